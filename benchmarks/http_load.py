@@ -0,0 +1,343 @@
+# encoding: utf-8
+# Filename: http_load.py
+
+"""
+HTTP load benchmark of the routers.
+
+Start the application in a subprocess against a fresh local database, seed it through the API,
+then drive each route with a concurrent async client and report the throughput and the latency
+percentiles per route as JSON, so that commits can be compared:
+    python -m benchmarks.http_load --requests 500 --concurrency 32 --output before.json
+
+The default database is SQLite in a temporary directory. A MySQL-compatible stand-in is used with
+--database-url mysql://... --async-database-url mysql+aiomysql://..., it must be empty.
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+ADMIN = {"user_name": "bench_admin", "password": "bench_password", "email": "bench_admin@example.com"}
+
+MARKDOWN = "# Benchmark post {n}\n\n" + "\n\n".join(
+    f"Paragraph {i} of the benchmark post, with `code`, **bold** text and a [link](https://example.com)."
+    for i in range(40)
+) + "\n\n```python\nfor i in range(10):\n    print(i)\n```\n"
+
+
+def serve(database_url: str, async_database_url: str, port: int) -> None:
+    """
+    Run the application, in the subprocess started by `main`.
+    :param database_url: URL of the database.
+    :param async_database_url: URL of the same database for asyncio.
+    :param port: Port to listen on.
+    :return: None.
+    """
+
+    import config
+
+    config.DATABASE_URL = database_url
+    config.ASYNC_DATABASE_URL = async_database_url
+
+    import uvicorn
+    import main as application
+
+    uvicorn.run(application.app, host='127.0.0.1', port=port, log_level='warning', access_log=False)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(work_dir: Path, database_url: str, async_database_url: str, port: int) -> subprocess.Popen:
+    """
+    Start the application in a working directory of its own, and wait until it answers.
+    :param work_dir: Working directory, with the static files and `admin_list.json`.
+    :param database_url: URL of the database.
+    :param async_database_url: URL of the same database for asyncio.
+    :param port: Port to listen on.
+    :return: The process of the server.
+    """
+
+    work_dir.joinpath('admin_list.json').write_text(json.dumps([ADMIN]))
+
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_DIR), environment.get('PYTHONPATH')]))
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.http_load', '--serve',
+         '--database-url', database_url, '--async-database-url', async_database_url, '--port', str(port)],
+        cwd=work_dir, env=environment,
+        stdout=work_dir.joinpath('server.log').open('wb'), stderr=subprocess.STDOUT
+    )
+
+    deadline = time.monotonic() + 60
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited, see {work_dir.joinpath('server.log')}")
+
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/', timeout=1).status_code == 200:
+                return process
+
+        except httpx.TransportError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError("The server did not start in 60 seconds.")
+
+
+async def seed(client: httpx.AsyncClient, posts: int, users: int, comments: int) -> dict:
+    """
+    Seed the database through the API.
+    :param client: Client of the server.
+    :param posts: Amount of posts to publish.
+    :param users: Amount of users to sign up.
+    :param comments: Amount of comments per post.
+    :return: The data the scenarios need, tokens and uuids.
+    """
+
+    response = await client.post('/api/user/token', data={'username': ADMIN['user_name'], 'password': ADMIN['password']})
+    response.raise_for_status()
+    admin_headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+
+    (await client.post('/api/posts/categories/create', json={'category_name': 'benchmark'},
+                       headers=admin_headers)).raise_for_status()
+    category_id = (await client.get('/api/resources/categories/getAll')).json()[0]['category_id']
+
+    for n in range(posts):
+        (await client.post('/api/posts/create', headers=admin_headers, data={
+            'posts_title': f'Benchmark post {n}', 'tags': f'benchmark,tag{n % 5}', 'category_id': category_id,
+            'comment': 'true', 'cover_url': 'https://example.com/cover.png'
+        }, files={'content_file': ('post.md', MARKDOWN.format(n=n).encode('utf-8'), 'text/markdown')})).raise_for_status()
+
+    post_uuids: list[str] = []
+    cursor = None
+
+    while True:
+        page = (await client.get('/api/resources/posts', params={'cursor': cursor} if cursor else {})).json()
+        post_uuids += [post['post_uuid'] for post in page['posts']]
+        cursor = page['next_cursor']
+
+        if not cursor:
+            break
+
+    user_headers: list[dict] = []
+
+    for n in range(users):
+        user = {'user_name': f'bench_user_{n}', 'password': 'bench_password', 'email': f'bench_user_{n}@example.com'}
+        (await client.post('/api/user/sign_up', json=user)).raise_for_status()
+        response = await client.post('/api/user/token', data={'username': user['user_name'], 'password': user['password']})
+        user_headers.append({'Authorization': 'Bearer ' + response.json()['access_token']})
+
+    for post_uuid in post_uuids:
+        for n in range(comments):
+            (await client.post('/api/comments/send', headers=random.choice(user_headers),
+                               json={'post_uuid': post_uuid, 'content': f'Benchmark comment {n}'})).raise_for_status()
+
+    return {
+        'admin_headers': admin_headers,
+        'user_headers': user_headers,
+        'user_names': [f'bench_user_{n}' for n in range(users)],
+        'category_id': category_id,
+        'post_uuids': post_uuids
+    }
+
+
+def scenarios(data: dict) -> dict:
+    """
+    Get the requests of each benchmarked route.
+    :param data: The data returned by `seed`.
+    :return: Functions sending one request with a client, by route name.
+    """
+
+    post_uuids = data['post_uuids']
+
+    def update_post(client: httpx.AsyncClient):
+        n = random.randrange(10 ** 6)
+
+        return client.put('/api/posts/update', headers=data['admin_headers'], data={
+            'post_uuid': random.choice(post_uuids), 'posts_title': f'Updated post {n}', 'tags': 'benchmark,updated',
+            'category_id': data['category_id'], 'comment': 'true', 'cover_url': 'https://example.com/cover.png'
+        }, files={'new_content_file': ('post.md', MARKDOWN.format(n=n).encode('utf-8'), 'text/markdown')})
+
+    return {
+        'GET /api/resources/posts': lambda client: client.get('/api/resources/posts'),
+        'GET /api/resources/posts/{page}': lambda client: client.get('/api/resources/posts/1'),
+        'GET /api/resources/posts/get/{post_uuid}': lambda client: client.get(
+            f'/api/resources/posts/get/{random.choice(post_uuids)}'),
+        'GET /api/comments/get_in_a_post/{post_uuid}': lambda client: client.get(
+            f'/api/comments/get_in_a_post/{random.choice(post_uuids)}'),
+        'GET /api/resources/search': lambda client: client.get('/api/resources/search', params={'q': 'benchmark code'}),
+        'POST /api/user/token': lambda client: client.post('/api/user/token', data={
+            'username': random.choice(data['user_names']), 'password': 'bench_password'}),
+        'POST /api/comments/send': lambda client: client.post(
+            '/api/comments/send', headers=random.choice(data['user_headers']),
+            json={'post_uuid': random.choice(post_uuids), 'content': 'Benchmark comment'}),
+        'PUT /api/posts/update': update_post
+    }
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param ordered: Sorted values.
+    :param fraction: Percentile between 0 and 1.
+    :return: The value.
+    """
+
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+async def drive(client: httpx.AsyncClient, send, requests: int, concurrency: int) -> dict:
+    """
+    Send requests to a route from concurrent workers, and measure them.
+    :param client: Client of the server.
+    :param send: Function sending one request.
+    :param requests: Amount of requests.
+    :param concurrency: Amount of requests in flight.
+    :return: Throughput and latencies of the route.
+    """
+
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+
+            try:
+                response = await send(client)
+                failure = None if response.status_code < 400 else str(response.status_code)
+
+            except httpx.HTTPError as e:
+                failure = type(e).__name__
+
+            latencies.append(time.perf_counter() - start)
+
+            if failure:
+                errors[failure] = errors.get(failure, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    ordered = sorted(latencies)
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput": round(requests / seconds, 1),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2)
+    }
+
+
+async def benchmark(port: int, arguments: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=arguments.concurrency, max_keepalive_connections=arguments.concurrency)
+
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=60) as client:
+        data = await seed(client=client, posts=arguments.posts, users=arguments.users, comments=arguments.comments)
+        results: dict[str, dict] = {}
+
+        for name, send in scenarios(data=data).items():
+            if arguments.routes and not any(route in name for route in arguments.routes):
+                continue
+
+            # A few requests first, so that caches and connections are warm as in production.
+            await drive(client=client, send=send, requests=min(arguments.concurrency, arguments.requests),
+                        concurrency=arguments.concurrency)
+            results[name] = await drive(client=client, send=send, requests=arguments.requests,
+                                        concurrency=arguments.concurrency)
+            print(f"{name:<45} {results[name]['throughput']:>8} req/s  p50 {results[name]['p50_ms']:>8} ms  "
+                  f"p99 {results[name]['p99_ms']:>8} ms", file=sys.stderr)
+
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="Requests per route.")
+    parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight per route.")
+    parser.add_argument('--posts', type=int, default=30, help="Posts to seed.")
+    parser.add_argument('--users', type=int, default=10, help="Users to seed.")
+    parser.add_argument('--comments', type=int, default=5, help="Comments to seed per post.")
+    parser.add_argument('--routes', nargs='*', help="Only benchmark the routes whose name contains one of these.")
+    parser.add_argument('--database-url', help="Database to use instead of a temporary SQLite file.")
+    parser.add_argument('--async-database-url', help="The same database, through a driver for asyncio.")
+    parser.add_argument('--output', help="File to write the JSON report to, instead of the standard output.")
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        serve(database_url=arguments.database_url, async_database_url=arguments.async_database_url,
+              port=arguments.port)
+        return
+
+    if bool(arguments.database_url) != bool(arguments.async_database_url):
+        parser.error("--database-url and --async-database-url go together.")
+
+    with tempfile.TemporaryDirectory(prefix='http_load_') as work_dir:
+        database_url = arguments.database_url or f"sqlite:///{work_dir}/benchmark.sqlite"
+        async_database_url = arguments.async_database_url or f"sqlite+aiosqlite:///{work_dir}/benchmark.sqlite"
+        port = free_port()
+        process = start_server(work_dir=Path(work_dir), database_url=database_url,
+                               async_database_url=async_database_url, port=port)
+
+        try:
+            results = asyncio.run(benchmark(port=port, arguments=arguments))
+
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = json.dumps({
+        "revision": git_revision(),
+        "database": database_url.split(':', 1)[0],
+        "settings": {
+            "requests": arguments.requests,
+            "concurrency": arguments.concurrency,
+            "posts": arguments.posts,
+            "users": arguments.users,
+            "comments": arguments.comments
+        },
+        "routes": results
+    }, indent=2)
+
+    if arguments.output:
+        Path(arguments.output).write_text(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
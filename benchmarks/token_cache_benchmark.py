@@ -0,0 +1,47 @@
+# encoding: utf-8
+# Filename: token_cache_benchmark.py
+
+"""
+Micro-benchmark of the verified-token cache.
+
+Compare the cost of decoding a token on every request with the cost of the cached lookup:
+    python -m benchmarks.token_cache_benchmark
+"""
+
+from datetime import timedelta
+import timeit
+
+import config
+
+# The benchmark does not touch the database, but importing the tools creates the engines.
+config.DATABASE_URL = 'sqlite://'
+config.ASYNC_DATABASE_URL = 'sqlite+aiosqlite://'
+
+from jose import jwt  # noqa: E402
+from tools import token_tools  # noqa: E402
+from tools.cache_tools import token_cache  # noqa: E402
+
+ROUNDS = 20000
+
+
+def main():
+    token = token_tools.create_access_token(data={"sub": "benchmark"}, expires_delta=timedelta(minutes=10))
+
+    def decode():
+        jwt.decode(token=token, key=config.SECRET_KEY, algorithms=config.ALGORITHM)
+
+    def cached():
+        token_tools.get_uuid_by_token(token=token)
+
+    token_cache.invalidate()
+    decode_seconds = timeit.timeit(decode, number=ROUNDS)
+    cached_seconds = timeit.timeit(cached, number=ROUNDS)
+
+    print(f"jwt.decode:        {decode_seconds / ROUNDS * 1e6:8.2f} us per request")
+    print(f"get_uuid_by_token: {cached_seconds / ROUNDS * 1e6:8.2f} us per request")
+    print(f"saving:            {(decode_seconds - cached_seconds) / ROUNDS * 1e6:8.2f} us per request, "
+          f"{decode_seconds / cached_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,21 +2,81 @@
 # Filename: db.py
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from dependencies.pool_stats import instrumented_pool_class
 import config
 
+
+def engine_options(database_url: str, pool_class: type, name: str) -> dict:
+    """
+    Get the keyword arguments of an engine, with the pool settings of `config.py`.
+    SQLite keeps the pool chosen by SQLAlchemy, since it does not pool the same way.
+    :param database_url: URL of the database.
+    :param pool_class: Queue pool class to instrument.
+    :param name: Name of the pool in the statistics.
+    :return: Keyword arguments of `create_engine`.
+    """
+
+    if database_url.startswith('sqlite'):
+        return {}
+
+    return {
+        "poolclass": instrumented_pool_class(pool_class=pool_class, name=name),
+        "pool_size": config.DATABASE_POOL_SIZE,
+        "max_overflow": config.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": config.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": config.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": config.DATABASE_POOL_PRE_PING
+    }
+
+
 SQLALCHEMY_DATABASE_URL: str = config.DATABASE_URL
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    **engine_options(database_url=SQLALCHEMY_DATABASE_URL, pool_class=QueuePool, name='sync')
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine serves the routers running on the event loop.
+# Objects are not expired on commit, because an expired attribute cannot be lazily reloaded there.
+SQLALCHEMY_ASYNC_DATABASE_URL: str = config.ASYNC_DATABASE_URL
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    **engine_options(database_url=SQLALCHEMY_ASYNC_DATABASE_URL, pool_class=AsyncAdaptedQueuePool, name='async')
+)
+
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
+
 Base = declarative_base()
 
 
+def get_pool_statistics() -> dict:
+    """
+    Get the statistics of the connection pools of both engines.
+    :return: Dict type statistics, by the name of the pool.
+    """
+
+    statistics: dict = {}
+
+    for name, pool in (('sync', engine.pool), ('async', async_engine.pool)):
+        if hasattr(pool, 'statistics'):
+            statistics[name] = pool.statistics.snapshot(pool=pool)
+
+    return statistics
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,126 @@
+# encoding: utf-8
+# Filename: pool_stats.py
+
+"""
+Statistics of the connection pools.
+
+The pools of the engines are subclassed to time how long a request waits for a connection,
+and the numbers are kept here to size the pools from data.
+"""
+
+from threading import Lock
+from typing import Callable
+from time import perf_counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import Pool
+
+# Callbacks of `(pool name, seconds waited, timed out)`, run after every checkout.
+wait_listeners: list[Callable[[str, float, bool], None]] = []
+
+
+def add_wait_listener(callback: Callable[[str, float, bool], None]) -> None:
+    """
+    Register a callback which is called with the waiting time of every checkout.
+    It runs on the thread of the checkout, so it should be cheap.
+    :param callback: Function of `(pool name, seconds waited, timed out)`.
+    :return: None.
+    """
+
+    wait_listeners.append(callback)
+
+
+class PoolStatistics:
+    """
+    Counters of the checkouts of a pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = Lock()
+        self.checkouts: int = 0
+        self.timeouts: int = 0
+        self.wait_seconds_total: float = 0.0
+        self.wait_seconds_max: float = 0.0
+        self.checked_out_max: int = 0
+
+    def record_checkout(self, pool: Pool, wait_seconds: float, timed_out: bool) -> None:
+        """
+        Record a checkout, and notify the listeners.
+        :param pool: The pool checked out from.
+        :param wait_seconds: Time spent waiting for the connection.
+        :param timed_out: Whether the checkout failed with a timeout.
+        :return: None.
+        """
+
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checked_out_max = max(self.checked_out_max, pool.checkedout())
+
+        for callback in wait_listeners:
+            callback(self.name, wait_seconds, timed_out)
+
+    def snapshot(self, pool: Pool) -> dict:
+        """
+        Get the counters, together with the current state of the pool.
+        :param pool: The current pool of the engine.
+        :return: Dict type statistics.
+        """
+
+        with self.lock:
+            statistics = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_average": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+                "checked_out_max": self.checked_out_max
+            }
+
+        # Pools without a queue, such as the ones of SQLite in memory, have no sizes.
+        if hasattr(pool, 'checkedout'):
+            statistics.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0)
+            })
+
+        return statistics
+
+
+def instrumented_pool_class(pool_class: type[Pool], name: str) -> type[Pool]:
+    """
+    Make a subclass of a pool class which records the waiting time of every checkout.
+    The statistics are kept on the class, so they survive the pool being recreated on dispose.
+    :param pool_class: The pool class to instrument, such as `QueuePool`.
+    :param name: Name of the pool in the statistics.
+    :return: The instrumented pool class.
+    """
+
+    statistics = PoolStatistics(name=name)
+
+    def _do_get(self):
+        start = perf_counter()
+
+        try:
+            connection = pool_class._do_get(self)
+
+        except exc.TimeoutError:
+            statistics.record_checkout(pool=self, wait_seconds=perf_counter() - start, timed_out=True)
+            raise
+
+        statistics.record_checkout(pool=self, wait_seconds=perf_counter() - start, timed_out=False)
+
+        return connection
+
+    return type(f"Instrumented{pool_class.__name__}", (pool_class,), {
+        "statistics": statistics,
+        "_do_get": _do_get
+    })
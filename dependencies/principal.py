@@ -0,0 +1,83 @@
+# encoding: utf-8
+# Filename: principal.py
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+import hmac
+import config
+
+from dependencies.db import get_async_db
+from dependencies.oauth2scheme import oauth2Scheme
+from model import async_crud, schemas
+from tools import token_tools
+from tools.cache_tools import user_cache
+
+
+async def get_current_user(token: str = Depends(oauth2Scheme),
+                           db: AsyncSession = Depends(get_async_db)) -> schemas.Principal:
+    """
+    Resolve the logged user of a request, once for the whole request.
+    The user is served from `user_cache`, which the updates of a user drop.
+    :param token: Token of the user.
+    :param db: Async session of the database.
+    :return: The logged user.
+    """
+
+    user_uuid = token_tools.get_uuid_by_token(token=token)
+
+    if not user_uuid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token.",
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
+
+    principal: schemas.Principal | None = user_cache.get(user_uuid)
+
+    if principal is not None:
+        return principal
+
+    generation: int = user_cache.generation
+    user = await async_crud.get_user_by_uuid(user_uuid=user_uuid, db=db)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Permission Denied!",
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
+
+    principal = schemas.Principal.model_validate(user)
+    user_cache.set(user_uuid, principal, generation=generation)
+
+    return principal
+
+
+async def get_current_admin(principal: schemas.Principal = Depends(get_current_user)) -> schemas.Principal:
+    """
+    Resolve the logged user of a request, who must be an administrator.
+    :param principal: The logged user.
+    :return: The logged administrator.
+    """
+
+    if not principal.administrator:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Permission Denied!"
+        )
+
+    return principal
+
+
+async def check_metrics_access(token: str = Depends(oauth2Scheme), db: AsyncSession = Depends(get_async_db)) -> None:
+    """
+    Let a scraper read the metrics with `config.METRICS_TOKEN`, and the administrators with their own token.
+    :param token: Bearer token of the request.
+    :param db: Async session of the database.
+    :return: None.
+    """
+
+    if config.METRICS_TOKEN and hmac.compare_digest(token.encode('utf-8'), config.METRICS_TOKEN.encode('utf-8')):
+        return
+
+    await get_current_admin(principal=await get_current_user(token=token, db=db))
@@ -9,19 +9,45 @@ The main execution of the project.
 """
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
 from pathlib import Path
-from tools import admin_tools
+from tools import admin_tools, migration_tools, search_tools, compression_tools, snapshot_tools, \
+    metrics_tools, query_count_tools, log_tools, upload_tools
 from routers import user, resources, posts, administrator, comments
 from model import crud, models, schemas
 from dependencies.db import SessionLocal, engine
+from dependencies.principal import check_metrics_access
 import config
 
-models.Base.metadata.create_all(bind=engine)
+log_tools.setup_logging()
+
+migration_tools.upgrade_database(engine=engine)
+
+# Only the posts changed since the search index was saved are indexed again.
+with SessionLocal() as search_db:
+    search_tools.sync_search_index(db=search_db)
+
+# The index is saved in the background after the posts are written.
+search_tools.index_saver.start()
+
+# The first pages of the listings are served from snapshots, built again after every write.
+snapshot_tools.snapshot_builder.start()
 
 app = FastAPI()
+# Innermost, so that the refused uploads are still logged and measured.
+app.add_middleware(upload_tools.UploadLimitMiddleware, limits={
+    '/api/posts/create': config.POST_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD,
+    '/api/posts/update': config.POST_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD,
+    '/api/user/avatar/set': config.AVATAR_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD
+})
+app.add_middleware(compression_tools.APIGZipMiddleware)
+app.add_middleware(query_count_tools.QueryCountMiddleware)
+# Added after the compression, so that it times it too.
+app.add_middleware(metrics_tools.MetricsMiddleware)
+# Added last, so that the id of the request is known to everything logged while serving it.
+app.add_middleware(log_tools.AccessLogMiddleware)
 app.include_router(user.router_user)
 app.include_router(resources.router_resources)
 app.include_router(posts.router_posts)
@@ -35,7 +61,7 @@ static_path.mkdir(exist_ok=True)
 user_path.mkdir(exist_ok=True)
 posts_path.mkdir(exist_ok=True)
 
-app.mount('/static', StaticFiles(directory=config.STATIC_DIR), name='static')
+app.mount('/static', compression_tools.PrecompressedStaticFiles(directory=config.STATIC_DIR), name='static')
 
 admin_tools.create_administrator()
 
@@ -56,3 +82,14 @@ def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(check_metrics_access)])
+async def metrics():
+    """
+    * Return the metrics of the server, in the text format of Prometheus.
+    * Scrapers send `config.METRICS_TOKEN` as a bearer token, administrators their own token.
+    * :return: Text of the metrics.
+    """
+    return PlainTextResponse(
+        metrics_tools.render_prometheus(metrics=metrics_tools.collect()),
+        media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,56 @@
+# encoding: utf-8
+# Filename: env.py
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from model import models
+import config
+
+alembic_config = context.config
+
+if alembic_config.config_file_name is not None and alembic_config.attributes.get('configure_logger', True):
+    fileConfig(alembic_config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit the SQL of the migrations without connecting to the database.
+    """
+
+    context.configure(url=config.DATABASE_URL, target_metadata=target_metadata, literal_binds=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    Run the migrations on the connection given by `migration_tools`, or on a new one.
+    """
+
+    connection = alembic_config.attributes.get('connection')
+
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+        return
+
+    with create_engine(config.DATABASE_URL).connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
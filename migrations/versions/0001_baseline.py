@@ -0,0 +1,67 @@
+# encoding: utf-8
+
+"""
+Baseline schema, as created by `create_all` before the migrations existed.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.INT, primary_key=True, index=True, autoincrement=True),
+        sa.Column('user_uuid', sa.VARCHAR(36), unique=True, nullable=False),
+        sa.Column('user_name', sa.VARCHAR(32), unique=True, nullable=False),
+        sa.Column('nick_name', sa.VARCHAR(255), nullable=False),
+        sa.Column('password', sa.TEXT, nullable=False),
+        sa.Column('email', sa.VARCHAR(64), unique=True, nullable=False),
+        sa.Column('description', sa.TEXT, nullable=False),
+        sa.Column('administrator', sa.BOOLEAN, nullable=False),
+        sa.Column('date', sa.DATETIME, nullable=False)
+    )
+    op.create_table(
+        'categories',
+        sa.Column('id', sa.INT, primary_key=True, autoincrement=True),
+        sa.Column('category_name', sa.TEXT, unique=True, nullable=False),
+        sa.Column('datetime', sa.DATETIME, nullable=False)
+    )
+    op.create_table(
+        'posts',
+        sa.Column('id', sa.INT, primary_key=True, index=True, autoincrement=True),
+        sa.Column('post_uuid', sa.VARCHAR(36), unique=True, nullable=False),
+        sa.Column('title', sa.TEXT, nullable=False),
+        sa.Column('author_uuid', sa.VARCHAR(36), nullable=False),
+        sa.Column('tags', sa.TEXT, nullable=False),
+        sa.Column('cover_url', sa.VARCHAR(255), nullable=True),
+        sa.Column('category_id', sa.INT, sa.ForeignKey('categories.id'), nullable=False),
+        sa.Column('comment', sa.BOOLEAN, nullable=False),
+        sa.Column('create_time', sa.DATETIME, nullable=False),
+        sa.Column('update_time', sa.DATETIME, nullable=False)
+    )
+    op.create_table(
+        'comments',
+        sa.Column('id', sa.INT, primary_key=True, autoincrement=True),
+        sa.Column('comment_uuid', sa.VARCHAR(36), unique=True, nullable=False),
+        sa.Column('post_uuid', sa.VARCHAR(36), nullable=False),
+        sa.Column('user_uuid', sa.VARCHAR(36), nullable=False),
+        sa.Column('content', sa.TEXT, nullable=False),
+        sa.Column('date', sa.DATETIME, nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('comments')
+    op.drop_table('posts')
+    op.drop_table('categories')
+    op.drop_table('users')
@@ -0,0 +1,47 @@
+# encoding: utf-8
+
+"""
+Avatar location and version on users, backfilled from the avatar directories.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from pathlib import Path
+
+from alembic import op
+import sqlalchemy as sa
+
+import config
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Databases which started before the migrations may have the columns already.
+    if 'avatar_path' not in [column['name'] for column in sa.inspect(connection).get_columns('users')]:
+        op.add_column('users', sa.Column('avatar_path', sa.VARCHAR(255), nullable=True))
+        op.add_column('users', sa.Column('avatar_version', sa.INT, nullable=False, server_default='0'))
+
+    # Record the avatars uploaded under random names, the directories are not listed on reads anymore.
+    users = sa.table('users', sa.column('user_uuid'), sa.column('avatar_path'), sa.column('avatar_version'))
+
+    for (user_uuid,) in connection.execute(sa.select(users.c.user_uuid).where(users.c.avatar_path.is_(None))):
+        avatar_filename = next(Path(config.STATIC_DIR).joinpath('users', user_uuid).glob('*.*'), None)
+
+        if avatar_filename:
+            connection.execute(
+                users.update().where(users.c.user_uuid == user_uuid)
+                .values(avatar_path=avatar_filename.as_posix(), avatar_version=1)
+            )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar_version')
+    op.drop_column('users', 'avatar_path')
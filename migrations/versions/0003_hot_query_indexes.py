@@ -0,0 +1,31 @@
+# encoding: utf-8
+
+"""
+Indexes matching the filters and orders of the hot queries.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Listings by page and by cursor, ordered by `(create_time, id)`.
+    op.create_index('ix_posts_create_time_id', 'posts', ['create_time', 'id'])
+    # Listings of the posts of a user.
+    op.create_index('ix_posts_author_uuid_create_time', 'posts', ['author_uuid', 'create_time'])
+    # Comment threads of a post, newest first.
+    op.create_index('ix_comments_post_uuid_date', 'comments', ['post_uuid', 'date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_post_uuid_date', table_name='comments')
+    op.drop_index('ix_posts_author_uuid_create_time', table_name='posts')
+    op.drop_index('ix_posts_create_time_id', table_name='posts')
@@ -0,0 +1,80 @@
+# encoding: utf-8
+
+"""
+Tags of the posts in their own table, backfilled from the `tags` strings of the posts.
+
+Tag names are limited to 64 characters, as on the writes, which refuse longer names.
+Longer names are not cut: the upgrade stops before changing anything and lists the posts which have them,
+so that their tags are shortened by hand and the upgrade is run again.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# The same separators as `crud.split_tags`, at the time of this revision.
+TAGS_SEPARATOR = re.compile(r'[,，;；]')
+TAG_NAME_MAX_LENGTH = 64
+
+
+def split_tags(tags_string: str | None) -> list[str]:
+    return [name.strip() for name in TAGS_SEPARATOR.split(tags_string or '') if name.strip()]
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    posts = sa.table('posts', sa.column('id'), sa.column('post_uuid'), sa.column('tags'))
+    posts_tags = connection.execute(sa.select(posts.c.id, posts.c.post_uuid, posts.c.tags)).all()
+
+    too_long = [
+        f"post {post_uuid}: {name!r}"
+        for _, post_uuid, tags_string in posts_tags for name in split_tags(tags_string)
+        if len(name) > TAG_NAME_MAX_LENGTH
+    ]
+
+    if too_long:
+        raise ValueError(
+            f"Tag names longer than {TAG_NAME_MAX_LENGTH} characters, shorten them and upgrade again:\n"
+            + "\n".join(too_long)
+        )
+
+    tags = op.create_table(
+        'tags',
+        sa.Column('id', sa.INT, primary_key=True, autoincrement=True),
+        sa.Column('tag_name', sa.VARCHAR(TAG_NAME_MAX_LENGTH), unique=True, nullable=False)
+    )
+    post_tags = op.create_table(
+        'post_tags',
+        sa.Column('post_id', sa.INT, sa.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tag_id', sa.INT, sa.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    )
+    op.create_index('ix_post_tags_tag_id_post_id', 'post_tags', ['tag_id', 'post_id'])
+
+    tag_ids: dict[str, int] = {}
+
+    for post_id, _, tags_string in posts_tags:
+        post_tag_ids: set[int] = set()
+
+        for name in split_tags(tags_string):
+            if name.lower() not in tag_ids:
+                tag_ids[name.lower()] = connection.execute(tags.insert().values(tag_name=name)).inserted_primary_key[0]
+
+            post_tag_ids.add(tag_ids[name.lower()])
+
+        if post_tag_ids:
+            connection.execute(post_tags.insert(), [{'post_id': post_id, 'tag_id': tag_id} for tag_id in post_tag_ids])
+
+
+def downgrade() -> None:
+    op.drop_table('post_tags')
+    op.drop_table('tags')
@@ -0,0 +1,24 @@
+# encoding: utf-8
+
+"""
+Index of the listings of the posts of a category.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_posts_category_id_create_time', 'posts', ['category_id', 'create_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_category_id_create_time', table_name='posts')
@@ -0,0 +1,33 @@
+# encoding: utf-8
+
+"""
+Version stamp of the listings, shared by the workers through the database.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    listing_stamp = op.create_table(
+        'listing_stamp',
+        sa.Column('id', sa.INT, primary_key=True, autoincrement=False),
+        sa.Column('version', sa.INT, nullable=False),
+        sa.Column('last_modified', sa.DATETIME, nullable=False)
+    )
+    op.bulk_insert(listing_stamp, [{'id': 1, 'version': 0, 'last_modified': datetime.utcnow()}])
+
+
+def downgrade() -> None:
+    op.drop_table('listing_stamp')
@@ -0,0 +1,44 @@
+# encoding: utf-8
+
+"""
+Create time of the posts copied into `post_tags`, so that the posts of a tag are listed from its index.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # In batches, as SQLite can only change the columns of a table by creating it again.
+    with op.batch_alter_table('post_tags') as batch:
+        batch.add_column(sa.Column('create_time', sa.DATETIME, nullable=True))
+
+    posts = sa.table('posts', sa.column('id'), sa.column('create_time'))
+    post_tags = sa.table('post_tags', sa.column('post_id'), sa.column('create_time'))
+    op.execute(
+        post_tags.update().values(
+            create_time=sa.select(posts.c.create_time).where(posts.c.id == post_tags.c.post_id).scalar_subquery()
+        )
+    )
+
+    # The new index is created first, the foreign key of `tag_id` needs an index starting with it in MySQL.
+    with op.batch_alter_table('post_tags') as batch:
+        batch.alter_column('create_time', existing_type=sa.DATETIME, nullable=False)
+        batch.create_index('ix_post_tags_tag_id_create_time', ['tag_id', 'create_time', 'post_id'])
+        batch.drop_index('ix_post_tags_tag_id_post_id')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('post_tags') as batch:
+        batch.create_index('ix_post_tags_tag_id_post_id', ['tag_id', 'post_id'])
+        batch.drop_index('ix_post_tags_tag_id_create_time')
+        batch.drop_column('create_time')
@@ -0,0 +1,261 @@
+# encoding: utf-8
+# Filename: async_crud.py
+
+"""
+Async equivalents of the read paths in `crud.py`.
+They are used by the read-heavy routers, which run on the event loop instead of the threadpool.
+"""
+
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model.crud import posts_details_options, posts_by_page_statement, posts_by_cursor_statement, \
+    post_by_uuid_statement, user_by_statement, tag_by_name_statement, comments_of_post_statement
+from model.models import User, Posts, Category, Tag, post_tags
+from tools.cache_tools import categories_cache, tags_cache
+
+
+async def get_user_by_name(user_name: str, db: AsyncSession):
+    """
+    Get a user from the database by their username.
+    :param db: Async session of database.
+    :param user_name: The name of the user.
+    :return: The user if they exist, None otherwise.
+    """
+
+    return await db.scalar(user_by_statement(column=User.user_name, value=user_name))
+
+
+async def get_user_by_uuid(db: AsyncSession, user_uuid: str):
+    """
+    Get a user from the database by their uuid.
+    :param db: Async session of the database.
+    :param user_uuid: The uuid of the user.
+    :return: The user if they exist, None otherwise.
+    """
+
+    return await db.scalar(user_by_statement(column=User.user_uuid, value=user_uuid))
+
+
+async def get_admin_by_uuid(admin_uuid: str, db: AsyncSession):
+    """
+    Get an admin from the database by their uuid.
+    :param db: Async session of database.
+    :param admin_uuid: The uuid of the admin.
+    :return: The admin if they exist, None otherwise.
+    """
+
+    return await db.scalar(select(User).filter(
+        User.user_uuid == admin_uuid,
+        User.administrator == True
+    ).limit(1))
+
+
+async def get_category_name(category_id: int, db: AsyncSession):
+    """
+    Get the category by ID.
+    :param category_id: ID of the category.
+    :param db: Async session of database.
+    :return: The category if it exists, None otherwise.
+    """
+
+    return await db.scalar(select(Category).filter(Category.id == category_id).limit(1))
+
+
+async def select_all_posts_by_page(page: int, db: AsyncSession):
+    """
+    Retrieve posts with their authors and categories, paginated by the given page number.
+    :param page: The Page.
+    :param db: Async session of the database.
+    :return: List type data of posts.
+    """
+
+    result = await db.scalars(posts_by_page_statement(page=page))
+
+    return result.all()
+
+
+async def select_posts_of_category_by_page(category_id: int, page: int, db: AsyncSession):
+    """
+    Retrieve the posts of a category with their authors and categories, paginated by the given page number.
+    :param category_id: ID of the category.
+    :param page: The Page.
+    :param db: Async session of the database.
+    :return: List type data of posts.
+    """
+
+    result = await db.scalars(posts_by_page_statement(page=page, category_id=category_id))
+
+    return result.all()
+
+
+async def select_all_posts_of_user_by_page(user_uuid: str, page: int, db: AsyncSession):
+    """
+    Retrieve posts of a user with their authors and categories, paginated by the given page number.
+    :param user_uuid: UUID of the user.
+    :param page: The Page.
+    :param db: Async session of the database.
+    :return: List type data of posts.
+    """
+
+    result = await db.scalars(posts_by_page_statement(page=page, user_uuid=user_uuid))
+
+    return result.all()
+
+
+async def select_posts_by_cursor(cursor: tuple[datetime, int] | None, db: AsyncSession,
+                                 user_uuid: str | None = None, tag_id: int | None = None):
+    """
+    Retrieve posts after a cursor, see `crud.select_posts_by_cursor`.
+    :param cursor: `(create_time, id)` of the last post of the previous page, None for the first page.
+    :param db: Async session of the database.
+    :param user_uuid: UUID of the user to limit the posts to, None for all the posts.
+    :param tag_id: ID of the tag to limit the posts to, None for all the posts.
+    :return: List type data of posts.
+    """
+
+    result = await db.scalars(posts_by_cursor_statement(cursor=cursor, user_uuid=user_uuid, tag_id=tag_id))
+
+    return result.all()
+
+
+async def get_single_post_data(post_uuid: str, db: AsyncSession):
+    """
+    Get the data of a single post from the database.
+    :param post_uuid: Uuid of the post.
+    :param db: Async session of the database.
+    :return: The post if it exists, None otherwise.
+    """
+
+    return await db.scalar(post_by_uuid_statement(post_uuid=post_uuid, details=False))
+
+
+async def get_single_post_with_details(post_uuid: str, db: AsyncSession):
+    """
+    Get a single post from the database, together with its author and category.
+    :param post_uuid: Uuid of the post.
+    :param db: Async session of the database.
+    :return: The post if it exists, None otherwise.
+    """
+
+    return await db.scalar(post_by_uuid_statement(post_uuid=post_uuid))
+
+
+async def select_posts_by_uuids(post_uuids: list[str], db: AsyncSession):
+    """
+    Select the posts of a list of uuids, with their authors and categories.
+    :param post_uuids: Uuids of the posts.
+    :param db: Async session of the database.
+    :return: List of the posts, in no particular order.
+    """
+
+    if not post_uuids:
+        return []
+
+    result = await db.scalars(
+        select(Posts).options(*posts_details_options()).filter(Posts.post_uuid.in_(post_uuids))
+    )
+
+    return result.all()
+
+
+async def get_all_categories_in_db(stamp: str, db: AsyncSession):
+    """
+    Get all the categories from the database.
+    The result is shared with `crud.get_all_categories_in_db` through `categories_cache`.
+    :param stamp: ETag of the listings, read in the same session, which the cached result must have been stored with.
+    :param db: Async session of the database.
+    :return: Return the data of all the categories.
+    """
+
+    categories = categories_cache.get('all', stamp=stamp)
+
+    if categories is not None:
+        return categories
+
+    generation: int = categories_cache.generation
+
+    results = await db.execute(
+        select(
+            Category.id.label("category_id"),
+            Category.category_name,
+            func.count(Posts.id).label('number_of_posts')
+        ).outerjoin(Posts, Category.id == Posts.category_id)
+        .group_by(Category.category_name)
+        .order_by(func.count(Posts.id).desc())
+    )
+
+    categories = [
+        {"category_id": category_id, "category_name": category_name, "number_of_posts": number_of_posts}
+        for category_id, category_name, number_of_posts in results.all()
+    ]
+
+    categories_cache.set('all', categories, generation=generation, stamp=stamp)
+
+    return categories
+
+
+async def get_tag_by_name(tag_name: str, db: AsyncSession):
+    """
+    Get a tag by its name.
+    :param tag_name: Name of the tag.
+    :param db: Async session of the database.
+    :return: The tag if it exists, None otherwise.
+    """
+
+    return await db.scalar(tag_by_name_statement(tag_name=tag_name))
+
+
+async def get_all_tags_in_db(stamp: str, db: AsyncSession):
+    """
+    Get all the tags which are used by posts, with the amount of their posts.
+    :param stamp: ETag of the listings, read in the same session, which the cached result must have been stored with.
+    :param db: Async session of the database.
+    :return: Return the data of the tags, the most used first.
+    """
+
+    tags = tags_cache.get('all', stamp=stamp)
+
+    if tags is not None:
+        return tags
+
+    generation: int = tags_cache.generation
+
+    results = await db.execute(
+        select(Tag.tag_name, func.count(post_tags.c.post_id).label('number_of_posts'))
+        .join(post_tags, Tag.id == post_tags.c.tag_id)
+        .group_by(Tag.id, Tag.tag_name)
+        .order_by(func.count(post_tags.c.post_id).desc(), Tag.tag_name)
+    )
+
+    tags = [
+        {"tag_name": tag_name, "number_of_posts": number_of_posts}
+        for tag_name, number_of_posts in results.all()
+    ]
+
+    tags_cache.set('all', tags, generation=generation, stamp=stamp)
+
+    return tags
+
+
+async def query_all_comments_by_post_uuid(post_uuid: str, db: AsyncSession):
+    """
+    Query the data of all comments by a post uuid, with their commenters.
+    :param post_uuid: Uuid of post.
+    :param db: Async session of the database.
+    :return: List of the comments.
+    """
+
+    try:
+        result = await db.scalars(comments_of_post_statement(post_uuid=post_uuid))
+
+        return result.all()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
@@ -2,15 +2,20 @@
 # Filename: crud.py
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.orm import Session, Query, joinedload
+from sqlalchemy import select, insert, delete, desc, func, and_, or_
+from sqlalchemy.sql import Select
+from sqlalchemy.exc import IntegrityError
 from uuid import uuid4
 
-from model.models import User, Posts, Category, Comments
+from model.models import User, Posts, Category, Comments, Tag, post_tags
 from tools.hash_tools import get_password_hashed
+from tools.cache_tools import categories_cache, tags_cache, user_cache
+from tools.conditional_tools import listing_version
 from . import schemas
 from datetime import datetime
 import config
+import re
 
 
 def create_user(UserReg: schemas.UserReg, db: Session) -> dict | bool:
@@ -30,7 +35,7 @@ def create_user(UserReg: schemas.UserReg, db: Session) -> dict | bool:
         )
 
     # Check if email has already used.
-    existing_email = db.query(User).filter(User.email == UserReg.email).first()
+    existing_email = db.scalar(user_by_statement(column=User.email, value=UserReg.email))
     if existing_email:
         raise HTTPException(
             status_code=409,
@@ -127,6 +132,90 @@ def create_admin(db: Session, AdminReg: schemas.UserReg) -> bool | User:
     return db_admin
 
 
+TAGS_SEPARATOR = re.compile(r'[,，;；]')
+TAG_NAME_MAX_LENGTH: int = 64  # Length of `Tag.tag_name`.
+
+
+def split_tags(tags: str) -> list[str]:
+    """
+    Split the tags string of a post into tag names.
+    Blank names are dropped, and repeated names are kept once, ignoring the case.
+    Names longer than a tag can be are refused with 400.
+    :param tags: Tags of the post, separated by commas or semicolons.
+    :return: List of the tag names, in their order.
+    """
+
+    names: dict[str, str] = {}
+
+    for name in TAGS_SEPARATOR.split(tags):
+        name = name.strip()
+
+        if len(name) > TAG_NAME_MAX_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tag '{name[:TAG_NAME_MAX_LENGTH]}...' is longer than {TAG_NAME_MAX_LENGTH} characters!"
+            )
+
+        if name:
+            names.setdefault(name.lower(), name)
+
+    return list(names.values())
+
+
+def get_or_create_tags(tags: str, db: Session) -> list[Tag]:
+    """
+    Get the tags of a tags string, inserting the missing ones.
+    Each new tag is inserted in a savepoint, so that a tag created by a concurrent request at the same time
+    only rolls back that insert, and is read again instead.
+    :param tags: Tags of the post, separated by commas or semicolons.
+    :param db: Session of the database.
+    :return: List of the tags.
+    """
+
+    names = split_tags(tags=tags)
+
+    if not names:
+        return []
+
+    # The unique index on the name serves the lookup, its collation in MySQL ignores the case already.
+    existing = {tag.tag_name.lower(): tag for tag in db.query(Tag).filter(Tag.tag_name.in_(names)).all()}
+    result: list[Tag] = []
+
+    for name in names:
+        tag = existing.get(name.lower())
+
+        if tag is None:
+            try:
+                with db.begin_nested():
+                    tag = Tag(tag_name=name)
+                    db.add(tag)
+
+            except IntegrityError:
+                tag = db.query(Tag).filter(Tag.tag_name == name).one()
+
+        result.append(tag)
+
+    return result
+
+
+def set_post_tags(post: Posts, tags: list[Tag], db: Session) -> None:
+    """
+    Replace the tags of a post.
+    The rows carry the create time of the post, so that the posts of a tag are listed from the index of `post_tags`.
+    :param post: The post, flushed so that it has an id.
+    :param tags: Its tags.
+    :param db: Session of the database.
+    :return: None.
+    """
+
+    db.execute(delete(post_tags).where(post_tags.c.post_id == post.id))
+
+    if tags:
+        db.execute(insert(post_tags), [
+            {'post_id': post.id, 'tag_id': tag.id, 'create_time': post.create_time} for tag in tags
+        ])
+
+
 def create_post(post_uuid: str, user_uuid: str, posts_title: str, tags: str, category_id: int,
                 comment: bool, cover_url: str, db: Session):
     """
@@ -157,9 +246,19 @@ def create_post(post_uuid: str, user_uuid: str, posts_title: str, tags: str, cat
     )
 
     try:
+        tag_list = get_or_create_tags(tags=tags, db=db)
         db.add(db_posts)
+        db.flush()
+        set_post_tags(post=db_posts, tags=tag_list, db=db)
+        listing_version.bump(db=db)
         db.commit()
         db.refresh(db_posts)
+        categories_cache.invalidate()
+        tags_cache.invalidate()
+
+    except HTTPException:
+        db.rollback()
+        raise
 
     except Exception as e:
 
@@ -204,10 +303,20 @@ def update_post(post_uuid: str, user_uuid: str, posts_title: str, tags: str, cat
         if status == 0:
             return False
 
+        db_post = db.query(Posts).filter(Posts.post_uuid == post_uuid).first()
+        set_post_tags(post=db_post, tags=get_or_create_tags(tags=tags, db=db), db=db)
+        listing_version.bump(db=db)
+
         db.commit()
+        categories_cache.invalidate()
+        tags_cache.invalidate()
 
         return True
 
+    except HTTPException:
+        db.rollback()
+        raise
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -215,6 +324,29 @@ def update_post(post_uuid: str, user_uuid: str, posts_title: str, tags: str, cat
         )
 
 
+def touch_post(post_uuid: str, db: Session) -> bool:
+    """
+    Set the update time of a post to now, after its HTML has been rendered again,
+    so that its validators and the cached content of every worker change with it.
+    :param post_uuid: Uuid of the post.
+    :param db: Session of the database.
+    :return: False if the post does not exist.
+    """
+
+    status: int = db.query(Posts).filter(Posts.post_uuid == post_uuid) \
+        .update({'update_time': datetime.utcnow()}, synchronize_session=False)
+
+    if status == 0:
+        db.rollback()
+        return False
+
+    # The update time is shown in the listings.
+    listing_version.bump(db=db)
+    db.commit()
+
+    return True
+
+
 def delete_post(post_uuid: str, user_uuid: str, db: Session):
     """
     Delete a post.
@@ -228,8 +360,14 @@ def delete_post(post_uuid: str, user_uuid: str, db: Session):
         .filter(Posts.post_uuid == post_uuid, Posts.author_uuid == user_uuid).first()
 
     try:
+        # The tags are not deleted with the post by the session, as `Posts.tag_list` is view only,
+        # and the foreign keys do not cascade in SQLite by default.
+        db.execute(delete(post_tags).where(post_tags.c.post_id == db_delete_post.id))
         db.delete(db_delete_post)
+        listing_version.bump(db=db)
         db.commit()
+        categories_cache.invalidate()
+        tags_cache.invalidate()
         return True
     except Exception as e:
         raise HTTPException(
@@ -288,8 +426,10 @@ def create_category_in_db(category: schemas.Category, db: Session):
 
     try:
         db.add(db_category)
+        listing_version.bump(db=db)
         db.commit()
         db.refresh(db_category)
+        categories_cache.invalidate()
 
         return True
 
@@ -308,7 +448,7 @@ def get_user_by_name(user_name: str, db: Session):
     :param user_name: The name of the user.
     :return: The user if they exist, None otherwise.
     """
-    return db.query(User).filter(User.user_name == user_name).first()
+    return db.scalar(user_by_statement(column=User.user_name, value=user_name))
 
 
 def get_user_by_uuid(db: Session, user_uuid: str):
@@ -320,7 +460,7 @@ def get_user_by_uuid(db: Session, user_uuid: str):
     :return: The user if they exist, None otherwise.
     """
 
-    return db.query(User).filter(User.user_uuid == user_uuid).first()
+    return db.scalar(user_by_statement(column=User.user_uuid, value=user_uuid))
 
 
 def get_admin_by_name(db: Session, admin_name: str):
@@ -374,46 +514,201 @@ def check_post_author(author_uuid: str, post_uuid: str, db: Session):
         .filter(Posts.post_uuid == post_uuid, Posts.author_uuid == author_uuid).first()
 
 
+def posts_details_options() -> tuple:
+    """
+    Loader options which load the author and the category of posts in the same statement.
+    They are shared by the sync and the async queries of posts.
+    :return: Tuple of loader options.
+    """
+
+    return (
+        joinedload(Posts.author, innerjoin=True).load_only(User.user_name, User.nick_name),
+        joinedload(Posts.category, innerjoin=True).load_only(Category.category_name)
+    )
+
+
+def posts_after_cursor(cursor: tuple[datetime, int], create_time_column=Posts.create_time,
+                       id_column=Posts.id) -> tuple:
+    """
+    Conditions selecting the posts after a cursor, in the `(create_time, id)` descending order.
+    :param cursor: `(create_time, id)` of the last post of the previous page.
+    :param create_time_column: Column of the create time, `post_tags.c.create_time` when listing from a tag.
+    :param id_column: Column of the id of the post, `post_tags.c.post_id` when listing from a tag.
+    :return: Tuple of the filter conditions.
+    """
+
+    create_time, post_id = cursor
+
+    # The first condition is redundant, but it lets the database range scan on `create_time`.
+    return (
+        create_time_column <= create_time,
+        or_(create_time_column < create_time, and_(create_time_column == create_time, id_column < post_id))
+    )
+
+
+def posts_by_page_statement(page: int, category_id: int | None = None, user_uuid: str | None = None) -> Select:
+    """
+    Build the statement of a page of posts with their authors and categories, newest first.
+    The statements of the hot queries are built here, so that the sync and the async queries,
+    and the check of their plans in `query_plan_tools`, are the same statements.
+    :param page: The page, from 1.
+    :param category_id: ID of the category to limit the posts to, None for all the posts.
+    :param user_uuid: UUID of the author to limit the posts to, None for all the posts.
+    :return: The statement.
+    """
+
+    posts_select_limit: int = config.RESOURCES_POSTS_LIMIT
+    statement = select(Posts).options(*posts_details_options())
+
+    if category_id is not None:
+        statement = statement.filter(Posts.category_id == category_id)
+
+    if user_uuid is not None:
+        statement = statement.filter(Posts.author_uuid == user_uuid)
+
+    return statement.order_by(desc(Posts.create_time)).limit(posts_select_limit).offset((page - 1) * posts_select_limit)
+
+
+def posts_by_cursor_statement(cursor: tuple[datetime, int] | None, user_uuid: str | None = None,
+                              tag_id: int | None = None) -> Select:
+    """
+    Build the statement of the posts after a cursor, with their authors and categories.
+    One more post than the limit is selected, to tell whether there is a next page.
+    :param cursor: `(create_time, id)` of the last post of the previous page, None for the first page.
+    :param user_uuid: UUID of the author to limit the posts to, None for all the posts.
+    :param tag_id: ID of the tag to limit the posts to, None for all the posts.
+    :return: The statement.
+    """
+
+    statement = select(Posts).options(*posts_details_options())
+    create_time_column, id_column = Posts.create_time, Posts.id
+
+    if user_uuid is not None:
+        statement = statement.filter(Posts.author_uuid == user_uuid)
+
+    if tag_id is not None:
+        # Read from the index of `post_tags` on `(tag_id, create_time, post_id)`, in the order of the listing,
+        # so that only the posts of the page are looked up, however rare the tag is.
+        statement = statement.join(post_tags, post_tags.c.post_id == Posts.id).filter(post_tags.c.tag_id == tag_id)
+        create_time_column, id_column = post_tags.c.create_time, post_tags.c.post_id
+
+    if cursor is not None:
+        statement = statement.filter(
+            *posts_after_cursor(cursor=cursor, create_time_column=create_time_column, id_column=id_column)
+        )
+
+    return statement.order_by(desc(create_time_column), desc(id_column)).limit(config.RESOURCES_POSTS_LIMIT + 1)
+
+
+def post_by_uuid_statement(post_uuid: str, details: bool = True) -> Select:
+    """
+    Build the statement of a single post.
+    :param post_uuid: Uuid of the post.
+    :param details: Load the author and the category of the post too.
+    :return: The statement.
+    """
+
+    statement = select(Posts).options(*posts_details_options()) if details else select(Posts)
+
+    return statement.filter(Posts.post_uuid == post_uuid).limit(1)
+
+
+def user_by_statement(column, value) -> Select:
+    """
+    Build the statement of a user by one of their unique columns.
+    :param column: `User.user_name`, `User.user_uuid` or `User.email`.
+    :param value: Value of the column.
+    :return: The statement.
+    """
+
+    return select(User).filter(column == value).limit(1)
+
+
+def tag_by_name_statement(tag_name: str) -> Select:
+    """
+    Build the statement of a tag by its name.
+    :param tag_name: Name of the tag.
+    :return: The statement.
+    """
+
+    return select(Tag).filter(Tag.tag_name == tag_name).limit(1)
+
+
+def comments_of_post_statement(post_uuid: str) -> Select:
+    """
+    Build the statement of the comments of a post with their commenters, newest first.
+    :param post_uuid: Uuid of the post.
+    :return: The statement.
+    """
+
+    return select(Comments).options(comments_user_option()) \
+        .filter(Comments.post_uuid == post_uuid).order_by(desc(Comments.date))
+
+
+def query_posts_with_details(db: Session) -> Query:
+    """
+    Build a query of posts which loads the author and the category in the same statement,
+    so that listing them does not cost one extra query per post.
+    :param db: Session of the database.
+    :return: Query of posts.
+    """
+
+    return db.query(Posts).options(*posts_details_options())
+
+
 def select_all_posts_by_page(page: int, db: Session):
     """
     Function to retrieve posts from the database, paginated by the given page number.
     Return 10 items of the posts by default.
     It could be decided by the `config.py`.
+    The author and the category of each post are loaded by the same query.
     :param page: The Page.
     :param db: Session of the database.
     :return: List type data of posts.
     """
 
-    # Get the maximum amount posts to retrieve per page from the configuration.
-    posts_select_limit: int = config.RESOURCES_POSTS_LIMIT
+    return db.scalars(posts_by_page_statement(page=page)).all()
 
-    # Calculate the offset for the database query based on the page number and posts limit.
-    page_db: int = (page - 1) * posts_select_limit
 
-    # Query the database for posts, ordered by date in descending order.
-    # Limit the amount results by the posts limit and offset the results by the calculated offset.
-    # Return all results as a list.
+def select_posts_of_category_by_page(category_id: int, page: int, db: Session):
+    """
+    Retrieve the posts of a category with their authors and categories, paginated by the given page number.
+    :param category_id: ID of the category.
+    :param page: The Page.
+    :param db: Session of the database.
+    :return: List type data of posts.
+    """
 
-    return db.query(Posts) \
-        .order_by(desc(Posts.create_time)) \
-        .limit(posts_select_limit).offset(page_db).all()
+    return db.scalars(posts_by_page_statement(page=page, category_id=category_id)).all()
 
 
 def select_all_posts_of_user_by_page(user_uuid: str, page: int, db: Session):
     """
     Function to retrieve posts by user_uuid from the database, paginated by given page number.
+    The author and the category of each post are loaded by the same query.
     :param user_uuid: UUID of the user.
     :param page: THe Page.
     :param db: Session of the database.
     :return: List type data of posts.
     """
-    posts_select_limit: int = config.RESOURCES_POSTS_LIMIT
-    page_db: int = (page - 1) * posts_select_limit
+    return db.scalars(posts_by_page_statement(page=page, user_uuid=user_uuid)).all()
 
-    return db.query(Posts)\
-        .filter(Posts.author_uuid == user_uuid)\
-        .order_by(desc(Posts.create_time))\
-        .limit(posts_select_limit).offset(page_db).all()
+
+def select_posts_by_cursor(cursor: tuple[datetime, int] | None, db: Session, user_uuid: str | None = None,
+                           tag_id: int | None = None):
+    """
+    Function to retrieve posts from the database after a cursor, instead of skipping an offset.
+    The posts are ordered by `(create_time, id)` in descending order,
+    so the position of a page only depends on the last post of the previous page.
+    One more post than the limit is returned to tell whether there is a next page.
+    :param cursor: `(create_time, id)` of the last post of the previous page, None for the first page.
+    :param db: Session of the database.
+    :param user_uuid: UUID of the user to limit the posts to, None for all the posts.
+    :param tag_id: ID of the tag to limit the posts to, None for all the posts.
+    :return: List type data of posts.
+    """
+
+    return db.scalars(posts_by_cursor_statement(cursor=cursor, user_uuid=user_uuid, tag_id=tag_id)).all()
 
 
 def get_single_post_data(post_uuid: str, db: Session):
@@ -424,16 +719,60 @@ def get_single_post_data(post_uuid: str, db: Session):
     :return: The dict type data of a single post.
     """
 
-    return db.query(Posts).filter(Posts.post_uuid == post_uuid).first()
+    return db.scalar(post_by_uuid_statement(post_uuid=post_uuid, details=False))
+
+
+def get_single_post_with_details(post_uuid: str, db: Session):
+    """
+    Get a single post from the database, together with its author and category.
+    :param post_uuid: Uuid of the post.
+    :param db: Session of the database.
+    :return: The post if it exists, None otherwise.
+    """
+
+    return db.scalar(post_by_uuid_statement(post_uuid=post_uuid))
+
+
+def get_posts_with_details_by_uuids(post_uuids: list[str], db: Session):
+    """
+    Get the posts of a list of uuids, together with their authors and categories.
+    :param post_uuids: Uuids of the posts.
+    :param db: Session of the database.
+    :return: List of the posts, in no particular order.
+    """
+
+    if not post_uuids:
+        return []
+
+    return query_posts_with_details(db=db).filter(Posts.post_uuid.in_(post_uuids)).all()
 
 
-def get_all_categories_in_db(db: Session):
+def get_posts_update_times(db: Session):
+    """
+    Get the update time of every post, without loading the posts.
+    :param db: Session of the database.
+    :return: List of `(post_uuid, update_time)`.
+    """
+
+    return db.query(Posts.post_uuid, Posts.update_time).all()
+
+
+def get_all_categories_in_db(stamp: str, db: Session):
     """
     Get all the categories from the database.
+    The result is served from `categories_cache` until a write drops it, or the listings change in another worker.
+    :param stamp: ETag of the listings, read in the same session, which the cached result must have been stored with.
     :param db: Session of the database.
     :return: Return the data of all the categories.
     """
 
+    categories = categories_cache.get('all', stamp=stamp)
+
+    if categories is not None:
+        return categories
+
+    generation: int = categories_cache.generation
+
     results = db.query(
         Category.id.label("category_id"),
         Category.category_name,
@@ -448,9 +787,21 @@ def get_all_categories_in_db(db: Session):
         for category_id, category_name, number_of_posts in results
     ]
 
+    categories_cache.set('all', categories, generation=generation, stamp=stamp)
+
     return categories
 
 
+def get_all_category_ids(db: Session) -> list[int]:
+    """
+    Get the ID of every category.
+    :param db: Session of the database.
+    :return: List of the IDs.
+    """
+
+    return [category_id for (category_id,) in db.query(Category.id).all()]
+
+
 def get_category_in_db(category_id: int, db: Session):
     """
     Get a category_name in the database.
@@ -462,9 +813,19 @@ def get_category_in_db(category_id: int, db: Session):
     return db.query(Category.category_name).filter(Category.id == category_id).first()
 
 
+def comments_user_option():
+    """
+    Loader option which loads the commenter of comments in the same statement.
+    :return: The loader option.
+    """
+
+    return joinedload(Comments.user, innerjoin=True).load_only(User.nick_name, User.avatar_path)
+
+
 def query_all_comments_by_post_uuid(post_uuid: str, db: Session) -> list[type(Comments)]:
     """
     Query the data of all comments by a post uuid.
+    The commenters are loaded by the same query.
     :param post_uuid: Uuid of post.
     :param db: Session of the database.
     :return:
@@ -472,7 +833,7 @@ def query_all_comments_by_post_uuid(post_uuid: str, db: Session) -> list[type(Co
 
     try:
         # Query the comments.
-        db_comments = db.query(Comments).order_by(desc(Comments.date)).filter(Comments.post_uuid == post_uuid).all()
+        db_comments = db.scalars(comments_of_post_statement(post_uuid=post_uuid)).all()
         return db_comments
     except Exception as e:
         raise HTTPException(
@@ -499,7 +860,10 @@ def update_the_nick_name_by_uuid(new_nick_name: str, user_uuid: str, db: Session
         if status == 0:
             return False
 
+        # The nick names of the authors are shown in the listings.
+        listing_version.bump(db=db)
         db.commit()
+        user_cache.invalidate(user_uuid)
         return True
 
     except Exception as e:
@@ -528,6 +892,39 @@ def update_the_description_by_uuid(new_description: str, user_uuid: str, db: Ses
             return False
 
         db.commit()
+        user_cache.invalidate(user_uuid)
+        return True
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+def update_avatar_by_uuid(user_uuid: str, avatar_path: str, avatar_version: int, db: Session):
+    """
+    Point a user to a new avatar and bump the version of the avatar.
+    The row is only updated if the version is still the one the new avatar was based on.
+    :param user_uuid: UUID of the user.
+    :param avatar_path: Path of the new avatar file.
+    :param avatar_version: The version of the avatar before the update.
+    :param db: Session of the database.
+    :return: Status of the operation.
+    """
+
+    try:
+        status: int = db.query(User) \
+            .filter(User.user_uuid == user_uuid, User.avatar_version == avatar_version) \
+            .update(
+            {"avatar_path": avatar_path, "avatar_version": avatar_version + 1},
+            synchronize_session="evaluate")
+
+        if status == 0:
+            return False
+
+        db.commit()
+        user_cache.invalidate(user_uuid)
         return True
 
     except Exception as e:
@@ -557,6 +954,7 @@ def update_password(user_uuid: str, new_password: str, db: Session):
             return False
 
         db.commit()
+        user_cache.invalidate(user_uuid)
         return True
     except Exception as e:
         raise HTTPException(
@@ -1,10 +1,24 @@
 # encoding: utf-8
 # Filename: models.py
 
-from sqlalchemy import Column, INT, VARCHAR, TEXT, DATETIME, BOOLEAN, ForeignKey
+from sqlalchemy import Column, INT, VARCHAR, TEXT, DATETIME, BOOLEAN, ForeignKey, Index, Table
+from sqlalchemy.orm import relationship
 from dependencies.db import Base
 
 
+# Association of the posts and their tags.
+# The primary key looks up the tags of a post. The index lists the posts of a tag in the order of the listings,
+# from the create time of the posts copied here, see `crud.set_post_tags`.
+post_tags = Table(
+    'post_tags',
+    Base.metadata,
+    Column('post_id', INT, ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', INT, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    Column('create_time', DATETIME, nullable=False),
+    Index('ix_post_tags_tag_id_create_time', 'tag_id', 'create_time', 'post_id')
+)
+
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(INT, primary_key=True, index=True, autoincrement=True)
@@ -16,6 +30,8 @@ class User(Base):
     description = Column(TEXT, nullable=False, default="这个人很懒，什么都没有留下。")
     administrator = Column(BOOLEAN, nullable=False, default=False)
     date = Column(DATETIME, nullable=False)
+    avatar_path = Column(VARCHAR(255), nullable=True)
+    avatar_version = Column(INT, nullable=False, default=0, server_default='0')
 
 
 class Posts(Base):
@@ -31,6 +47,24 @@ class Posts(Base):
     create_time = Column(DATETIME, nullable=False)
     update_time = Column(DATETIME, nullable=False)
 
+    # `author_uuid` has no foreign key constraint in the schema,
+    # so the join condition is declared explicitly.
+    author = relationship(
+        'User',
+        primaryjoin='foreign(Posts.author_uuid) == User.user_uuid',
+        viewonly=True
+    )
+    category = relationship('Category', viewonly=True)
+    # Normalized copy of `tags`, written by `crud.set_post_tags`, which fills the create time of the rows too.
+    tag_list = relationship('Tag', secondary=post_tags, viewonly=True)
+
+    # Listings ordered by `(create_time, id)`, and the listings of a single author or category.
+    __table_args__ = (
+        Index('ix_posts_create_time_id', 'create_time', 'id'),
+        Index('ix_posts_author_uuid_create_time', 'author_uuid', 'create_time'),
+        Index('ix_posts_category_id_create_time', 'category_id', 'create_time'),
+    )
+
 
 class Category(Base):
     __tablename__ = 'categories'
@@ -39,6 +73,12 @@ class Category(Base):
     datetime = Column(DATETIME, nullable=False)
 
 
+class Tag(Base):
+    __tablename__ = 'tags'
+    id = Column(INT, primary_key=True, autoincrement=True)
+    tag_name = Column(VARCHAR(64), unique=True, nullable=False)
+
+
 class Comments(Base):
     __tablename__ = 'comments'
     id = Column(INT, primary_key=True, autoincrement=True)
@@ -47,3 +87,23 @@ class Comments(Base):
     user_uuid = Column(VARCHAR(36), nullable=False)
     content = Column(TEXT, nullable=False)
     date = Column(DATETIME, nullable=False)
+
+    user = relationship(
+        'User',
+        primaryjoin='foreign(Comments.user_uuid) == User.user_uuid',
+        viewonly=True
+    )
+
+    # Comment threads of a post, ordered by date.
+    __table_args__ = (
+        Index('ix_comments_post_uuid_date', 'post_uuid', 'date'),
+    )
+
+
+# A single row, stamped in the transaction of every write shown in the listings,
+# so that every worker of the server derives the same validators of the listings from it.
+class ListingStamp(Base):
+    __tablename__ = 'listing_stamp'
+    id = Column(INT, primary_key=True, autoincrement=False)
+    version = Column(INT, nullable=False)
+    last_modified = Column(DATETIME, nullable=False)
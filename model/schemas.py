@@ -39,3 +39,17 @@ class UserModify(BaseModel):
 class PasswordChange(BaseModel):
     new_password: str
     verify_new_password: str
+
+
+class Principal(BaseModel):
+    id: int
+    user_uuid: str
+    user_name: str
+    nick_name: str
+    email: str
+    description: str
+    administrator: bool
+    avatar_path: str | None = None
+
+    class Config:
+        from_attributes = True
@@ -5,7 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from model import crud
 from dependencies.db import get_db
-from tools import admin_tools
+from dependencies.principal import get_current_admin
+from tools import admin_tools, metrics_tools
 import config
 
 router_admin = APIRouter(
@@ -25,6 +26,11 @@ def get_all_users():
     pass
 
 
-@router_admin.get('/status')
-def status() -> None:
-    pass
+@router_admin.get('/status', dependencies=[Depends(get_current_admin)])
+async def get_status() -> dict:
+    """
+    * Get the metrics of the server, the same as `/metrics` but in JSON.
+    * :return: Requests and latency by route, queries, connection pools, caches, executors and the process.
+    """
+
+    return metrics_tools.format_status(metrics=metrics_tools.collect())
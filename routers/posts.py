@@ -5,8 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from uuid import uuid4
 from sqlalchemy.orm import Session
 from dependencies.db import get_db
-from dependencies.oauth2scheme import oauth2Scheme
-from tools import posts_tools, token_tools, file_tools
+from dependencies.principal import get_current_admin
+from tools import posts_tools, file_tools, search_tools, conditional_tools
 from model import crud, schemas
 
 router_posts = APIRouter(
@@ -28,7 +28,7 @@ def create_a_post(posts_title: str = Form(),
                   comment: bool = Form(),
                   cover_url: str = Form(),
                   content_file: UploadFile = File(),
-                  token: str = Depends(oauth2Scheme),
+                  author: schemas.Principal = Depends(get_current_admin),
                   db: Session = Depends(get_db)):
     """
     * Send a post with a file.
@@ -38,21 +38,14 @@ def create_a_post(posts_title: str = Form(),
     * :param category_id: Category of the post.
     * :param comment: Allow to comment or not.
     * :param content_file: Markdown file.
-    * :param token: Token of the user.
+    * :param author: The logged administrator.
     * :param db: Session of the database.
     * :return: Response of the server.
     """
 
-    author_uuid = token_tools.get_uuid_by_token(token=token)
-    author = crud.get_admin_by_uuid(admin_uuid=author_uuid, db=db)
+    author_uuid = author.user_uuid
     post_uuid: str = str(uuid4())
 
-    if not author:
-        raise HTTPException(
-            status_code=401,
-            detail="Permission Denied!"
-        )
-
     if not file_tools.check_posts_file_allowed(upload_file=content_file):
         raise HTTPException(
             status_code=400,
@@ -65,6 +58,9 @@ def create_a_post(posts_title: str = Form(),
             detail=f" Category '{category_id}' does not exist!"
         )
 
+    # Refuse the invalid tags before the file is written.
+    crud.split_tags(tags=tags)
+
     if not posts_tools.write_the_post(user_name=author.user_name, post_uuid=post_uuid, post_file=content_file):
         raise HTTPException(
             status_code=500,
@@ -73,6 +69,8 @@ def create_a_post(posts_title: str = Form(),
 
     if crud.create_post(post_uuid=post_uuid, posts_title=posts_title, tags=tags,
                         comment=comment, category_id=category_id, user_uuid=author_uuid, cover_url=cover_url, db=db):
+        search_tools.index_post(post=crud.get_single_post_with_details(post_uuid=post_uuid, db=db))
+
         return {
             "Status": "Success!"
         }
@@ -86,7 +84,7 @@ def update_a_post(post_uuid: str = Form(),
                   category_id: int = Form(),
                   comment: bool = Form(),
                   new_content_file: UploadFile = File(),
-                  token: str = Depends(oauth2Scheme),
+                  author: schemas.Principal = Depends(get_current_admin),
                   db: Session = Depends(get_db)):
     """
     * Update a post with new information and a file.
@@ -97,18 +95,11 @@ def update_a_post(post_uuid: str = Form(),
     * :param category_id: Category of the post.
     * :param comment: Allow to comment or not.
     * :param new_content_file: Markdown file
-    * :param token: Token of the user.
+    * :param author: The logged administrator.
     * :param db: Session of the database.
     * :return: Response of the server.
     """
-    author_uuid = token_tools.get_uuid_by_token(token=token)
-    author = crud.get_admin_by_uuid(admin_uuid=author_uuid, db=db)
-
-    if not author:
-        raise HTTPException(
-            status_code=401,
-            detail="Permission Denied!"
-        )
+    author_uuid = author.user_uuid
 
     if not file_tools.check_posts_file_allowed(upload_file=new_content_file):
         raise HTTPException(
@@ -128,6 +119,9 @@ def update_a_post(post_uuid: str = Form(),
             detail=f"The post is not authorized by user '{author.user_name}' !"
         )
 
+    # Refuse the invalid tags before the file is written.
+    crud.split_tags(tags=tags)
+
     if not posts_tools.write_the_post(user_name=author.user_name, post_uuid=post_uuid, post_file=new_content_file):
         raise HTTPException(
             status_code=500,
@@ -136,29 +130,25 @@ def update_a_post(post_uuid: str = Form(),
 
     if crud.update_post(post_uuid=post_uuid, user_uuid=author_uuid, posts_title=posts_title,
                         tags=tags, category_id=category_id, comment=comment, cover_url=cover_url, db=db):
+        search_tools.index_post(post=crud.get_single_post_with_details(post_uuid=post_uuid, db=db))
+
         return {
             "Status": "Success!"
         }
 
 
 @router_posts.delete('/delete')
-def delete_a_post(post_uuid: str = Form(), token: str = Depends(oauth2Scheme), db: Session = Depends(get_db)):
+def delete_a_post(post_uuid: str = Form(), author: schemas.Principal = Depends(get_current_admin),
+                  db: Session = Depends(get_db)):
     """
     Delete a post.
     :param post_uuid: Uuid of the post.
-    :param token: Token of the user.
+    :param author: The logged administrator.
     :param db: Session of the database.
     :return: Session of the database.
     """
 
-    author_uuid = token_tools.get_uuid_by_token(token=token)
-    author = crud.get_admin_by_uuid(admin_uuid=author_uuid, db=db)
-
-    if not author:
-        raise HTTPException(
-            status_code=401,
-            detail="Permission Denied!"
-        )
+    author_uuid = author.user_uuid
 
     if not posts_tools.check_if_authorized(author_uuid=author_uuid, post_uuid=post_uuid, db=db):
         raise HTTPException(
@@ -173,31 +163,53 @@ def delete_a_post(post_uuid: str = Form(), token: str = Depends(oauth2Scheme), d
         )
 
     if crud.delete_post(user_uuid=author.user_uuid, post_uuid=post_uuid, db=db):
+        search_tools.remove_post(post_uuid=post_uuid)
+
         return {
             "Status": "Success!"
         }
 
 
+@router_posts.post('/rerender', status_code=202, dependencies=[Depends(get_current_admin)])
+def rerender_all_posts():
+    """
+    Start rendering the HTML of every post again from its Markdown, after the renderer has changed.
+    It runs in the background, its progress is read from `GET /api/posts/rerender`.
+    :return: Status of the request.
+    """
+
+    if not posts_tools.rerender_job.start():
+        raise HTTPException(
+            status_code=409,
+            detail="The posts are being rendered already!"
+        )
+
+    return {
+        "Status": "Started!"
+    }
+
+
+@router_posts.get('/rerender', dependencies=[Depends(get_current_admin)])
+def get_rerender_status():
+    """
+    Get the state of the last rendering of every post.
+    :return: Whether it is running, the amount of the posts rendered, and its times.
+    """
+
+    return posts_tools.rerender_job.stats()
+
+
 @router_posts.post('/categories/create')
 def create_categories(category: schemas.Category,
-                      token: str = Depends(oauth2Scheme), db: Session = Depends(get_db)):
+                      author: schemas.Principal = Depends(get_current_admin), db: Session = Depends(get_db)):
     """
     Create a category.
     :param category: Category name.
-    :param token: Token of a user.
+    :param author: The logged administrator.
     :param db: Session of database.
     :return: Status of the request.
     """
 
-    author_uuid = token_tools.get_uuid_by_token(token=token)
-    author = crud.get_admin_by_uuid(admin_uuid=author_uuid, db=db)
-
-    if not author:
-        raise HTTPException(
-            status_code=401,
-            detail="Permission Denied!"
-        )
-
     if crud.create_category_in_db(category=category, db=db):
         return {
             "Status": "Success!"
@@ -205,11 +217,13 @@ def create_categories(category: schemas.Category,
 
 
 @router_posts.get('/categories/getAll')
-def get_all_categories(db: Session = Depends(get_db)):
+def get_all_categories(db: Session = Depends(get_db),
+                       validators: tuple = Depends(conditional_tools.check_listing_conditions)):
     """
     Get all existing categories.
     :param db: Session of the database.
+    :param validators: ETag and last modified time of the listings, read before the categories.
     :return:
     """
 
-    return crud.get_all_categories_in_db(db=db)
+    return crud.get_all_categories_in_db(stamp=validators[0], db=db)
@@ -1,21 +1,21 @@
 # encoding: utf-8
 # Filename: resources.py
-import os
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from dependencies.db import get_async_db
+from dependencies.principal import get_current_user
+from model import async_crud, schemas
+from tools import resource_tools, user_data_tools, conditional_tools, compression_tools
+from tools.snapshot_tools import listing_snapshots
 import config
-from dependencies.db import get_db
-from dependencies.oauth2scheme import oauth2Scheme
-from model import crud
-from pathlib import Path
-from tools import resource_tools, token_tools
 
 router_resources = APIRouter(
     prefix='/api/resources',
     tags=['Resources'],
-    dependencies=[Depends(get_db)],
+    dependencies=[Depends(get_async_db)],
     responses={
         404: {
             'description': 'Not Found.'
@@ -24,59 +24,121 @@ router_resources = APIRouter(
 )
 
 
+@router_resources.get('/posts')
+async def get_posts_by_cursor(cursor: str | None = None, db: AsyncSession = Depends(get_async_db),
+                              validators: tuple = Depends(conditional_tools.check_listing_conditions)):
+    """
+    * Get the data of posts after a cursor.
+    * Unlike `/posts/{page}`, the cost of a page does not grow with its depth.
+    * **:param cursor**: The `next_cursor` of the previous page, omit it for the first page.
+    * **:param db**: Async session of the database.
+    * **:param validators**: ETag and last modified time of the listings.
+    * **:return**: The posts and the `next_cursor`, which is null on the last page.
+    """
+
+    if cursor is None:
+        snapshot = listing_snapshots.get(key=('posts_by_cursor',), etag=validators[0], last_modified=validators[1])
+
+        if snapshot is not None:
+            return snapshot
+
+    return await resource_tools.get_page_of_posts_by_cursor(cursor=cursor, db=db)
+
+
+@router_resources.get('/posts/per_user')
+async def get_posts_of_single_user_by_cursor(cursor: str | None = None,
+                                             user: schemas.Principal = Depends(get_current_user),
+                                             db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the posts of the logged user after a cursor.
+    :param cursor: The `next_cursor` of the previous page, omit it for the first page.
+    :param user: The logged user.
+    :param db: Async session of the database.
+    :return: The posts and the `next_cursor`, which is null on the last page.
+    """
+
+    return await resource_tools.get_page_of_posts_by_cursor(cursor=cursor, user_uuid=user.user_uuid, db=db)
+
+
 @router_resources.get('/posts/{page}')
-def get_posts(page: int, db: Session = Depends(get_db)):
+async def get_posts(page: int, db: AsyncSession = Depends(get_async_db),
+                    validators: tuple = Depends(conditional_tools.check_listing_conditions)):
     """
     * Get the data of posts.
     * Each page will return 10 items of the posts by default.
     * It could be decided by the `config.py`.
     * **:param page**: The page of the posts.
-    * **:param db**: Session of the database.
+    * **:param db**: Async session of the database.
+    * **:param validators**: ETag and last modified time of the listings.
     * **:return**: The dict type data of posts.
     """
 
-    data_from_db = resource_tools.get_data_of_posts_from_db(page=page, db=db)
-    list_for_return: list[dict] = []
-
-    for x in data_from_db:
-        author = crud.get_user_by_uuid(user_uuid=x.author_uuid, db=db)
-        category_name = crud.get_category_name(category_id=x.category_id, db=db).category_name
-        temp_dict: dict = {
-            'id': x.id,
-            'post_uuid': x.post_uuid,
-            'title': x.title,
-            'author_uuid': x.author_uuid,
-            'author_name': author.nick_name,
-            'cover_url': x.cover_url,
-            'tags': x.tags,
-            'category_id': x.category_id,
-            'category': category_name,
-            'comment': x.comment,
-            'create_time': x.create_time,
-            'update_time': x.update_time
-        }
+    snapshot = listing_snapshots.get(key=('posts', page), etag=validators[0], last_modified=validators[1])
+
+    if snapshot is not None:
+        return snapshot
+
+    data_from_db = await resource_tools.get_data_of_posts_from_db(page=page, db=db)
+
+    return [resource_tools.format_post_summary(post=x) for x in data_from_db]
+
+
+@router_resources.get('/search')
+async def search_posts(q: str, page: int = 1, db: AsyncSession = Depends(get_async_db),
+                       validators: tuple = Depends(conditional_tools.check_listing_conditions)):
+    """
+    * Search the posts by their title, tags and content.
+    * The results are ranked by relevance, 10 by page by default.
+    * **:param q**: Words to search.
+    * **:param page**: The page of the results.
+    * **:param db**: Async session of the database.
+    * **:param validators**: ETag and last modified time of the listings.
+    * **:return**: The amount of matches, and the posts of the page with their scores.
+    """
 
-        list_for_return.append(temp_dict)
+    if page < 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid page '{page}'!"
+        )
 
-    return list_for_return
+    return await resource_tools.search_posts(query=q, page=page, stamp=validators[0], db=db)
 
 
 @router_resources.get('/posts/get/{post_uuid}')
-def get_single_post(post_uuid: str, db: Session = Depends(get_db)):
+async def get_single_post(post_uuid: str, request: Request, response: Response,
+                          db: AsyncSession = Depends(get_async_db)):
     """
     Get a single post by uuid.
+    Answered with 304 when the client still holds the current version of the post.
     :param post_uuid: Uuid of the post.
-    :param db: Session of the database.
+    :param request: The request, with its conditional headers.
+    :param response: The response, which gets the validators of the post.
+    :param db: Async session of the database.
     :return: Content, information of the post.
     """
 
     # Get the data from the database.
-    db_post_info = resource_tools.get_data_of_single_post_from_db(post_uuid=post_uuid, db=db)
-    author = crud.get_user_by_uuid(user_uuid=db_post_info.author_uuid, db=db)
-    category_name = crud.get_category_name(category_id=db_post_info.category_id, db=db).category_name
+    db_post_info = await resource_tools.get_data_of_single_post_from_db(post_uuid=post_uuid, db=db)
+
+    if not db_post_info:
+        raise HTTPException(
+            status_code=404,
+            detail=f"The post {post_uuid} does not exist!"
+        )
+
+    # Before the content is read or the response is built.
+    conditional_tools.evaluate_conditions(request=request, response=response,
+                                          etag=conditional_tools.get_post_etag(post=db_post_info),
+                                          last_modified=db_post_info.update_time)
+
+    author = db_post_info.author
+    category_name = db_post_info.category.category_name
 
     # Read the content of the post.
-    post_content = resource_tools.read_post_content(post_uuid=post_uuid, author_name=author.user_name)
+    post_content = await run_in_threadpool(
+        resource_tools.read_post_content,
+        post_uuid=post_uuid, author_name=author.user_name, update_time=db_post_info.update_time)
 
     # Regenerate the data.
     post_info = {
@@ -98,41 +160,134 @@ def get_single_post(post_uuid: str, db: Session = Depends(get_db)):
     return post_info
 
 
+@router_resources.get('/posts/content/{post_uuid}')
+async def get_single_post_content(post_uuid: str, request: Request, response: Response,
+                                  db: AsyncSession = Depends(get_async_db)):
+    """
+    * Get the rendered HTML of a single post.
+    * The variant precompressed at publish time is served when the client accepts brotli or gzip.
+    * **:param post_uuid**: Uuid of the post.
+    * **:param request**: The request, with its conditional headers.
+    * **:param response**: The response, which gets the validators of the post.
+    * **:param db**: Async session of the database.
+    * **:return**: HTML of the post.
+    """
+
+    db_post_info = await resource_tools.get_data_of_single_post_from_db(post_uuid=post_uuid, db=db)
+
+    if not db_post_info:
+        raise HTTPException(
+            status_code=404,
+            detail=f"The post {post_uuid} does not exist!"
+        )
+
+    validators = conditional_tools.evaluate_conditions(request=request, response=response,
+                                                       etag=conditional_tools.get_post_etag(post=db_post_info),
+                                                       last_modified=db_post_info.update_time)
+    html_path = resource_tools.get_post_html_path(post_uuid=post_uuid, author_name=db_post_info.author.user_name)
+
+    try:
+        return await run_in_threadpool(
+            compression_tools.html_file_response,
+            html_path=html_path, accept_encoding=request.headers.get('accept-encoding', ''), headers=validators)
+
+    except OSError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
 @router_resources.get('/categories/getAll')
-def get_all_categories(db: Session = Depends(get_db)):
+async def get_all_categories(db: AsyncSession = Depends(get_async_db),
+                             validators: tuple = Depends(conditional_tools.check_listing_conditions)):
     """
     Get all the categories.
-    :param db:
+    :param db: Async session of the database.
+    :param validators: ETag and last modified time of the listings.
     :return: Data of categories.
     """
 
-    return crud.get_all_categories_in_db(db=db)
+    return await async_crud.get_all_categories_in_db(stamp=validators[0], db=db)
 
 
-@router_resources.get('/user_info/get')
-def get_user_info(token: str = Depends(oauth2Scheme), db: Session = Depends(get_db)):
+@router_resources.get('/categories/{category_id}/posts/{page}')
+async def get_posts_of_category(category_id: int, page: int, db: AsyncSession = Depends(get_async_db),
+                                validators: tuple = Depends(conditional_tools.check_listing_conditions)):
     """
-    Get information of the logged user.
-    :param token: Token of user.
-    :param db: Session of database.
-    :return: Data of the logged user.
+    * Get the data of the posts in a category.
+    * Each page will return 10 items of the posts by default.
+    * **:param category_id**: ID of the category.
+    * **:param page**: The page of the posts.
+    * **:param db**: Async session of the database.
+    * **:param validators**: ETag and last modified time of the listings.
+    * **:return**: The dict type data of posts.
     """
-    try:
-        user_uuid = token_tools.get_uuid_by_token(token=token)
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = crud.get_user_by_uuid(user_uuid=user_uuid, db=db) if crud.get_user_by_uuid(user_uuid=user_uuid, db=db) else \
-        crud.get_admin_by_uuid(admin_uuid=user_uuid, db=db)
+    snapshot = listing_snapshots.get(key=('category', category_id, page),
+                                     etag=validators[0], last_modified=validators[1])
+
+    if snapshot is not None:
+        return snapshot
+
+    if not await async_crud.get_category_name(category_id=category_id, db=db):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Category '{category_id}' does not exist!"
+        )
+
+    data_from_db = await async_crud.select_posts_of_category_by_page(category_id=category_id, page=page, db=db)
+
+    return [resource_tools.format_post_summary(post=x) for x in data_from_db]
 
-    if not user:
+
+@router_resources.get('/tags')
+async def get_all_tags(db: AsyncSession = Depends(get_async_db),
+                       validators: tuple = Depends(conditional_tools.check_listing_conditions)):
+    """
+    Get all the tags used by posts, with the amount of their posts.
+    :param db: Async session of the database.
+    :param validators: ETag and last modified time of the listings.
+    :return: Data of the tags, the most used first.
+    """
+
+    return await async_crud.get_all_tags_in_db(stamp=validators[0], db=db)
+
+
+@router_resources.get('/tags/{tag_name}/posts', dependencies=[Depends(conditional_tools.check_listing_conditions)])
+async def get_posts_of_tag_by_cursor(tag_name: str, cursor: str | None = None,
+                                     db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the posts carrying a tag after a cursor.
+    :param tag_name: Name of the tag.
+    :param cursor: The `next_cursor` of the previous page, omit it for the first page.
+    :param db: Async session of the database.
+    :return: The posts and the `next_cursor`, which is null on the last page.
+    """
+
+    tag = await async_crud.get_tag_by_name(tag_name=tag_name, db=db)
+
+    if not tag:
         raise HTTPException(
-            status_code=401,
-            detail="Permission denied."
+            status_code=404,
+            detail=f"The tag '{tag_name}' does not exist!"
         )
 
-    avatar_path = Path(config.STATIC_DIR).joinpath('users', user_uuid)
-    avatar_filename = os.listdir(avatar_path)[0]
+    return await resource_tools.get_page_of_posts_by_cursor(cursor=cursor, tag_id=tag.id, db=db)
+
+
+@router_resources.get('/user_info/get')
+async def get_user_info(avatar_size: int = config.DEFAULT_AVATAR_SIZE, avatar_format: str = config.AVATAR_FORMATS[0],
+                        user: schemas.Principal = Depends(get_current_user)):
+    """
+    Get information of the logged user.
+    :param avatar_size: Size of the avatar in pixels, rounded up to the next size available.
+    :param avatar_format: Format of the avatar, `webp` or `jpg`.
+    :param user: The logged user.
+    :return: Data of the logged user.
+    """
+
+    user_data_tools.check_avatar_format(avatar_format=avatar_format)
 
     user_info = {
         "id": user.id,
@@ -141,22 +296,24 @@ def get_user_info(token: str = Depends(oauth2Scheme), db: Session = Depends(get_
         "administrator": user.administrator,
         "email": user.email,
         "bio": user.description,
-        "avatar": '/' + str(avatar_path.joinpath(avatar_filename))
+        "avatar": user_data_tools.get_avatar_url(avatar_path=user.avatar_path, avatar_size=avatar_size,
+                                                 avatar_format=avatar_format)
     }
 
     return user_info
 
 
 @router_resources.get('/posts/per_user/{page}')
-def get_all_posts_of_single_user(page: int, token: str = Depends(oauth2Scheme), db: Session = Depends(get_db)):
+async def get_all_posts_of_single_user(page: int, user: schemas.Principal = Depends(get_current_user),
+                                       db: AsyncSession = Depends(get_async_db)):
     """
     Get all the posts of one user, and limited by pages.
-    :param db: Session of the database.
+    :param db: Async session of the database.
     :param page: Page of the posts list.
-    :type token: Token of the user.
+    :param user: The logged user.
     :return: A list of posts.
     """
 
-    user_uuid: str = token_tools.get_uuid_by_token(token=token)
+    data_from_db = await resource_tools.get_data_of_user_posts_from_db(user_uuid=user.user_uuid, page=page, db=db)
 
-    return resource_tools.get_data_of_user_posts_from_db(user_uuid=user_uuid, page=page, db=db)
+    return [resource_tools.format_post_summary(post=x) for x in data_from_db]
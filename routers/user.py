@@ -8,8 +8,9 @@ from fastapi.security import OAuth2PasswordRequestForm
 from model import schemas, crud
 from jose import JWTError
 from sqlalchemy.orm import Session
-from dependencies.db import get_db
-from dependencies.oauth2scheme import oauth2Scheme
+from sqlalchemy.ext.asyncio import AsyncSession
+from dependencies.db import get_db, get_async_db
+from dependencies.principal import get_current_user
 from tools import token_tools, user_data_tools, file_tools
 import config
 
@@ -50,20 +51,20 @@ def create_user(UserReg: schemas.UserReg, db: Session = Depends(get_db)):
 
 
 @router_user.post('/token')
-def user_login(UserLogin: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def user_login(UserLogin: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     * Login an account by providing username and password, then return a token.
     * **:param UserLogin**: The information to sign in.
-    * **:param db**: Session of database.
+    * **:param db**: Async session of database.
     * **:return**: Token to authenticate.
     """
 
     # Authenticate the user using the provided username and password
-    user_authentication = token_tools.authenticate_user(
+    user = await token_tools.authenticate_user(
         user_name=UserLogin.username, password=UserLogin.password, db=db)
 
     # If authentication fails, raise an HTTP exception with a 401 Unauthorized status code.
-    if not user_authentication:
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect username or password.',
@@ -71,9 +72,6 @@ def user_login(UserLogin: OAuth2PasswordRequestForm = Depends(), db: Session = D
         )
 
     try:
-        # Get the user's details from the database using their username.
-        user = crud.get_user_by_name(user_name=UserLogin.username, db=db)
-
         # Set the expiration time for the access token.
         access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
 
@@ -97,68 +95,57 @@ def user_login(UserLogin: OAuth2PasswordRequestForm = Depends(), db: Session = D
 
 
 @router_user.post('/avatar/set')
-def set_avatar(avatar_file: UploadFile = File(), token: str = Depends(oauth2Scheme), db: Session = Depends(get_db)):
+def set_avatar(avatar_file: UploadFile = File(), user: schemas.Principal = Depends(get_current_user),
+               db: Session = Depends(get_db)):
     """
     Set or update an avatar for user.
     :param avatar_file: Avatar file uploaded.
-    :param token: Token of user.
+    :param user: The logged user.
     :param db: Session of the database.
     :return: Status of the operation.
     """
 
-    user_uuid = token_tools.get_uuid_by_token(token=token)
-    user = crud.get_user_by_uuid(user_uuid=user_uuid, db=db)
-
-    if not user:
-        raise HTTPException(
-            status_code=401,
-            detail="Permission Denied!"
-        )
-
     if not file_tools.check_image_file_allowed(upload_file=avatar_file):
         raise HTTPException(
             status_code=400,
             detail=f"File '{avatar_file.filename}' is not allowed to upload!"
         )
 
-    if user_data_tools.upload_user_avatar(avatar_file=avatar_file, user_uuid=user_uuid):
+    if user_data_tools.upload_user_avatar(avatar_file=avatar_file, user_uuid=user.user_uuid, db=db):
         return {
             "Status": "Success!"
         }
 
 
 @router_user.put('/info/modify')
-def modify_user_info(user_info_modified: schemas.UserModify, token: str = Depends(oauth2Scheme),
+def modify_user_info(user_info_modified: schemas.UserModify, user: schemas.Principal = Depends(get_current_user),
                      db: Session = Depends(get_db)):
     """
     Modify the information of users.
     :param user_info_modified: New information of user in reuqest body.
-    :param token: Token of the user for authentication.
+    :param user: The logged user.
     :param db: Session of the database.
     :return: Status of the operation.
     """
 
-    user_uuid: str = token_tools.get_uuid_by_token(token=token)
-    if user_data_tools.update_user_info(user_uuid=user_uuid, user_info_modified=user_info_modified, db=db):
+    if user_data_tools.update_user_info(user_uuid=user.user_uuid, user_info_modified=user_info_modified, db=db):
         return {
             "Status": "Success!"
         }
 
 
 @router_user.post('/password/modify')
-def modify_user_password(password_modified: schemas.PasswordChange, token: str = Depends(oauth2Scheme),
-                         db: Session = Depends(get_db)):
+def modify_user_password(password_modified: schemas.PasswordChange,
+                         user: schemas.Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     Modify the password of users.
     :param password_modified: New password of user in reuqest body.
-    :param token: Token of the user for authentication.
+    :param user: The logged user.
     :param db:  Session of the database.
     :return: Status of the operation.
     """
 
-    user_uuid: str = token_tools.get_uuid_by_token(token=token)
-
-    if user_data_tools.password_modify(user_uuid=user_uuid, password_modified=password_modified, db=db):
+    if user_data_tools.password_modify(user_uuid=user.user_uuid, password_modified=password_modified, db=db):
 
         return {
             "Status": "Success!"
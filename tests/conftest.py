@@ -0,0 +1,111 @@
+# encoding: utf-8
+# Filename: conftest.py
+
+"""
+Configuration of the tests.
+
+The application runs against SQLite in a temporary directory, so that no database has to be set up.
+"""
+
+from pathlib import Path
+import io
+import json
+import os
+import tempfile
+import pytest
+import config
+
+# Set before anything imports `dependencies.db`, which creates the engines from them.
+work_dir = Path(tempfile.mkdtemp(prefix='blogger-tests-'))
+config.DATABASE_URL = f"sqlite:///{work_dir / 'blogger.sqlite'}"
+config.ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{work_dir / 'blogger.sqlite'}"
+# Absolute, as the index is saved on exit, after pytest has gone back to the directory it started in.
+config.SEARCH_INDEX_PATH = str(work_dir / 'data' / 'search_index.json')
+
+ADMINISTRATOR = {"user_name": "admin", "password": "admin-password", "email": "admin@example.com"}
+USER = {"user_name": "user", "password": "user-password", "email": "user@example.com"}
+
+
+@pytest.fixture(scope='session')
+def client():
+    """
+    A test client of the application, started in the temporary directory,
+    as the static files, the logs and the list of administrators are relative to it.
+    """
+
+    from fastapi.testclient import TestClient
+
+    os.chdir(work_dir)
+    (work_dir / 'admin_list.json').write_text(json.dumps([ADMINISTRATOR]))
+
+    import main
+
+    return TestClient(main.app)
+
+
+def get_token_headers(client, account: dict) -> dict:
+    response = client.post('/api/user/token', data={'username': account['user_name'], 'password': account['password']})
+    assert response.status_code == 200, response.text
+
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope='session')
+def admin_headers(client) -> dict:
+    return get_token_headers(client=client, account=ADMINISTRATOR)
+
+
+@pytest.fixture(scope='session')
+def user_account(client) -> dict:
+    """
+    A user who is not an administrator, signed up once for the session.
+    """
+
+    response = client.post('/api/user/sign_up', json=USER)
+    assert response.status_code == 200, response.text
+
+    return USER
+
+
+@pytest.fixture(scope='session')
+def user_headers(client, user_account) -> dict:
+    return get_token_headers(client=client, account=user_account)
+
+
+@pytest.fixture(scope='session')
+def category_id(client, admin_headers) -> int:
+    """
+    A category for the posts of the tests.
+    """
+
+    response = client.post('/api/posts/categories/create', json={'category_name': 'tests'}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    categories = client.get('/api/resources/categories/getAll').json()
+
+    return next(x['category_id'] for x in categories if x['category_name'] == 'tests')
+
+
+@pytest.fixture(scope='session')
+def create_post(client, admin_headers, category_id):
+    """
+    Publish a post, as the administrator.
+    :return: A function taking the title, the Markdown and the tags of the post, and returning its uuid.
+    """
+
+    from dependencies.db import SessionLocal
+    from model.models import Posts
+
+    def create(title: str, markdown: str = '# Post', tags: str = 'tests') -> str:
+        response = client.post('/api/posts/create',
+                               data={'posts_title': title, 'tags': tags, 'category_id': category_id,
+                                     'comment': 'true', 'cover_url': 'cover.png'},
+                               files={'content_file': ('post.md', io.BytesIO(markdown.encode('utf-8')),
+                                                       'text/markdown')},
+                               headers=admin_headers)
+        assert response.status_code == 200, response.text
+
+        with SessionLocal() as db:
+            return db.query(Posts.post_uuid).filter(Posts.title == title).one().post_uuid
+
+    return create
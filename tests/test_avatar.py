@@ -0,0 +1,60 @@
+# encoding: utf-8
+# Filename: test_avatar.py
+
+"""
+An avatar upload which is not recorded leaves nothing on the disk.
+"""
+
+from pathlib import Path
+from PIL import Image
+from dependencies.db import SessionLocal
+from model import crud
+import io
+import config
+
+
+def make_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGBA', (300, 200), (255, 0, 0, 128)).save(buffer, format='PNG')
+
+    return buffer.getvalue()
+
+
+def upload(client, headers: dict, content: bytes):
+    return client.post('/api/user/avatar/set', files={'avatar_file': ('avatar.png', io.BytesIO(content), 'image/png')},
+                       headers=headers)
+
+
+def list_user_dir(account: dict) -> list[str]:
+    with SessionLocal() as db:
+        user_uuid = crud.get_user_by_name(user_name=account['user_name'], db=db).user_uuid
+
+    return sorted(x.name for x in Path(config.STATIC_DIR).joinpath('users', user_uuid).iterdir())
+
+
+def test_upload_writes_every_size(client, user_account, user_headers):
+    assert upload(client=client, headers=user_headers, content=make_png()).status_code == 200
+
+    files = list_user_dir(account=user_account)
+
+    assert len(files) == len(config.AVATAR_SIZES) * len(config.AVATAR_FORMATS)
+    assert not [x for x in files if x.endswith('.tmp')]
+
+
+def test_conflict_leaves_nothing(client, user_account, user_headers, monkeypatch):
+    assert upload(client=client, headers=user_headers, content=make_png()).status_code == 200
+    before = list_user_dir(account=user_account)
+
+    # Another request switched the avatar between the read of the version and the update.
+    monkeypatch.setattr(crud, 'update_avatar_by_uuid', lambda **kwargs: False)
+
+    assert upload(client=client, headers=user_headers, content=make_png()).status_code == 409
+    assert list_user_dir(account=user_account) == before
+
+
+def test_invalid_image_leaves_nothing(client, user_account, user_headers):
+    assert upload(client=client, headers=user_headers, content=make_png()).status_code == 200
+    before = list_user_dir(account=user_account)
+
+    assert upload(client=client, headers=user_headers, content=b'not an image').status_code == 400
+    assert list_user_dir(account=user_account) == before
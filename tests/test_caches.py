@@ -0,0 +1,75 @@
+# encoding: utf-8
+# Filename: test_caches.py
+
+"""
+The in-process caches drop stale values, and the content of the posts is served from its cache until it changes.
+"""
+
+from dependencies.db import SessionLocal
+from model import crud
+from tools.cache_tools import LRUCache, TTLCache, post_content_cache
+import time
+
+
+def test_ttl_cache_expires_and_invalidates():
+    cache = TTLCache(name='test_ttl', ttl=0.05)
+    cache.set('key', 'value')
+
+    assert cache.get('key') == 'value'
+
+    time.sleep(0.06)
+
+    assert cache.get('key') is None
+
+    # A value loaded before an invalidation is not stored after it.
+    generation = cache.generation
+    cache.invalidate()
+    cache.set('key', 'stale', generation=generation)
+
+    assert cache.get('key') is None
+
+
+def test_ttl_cache_stamps():
+    cache = TTLCache(name='test_ttl_stamps', ttl=60)
+    cache.set('key', 'value', stamp='W/"1-0"')
+
+    assert cache.get('key', stamp='W/"1-0"') == 'value'
+    assert cache.get('key', stamp='W/"2-0"') is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(name='test_lru', max_bytes=10)
+    cache.set('a', 'a', size=4, stamp=1)
+    cache.set('b', 'b', size=4, stamp=1)
+    cache.get('a', stamp=1)
+    cache.set('c', 'c', size=4, stamp=1)
+
+    assert cache.get('b', stamp=1) is None
+    assert cache.get('a', stamp=1) == 'a'
+    assert cache.get('a', stamp=2) is None
+    assert cache.stats()['evictions'] == 1
+
+    # Larger than the whole cache.
+    cache.set('d', 'd', size=11)
+
+    assert cache.get('d') is None
+
+
+def test_post_content_is_cached_until_the_post_changes(client, create_post):
+    post_uuid = create_post(title='Cached content', markdown='# Cached')
+    path = f'/api/resources/posts/get/{post_uuid}'
+
+    client.get(path)
+    hits = post_content_cache.stats()['hits']
+    content = client.get(path).json()['content']
+
+    assert post_content_cache.stats()['hits'] == hits + 1
+
+    with SessionLocal() as db:
+        crud.touch_post(post_uuid=post_uuid, db=db)
+
+    misses = post_content_cache.stats()['misses']
+
+    assert client.get(path).json()['content'] == content
+    assert post_content_cache.stats()['misses'] == misses + 1
@@ -0,0 +1,59 @@
+# encoding: utf-8
+# Filename: test_compression.py
+
+"""
+The HTML of the posts is served from the variants compressed at publish time, and the API is compressed with gzip.
+"""
+
+from tools import compression_tools
+import gzip
+
+
+def test_accepted_encodings():
+    assert compression_tools.accepted_encodings('gzip, deflate, br') == ['br', 'gzip']
+    assert compression_tools.accepted_encodings('gzip;q=0.5, br;q=0') == ['gzip']
+    assert compression_tools.accepted_encodings('*') == ['br', 'gzip']
+    assert compression_tools.accepted_encodings('identity') == []
+
+
+def test_post_content_variants(client, create_post):
+    markdown = '# Compressed\n\n' + 'Some text of the post. ' * 200
+    post_uuid = create_post(title='Compressed', markdown=markdown)
+    path = f'/api/resources/posts/content/{post_uuid}'
+
+    identity = client.get(path, headers={'Accept-Encoding': 'identity'})
+
+    assert identity.status_code == 200
+    assert 'content-encoding' not in identity.headers
+    assert 'Some text of the post.' in identity.text
+
+    variants = [('gzip', gzip.decompress)]
+
+    # Brotli is optional, its variant is only written when it is installed.
+    if compression_tools.brotli is not None:
+        variants.append(('br', compression_tools.brotli.decompress))
+
+    for encoding, decompress in variants:
+        # Read raw, the client would decode the body itself.
+        with client.stream('GET', path, headers={'Accept-Encoding': encoding}) as response:
+            body = b''.join(response.iter_raw())
+
+        assert response.headers['Content-Encoding'] == encoding
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.headers['ETag'] == identity.headers['ETag']
+        assert decompress(body) == identity.content
+
+
+def test_api_responses_are_gzipped(client, create_post):
+    for i in range(3):
+        create_post(title=f'Listed {i}')
+
+    with client.stream('GET', '/api/resources/posts/1', headers={'Accept-Encoding': 'gzip'}) as response:
+        body = b''.join(response.iter_raw())
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body).startswith(b'[')
+
+    small = client.get('/api/resources/tags/no-such-tag/posts', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'content-encoding' not in small.headers
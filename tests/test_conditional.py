@@ -0,0 +1,58 @@
+# encoding: utf-8
+# Filename: test_conditional.py
+
+"""
+The listings and the posts are answered with 304 while the client holds their current version.
+"""
+
+from dependencies.db import SessionLocal
+from model import crud
+import time
+
+
+def test_listing_validators(client, create_post):
+    create_post(title='Conditional listing')
+    response = client.get('/api/resources/posts/1')
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+    for path in ('/api/resources/posts/1', '/api/resources/posts', '/api/resources/tags',
+                 '/api/resources/categories/getAll'):
+        not_modified = client.get(path, headers={'If-None-Match': etag})
+
+        assert not_modified.status_code == 304, path
+        assert not_modified.content == b''
+        assert not_modified.headers['ETag'] == etag
+
+    assert client.get('/api/resources/posts/1', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert client.get('/api/resources/posts/1', headers={'If-None-Match': '"other", ' + etag}).status_code == 304
+    assert client.get('/api/resources/posts/1', headers={'If-None-Match': '"other"'}).status_code == 200
+
+    create_post(title='Conditional listing changed')
+
+    changed = client.get('/api/resources/posts/1', headers={'If-None-Match': etag})
+
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_post_validators(client, create_post):
+    post_uuid = create_post(title='Conditional post')
+
+    for path in (f'/api/resources/posts/get/{post_uuid}', f'/api/resources/posts/content/{post_uuid}'):
+        response = client.get(path)
+
+        assert client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        assert client.get(path, headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+    response = client.get(f'/api/resources/posts/get/{post_uuid}')
+
+    # The validators are precise to the second.
+    time.sleep(1)
+
+    with SessionLocal() as db:
+        crud.touch_post(post_uuid=post_uuid, db=db)
+
+    changed = client.get(f'/api/resources/posts/get/{post_uuid}', headers={'If-None-Match': response.headers['ETag']})
+
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != response.headers['ETag']
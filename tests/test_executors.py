@@ -0,0 +1,30 @@
+# encoding: utf-8
+# Filename: test_executors.py
+
+"""
+A bounded pool counts a task against `max_pending` until the task is done, even after its caller timed out.
+"""
+
+from fastapi import HTTPException
+from tools.executor_tools import BoundedThreadPool
+import time
+import pytest
+
+
+def test_timed_out_task_keeps_its_slot():
+    pool = BoundedThreadPool(name='test-timeouts', max_workers=1, max_pending=1, timeout=0.05)
+
+    with pytest.raises(HTTPException) as timed_out:
+        pool.run(time.sleep, 0.3)
+
+    assert timed_out.value.status_code == 504
+
+    # The task is still running, so the pool is full.
+    with pytest.raises(HTTPException) as rejected:
+        pool.run(abs, -1)
+
+    assert rejected.value.status_code == 503
+
+    time.sleep(0.4)
+
+    assert pool.run(abs, -1) == 1
@@ -0,0 +1,44 @@
+# encoding: utf-8
+# Filename: test_hash_pool.py
+
+"""
+Hashing a password in `hash_pool` does not stall the event loop.
+"""
+
+from passlib.hash import bcrypt
+from time import perf_counter
+from tools import hash_tools
+import asyncio
+
+# Longest pause of the event loop allowed while a hash is verified, in seconds.
+MAX_LOOP_STALL = 0.05
+
+
+def test_bcrypt_backend_releases_the_gil():
+    # `os_crypt` holds the GIL for the whole hash.
+    assert bcrypt.get_backend() == 'bcrypt'
+
+
+def test_event_loop_responds_while_verifying():
+    hashed = hash_tools.passwd_context.hash('password')
+
+    async def measure() -> tuple[bool, float, float]:
+        verification = asyncio.ensure_future(hash_tools.verify_password_async('password', hashed))
+        start = perf_counter()
+        last_tick = start
+        longest_stall = 0.0
+
+        while not verification.done():
+            await asyncio.sleep(0.001)
+            now = perf_counter()
+            longest_stall = max(longest_stall, now - last_tick)
+            last_tick = now
+
+        return verification.result(), perf_counter() - start, longest_stall
+
+    verified, duration, longest_stall = asyncio.run(measure())
+
+    assert verified
+    # The check means nothing if the hash was faster than the stall allowed.
+    assert duration > MAX_LOOP_STALL * 2
+    assert longest_stall < MAX_LOOP_STALL
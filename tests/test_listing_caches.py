@@ -0,0 +1,42 @@
+# encoding: utf-8
+# Filename: test_listing_caches.py
+
+"""
+The caches of the categories and the tags follow the writes of the other workers, through the listing stamp.
+"""
+
+from datetime import datetime
+
+
+def write_in_another_worker(statement: str) -> None:
+    # Written without `crud`, so that the caches of this process are not dropped, as in another worker.
+    from dependencies.db import SessionLocal
+    from sqlalchemy import text
+    from tools.conditional_tools import listing_version
+
+    with SessionLocal() as db:
+        db.execute(text(statement), {"now": datetime.utcnow()})
+        listing_version.bump(db=db)
+        db.commit()
+
+
+def test_categories_follow_the_listing_stamp(client, category_id):
+    for path in ('/api/resources/categories/getAll', '/api/posts/categories/getAll'):
+        assert client.get(path).status_code == 200
+
+    write_in_another_worker("INSERT INTO categories (category_name, datetime) VALUES ('other worker', :now)")
+
+    for path in ('/api/resources/categories/getAll', '/api/posts/categories/getAll'):
+        assert 'other worker' in [category['category_name'] for category in client.get(path).json()]
+
+
+def test_tags_follow_the_listing_stamp(client, create_post):
+    create_post(title='Tagged', tags='stamped')
+    tags = client.get('/api/resources/tags').json()
+
+    assert {"tag_name": "stamped", "number_of_posts": 1} in tags
+    assert client.get('/api/resources/tags').json() == tags
+
+    write_in_another_worker("DELETE FROM post_tags WHERE tag_id = (SELECT id FROM tags WHERE tag_name = 'stamped')")
+
+    assert 'stamped' not in [tag['tag_name'] for tag in client.get('/api/resources/tags').json()]
@@ -0,0 +1,46 @@
+# encoding: utf-8
+# Filename: test_markdown_blocks.py
+
+"""
+The Markdown rendered block by block, through the block cache, must be the HTML of the whole document.
+"""
+
+import pytest
+from tools.file_tools import convert_md_to_html, render_markdown, split_markdown_blocks
+
+DOCUMENTS = {
+    "paragraphs and headings": "# Title\n\nFirst paragraph\nstill the first.\n\n## Section\n\nSecond paragraph.\n",
+    "fence with blank lines": "Intro.\n\n```python\ndef f():\n\n    return 1\n\n\nprint(f())\n```\n\nAfter the code.\n",
+    "consecutive fences and a fence at the end": "```\na\n```\n\n```\nb\n```\n\n# Title\n```\nc\n```\n",
+    "tilde fence with a backtick fence inside": "~~~\n```\n\nnot a fence\n```\n~~~\n\nEnd.\n",
+    "nested lists": "- one\n- two\n    - two a\n\n    - two b\n\n        deep paragraph\n- three\n\n1. first\n2. second\n",
+    "loose list": "- a\n\n- b\n\n- c\n",
+    "quotes": "> quoted\n\n> still quoted\n\nPlain.\n",
+    "reference links": "See [the docs][docs] and [home].\n\n[docs]: https://example.com/docs\n[home]: https://example.com\n",
+    "raw html": "<div class=\"note\">\n\n*not emphasis*\n\n</div>\n\nA paragraph.\n",
+    "indented code": "Text.\n\n    code line\n\n    more code\n\nText again.\n",
+}
+
+
+@pytest.mark.parametrize('document', DOCUMENTS.values(), ids=DOCUMENTS.keys())
+def test_block_render_equals_whole_render(document: str):
+    assert render_markdown(original_markdown_content=document) == convert_md_to_html(original_markdown_content=document)
+
+
+@pytest.mark.parametrize('document', DOCUMENTS.values(), ids=DOCUMENTS.keys())
+def test_cached_render_equals_whole_render(document: str):
+    # Rendered a second time, every block comes from the cache.
+    render_markdown(original_markdown_content=document)
+
+    assert render_markdown(original_markdown_content=document) == convert_md_to_html(original_markdown_content=document)
+
+
+def test_fence_with_blank_lines_is_one_block():
+    blocks = split_markdown_blocks(original_markdown_content=DOCUMENTS["fence with blank lines"])
+
+    assert blocks == ["Intro.", "```python\ndef f():\n\n    return 1\n\n\nprint(f())\n```", "After the code."]
+
+
+@pytest.mark.parametrize('name', ["reference links", "raw html"])
+def test_documents_with_shared_definitions_are_not_split(name: str):
+    assert split_markdown_blocks(original_markdown_content=DOCUMENTS[name]) == [DOCUMENTS[name]]
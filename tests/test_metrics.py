@@ -0,0 +1,30 @@
+# encoding: utf-8
+# Filename: test_metrics.py
+
+"""
+Only the administrators and the scrapers holding `config.METRICS_TOKEN` read the metrics.
+"""
+
+import config
+
+
+def test_anonymous_is_refused(client):
+    assert client.get('/metrics').status_code == 401
+
+
+def test_user_is_refused(client, user_headers):
+    assert client.get('/metrics', headers=user_headers).status_code == 401
+
+
+def test_administrator_reads_them(client, admin_headers):
+    response = client.get('/metrics', headers=admin_headers)
+
+    assert response.status_code == 200
+    assert 'blogger_http_request_duration_seconds' in response.text
+
+
+def test_scraper_token(client, monkeypatch):
+    monkeypatch.setattr(config, 'METRICS_TOKEN', 'scraper-token')
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scraper-token'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer other-token'}).status_code == 401
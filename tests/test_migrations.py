@@ -0,0 +1,65 @@
+# encoding: utf-8
+# Filename: test_migrations.py
+
+"""
+The tags of the posts written before revision 0004 are backfilled, and names too long for `tags` are refused.
+"""
+
+from alembic import command
+from sqlalchemy import create_engine
+from tools import migration_tools
+import pytest
+
+
+def create_old_database(tmp_path, tags: list[str]):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+
+    with engine.begin() as connection:
+        command.upgrade(migration_tools.get_alembic_config(connection), '0003')
+        connection.exec_driver_sql("INSERT INTO categories (category_name, datetime) VALUES ('c', '2020-01-01')")
+
+        for i, post_tags in enumerate(tags):
+            connection.exec_driver_sql(
+                "INSERT INTO posts (post_uuid, title, author_uuid, tags, category_id, comment, create_time, update_time)"
+                f" VALUES ('p{i}', 't', 'u', '{post_tags}', 1, 1, '2020-01-0{i + 1}', '2020-01-01')"
+            )
+
+    return engine
+
+
+def test_tags_are_backfilled(tmp_path):
+    engine = create_old_database(tmp_path, tags=['a,b', 'A；c', '', 'b,b'])
+
+    try:
+        migration_tools.upgrade_database(engine=engine)
+
+        with engine.connect() as connection:
+            tags = connection.exec_driver_sql("SELECT id, tag_name FROM tags ORDER BY id").all()
+            post_tags = connection.exec_driver_sql(
+                "SELECT post_id, tag_id, create_time FROM post_tags ORDER BY post_id, tag_id"
+            ).all()
+
+        assert tags == [(1, 'a'), (2, 'b'), (3, 'c')]
+        assert [(post_id, tag_id) for post_id, tag_id, _ in post_tags] == [(1, 1), (1, 2), (2, 1), (2, 3), (4, 2)]
+        # The create time of the posts, copied by revision 0007.
+        assert [str(create_time)[:10] for _, _, create_time in post_tags] == ['2020-01-01', '2020-01-01',
+                                                                              '2020-01-02', '2020-01-02', '2020-01-04']
+
+    finally:
+        engine.dispose()
+
+
+def test_too_long_tag_names_are_refused(tmp_path):
+    engine = create_old_database(tmp_path, tags=['short,' + 'x' * 65])
+
+    try:
+        with pytest.raises(ValueError, match='post p0'):
+            migration_tools.upgrade_database(engine=engine)
+
+        with engine.connect() as connection:
+            tables = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars().all()
+
+        assert 'tags' not in tables
+
+    finally:
+        engine.dispose()
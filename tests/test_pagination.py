@@ -0,0 +1,56 @@
+# encoding: utf-8
+# Filename: test_pagination.py
+
+"""
+The cursor pages of the listings follow each other without gaps or repeats, newest first.
+"""
+
+from dependencies.db import SessionLocal
+from model.models import Posts
+import config
+
+
+def walk(client, path: str) -> list[dict]:
+    posts: list[dict] = []
+    cursor = None
+
+    while True:
+        page = client.get(path, params={'cursor': cursor} if cursor else {}).json()
+
+        assert len(page['posts']) <= config.RESOURCES_POSTS_LIMIT
+
+        posts.extend(page['posts'])
+        cursor = page['next_cursor']
+
+        if cursor is None:
+            return posts
+
+
+def test_cursor_pages_cover_every_post(client, create_post):
+    for i in range(config.RESOURCES_POSTS_LIMIT + 2):
+        create_post(title=f'Paged {i}')
+
+    posts = walk(client, '/api/resources/posts')
+
+    with SessionLocal() as db:
+        expected = [post_uuid for post_uuid, in db.query(Posts.post_uuid).order_by(Posts.create_time.desc(),
+                                                                                   Posts.id.desc())]
+
+    assert [post['post_uuid'] for post in posts] == expected
+
+
+def test_cursor_pages_agree_with_the_numbered_pages(client, create_post):
+    create_post(title='Numbered')
+    by_cursor = walk(client, '/api/resources/posts')
+    by_page: list[dict] = []
+    page = 1
+
+    while posts := client.get(f'/api/resources/posts/{page}').json():
+        by_page.extend(posts)
+        page += 1
+
+    assert [post['post_uuid'] for post in by_page] == [post['post_uuid'] for post in by_cursor]
+
+
+def test_invalid_cursor_is_refused(client):
+    assert client.get('/api/resources/posts', params={'cursor': 'not a cursor'}).status_code == 400
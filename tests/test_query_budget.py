@@ -0,0 +1,65 @@
+# encoding: utf-8
+# Filename: test_query_budget.py
+
+"""
+The comments of a post are read in a fixed number of queries, however many comments and authors there are.
+"""
+
+from tools.query_count_tools import QueryBudgetExceeded
+import io
+import pytest
+import config
+
+# Queries of `/api/comments/get_in_a_post/{post_uuid}`: the comments, joined with their authors.
+COMMENTS_QUERY_BUDGET = 1
+
+
+@pytest.fixture(scope='module')
+def post_uuid(client, admin_headers, user_headers) -> str:
+    response = client.post('/api/posts/categories/create', json={'category_name': 'query-budget'},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    categories = client.get('/api/resources/categories/getAll').json()
+    category_id = next(x['category_id'] for x in categories if x['category_name'] == 'query-budget')
+
+    response = client.post('/api/posts/create',
+                           data={'posts_title': 'Query budget', 'tags': 'budget', 'category_id': category_id,
+                                 'comment': 'true', 'cover_url': 'cover.png'},
+                           files={'content_file': ('post.md', io.BytesIO(b'# Query budget'), 'text/markdown')},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    post_uuid = client.get(f'/api/resources/categories/{category_id}/posts/1').json()[0]['post_uuid']
+
+    # Comments of two authors, so that a lookup of each author would show as more queries.
+    for headers in (admin_headers, user_headers) * 5:
+        response = client.post('/api/comments/send', json={'post_uuid': post_uuid, 'content': 'A comment.'},
+                               headers=headers)
+        assert response.status_code == 200, response.text
+
+    return post_uuid
+
+
+def test_comments_within_budget(client, post_uuid, monkeypatch):
+    monkeypatch.setattr(config, 'QUERY_DEBUG_HEADERS', True)
+    monkeypatch.setattr(config, 'QUERY_BUDGET', COMMENTS_QUERY_BUDGET)
+
+    response = client.get(f'/api/comments/get_in_a_post/{post_uuid}')
+
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert int(response.headers['X-Query-Count']) <= COMMENTS_QUERY_BUDGET
+
+
+def test_comments_over_budget(client, post_uuid, monkeypatch):
+    monkeypatch.setattr(config, 'QUERY_BUDGET', COMMENTS_QUERY_BUDGET - 1)
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get(f'/api/comments/get_in_a_post/{post_uuid}')
+
+
+def test_debug_headers_are_off_by_default(client, post_uuid):
+    response = client.get(f'/api/comments/get_in_a_post/{post_uuid}')
+
+    assert 'X-Query-Count' not in response.headers
@@ -0,0 +1,37 @@
+# encoding: utf-8
+# Filename: test_query_plans.py
+
+"""
+The hot queries must be served by indexes on a database migrated to the latest revision.
+"""
+
+from sqlalchemy import create_engine, select
+from model.models import Tag
+from tools import migration_tools, query_plan_tools
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.sqlite'}")
+    migration_tools.upgrade_database(engine=engine)
+
+    try:
+        assert query_plan_tools.check_hot_queries(engine=engine) == {}
+
+    finally:
+        engine.dispose()
+
+
+def test_covering_index_scans_are_flagged(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.sqlite'}")
+    migration_tools.upgrade_database(engine=engine)
+
+    # Reads every row of the index of the names of the tags, without touching the table.
+    statement = select(Tag.tag_name).order_by(Tag.tag_name)
+
+    try:
+        with engine.connect() as connection:
+            assert query_plan_tools.explain(statement=statement, connection=connection) == ['tags']
+            assert query_plan_tools.explain(statement=statement, connection=connection, ordered_walk=True) == []
+
+    finally:
+        engine.dispose()
@@ -0,0 +1,45 @@
+# encoding: utf-8
+# Filename: test_rerender.py
+
+"""
+Rendering the posts again runs in the background, and gives the posts new validators.
+"""
+
+import time
+
+
+def wait_for_rerender(client, headers: dict) -> dict:
+    for _ in range(100):
+        status = client.get('/api/posts/rerender', headers=headers).json()
+
+        if not status['running']:
+            return status
+
+        time.sleep(0.05)
+
+    raise AssertionError('The posts were not rendered again in time.')
+
+
+def test_rerender_changes_the_validators(client, admin_headers, user_headers, create_post):
+    post_uuid = create_post(title='Rendered again')
+    before = client.get(f'/api/resources/posts/content/{post_uuid}')
+    listing = client.get('/api/resources/posts/1')
+
+    time.sleep(1)
+
+    assert client.post('/api/posts/rerender', headers=user_headers).status_code == 401
+    assert client.post('/api/posts/rerender', headers=admin_headers).status_code == 202
+
+    status = wait_for_rerender(client=client, headers=admin_headers)
+
+    assert not status['failed']
+    assert status['rendered'] >= 1
+
+    after = client.get(f'/api/resources/posts/content/{post_uuid}', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert after.headers['Last-Modified'] != before.headers['Last-Modified']
+
+    # The update times are shown in the listings.
+    assert client.get('/api/resources/posts/1', headers={'If-None-Match': listing.headers['ETag']}).status_code == 200
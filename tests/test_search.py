@@ -0,0 +1,99 @@
+# encoding: utf-8
+# Filename: test_search.py
+
+"""
+Tokenizing, ranking, updating and saving the search index, and searching the posts written by other workers.
+"""
+
+from datetime import datetime, timedelta
+from tools import search_tools
+from tools.search_tools import SearchIndex
+
+
+def test_tokenize_splits_words_and_cjk_bigrams():
+    assert search_tools.tokenize('Hello, FastAPI world_2!') == ['hello', 'fastapi', 'world_2']
+    assert search_tools.tokenize('搜索引擎') == ['搜索', '索引', '引擎']
+    assert search_tools.tokenize('python教程') == ['python', '教程']
+    assert search_tools.tokenize('字') == ['字']
+
+
+def test_extract_text_drops_the_tags():
+    assert search_tools.extract_text('<h1>Title</h1><p>Some <b>bold</b> text</p>').split() == \
+        ['Title', 'Some', 'bold', 'text']
+
+
+def test_ranking_weighs_the_fields(tmp_path):
+    index = SearchIndex(path=str(tmp_path / 'index.json'))
+    index.add('text', stamp='1', fields={'title': 'Other', 'tags': '', 'text': 'all about python and more'})
+    index.add('title', stamp='1', fields={'title': 'Python', 'tags': '', 'text': 'all about snakes and more'})
+    index.add('none', stamp='1', fields={'title': 'Other', 'tags': '', 'text': 'nothing to see'})
+
+    assert [post_uuid for post_uuid, _ in index.search('python')] == ['title', 'text']
+    assert index.search('missing') == []
+
+
+def test_updates_replace_and_remove_the_posts(tmp_path):
+    index = SearchIndex(path=str(tmp_path / 'index.json'))
+    index.add('post', stamp='1', fields={'title': 'Old title', 'tags': '', 'text': ''})
+    index.add('post', stamp='2', fields={'title': 'New title', 'tags': '', 'text': ''})
+
+    assert index.search('old') == []
+    assert [post_uuid for post_uuid, _ in index.search('new')] == ['post']
+    assert index.stamps() == {'post': '2'}
+
+    index.remove('post')
+
+    assert index.search('title') == []
+    assert index.postings == {}
+    assert index.total_length == 0
+
+
+def test_save_and_load(tmp_path):
+    index = SearchIndex(path=str(tmp_path / 'data' / 'index.json'))
+    index.add('post', stamp='1', fields={'title': 'Saved post', 'tags': 'tests', 'text': 'body'})
+    index.mark_synced(etag='W/"1-0"', last_modified=datetime(2026, 1, 1))
+
+    assert index.save()
+
+    loaded = SearchIndex(path=index.path)
+
+    assert loaded.load()
+    assert loaded.stamps() == {'post': '1'}
+    assert loaded.search('saved') == index.search('saved')
+    assert loaded.saved_listing_time() == index.listing_time
+
+    # A worker synced at an earlier stamp does not replace the saved index.
+    older = SearchIndex(path=index.path)
+    older.mark_synced(etag='W/"0-0"', last_modified=datetime(2026, 1, 1) - timedelta(seconds=1))
+
+    assert not older.save()
+    assert loaded.load() and loaded.stamps() == {'post': '1'}
+
+
+def test_load_refuses_another_format(tmp_path):
+    path = tmp_path / 'index.json'
+    path.write_bytes(b'{"format":0,"documents":{}}')
+
+    assert not SearchIndex(path=str(path)).load()
+    assert not SearchIndex(path=str(tmp_path / 'missing.json')).load()
+
+
+def test_search_finds_the_posts_of_other_workers(client, create_post):
+    from dependencies.db import SessionLocal
+    from model.models import Posts
+    from sqlalchemy import update
+    from tools.conditional_tools import listing_version
+
+    post_uuid = create_post(title='Searchable zebra')
+
+    assert [post['post_uuid'] for post in client.get('/api/resources/search?q=zebra').json()['posts']] == [post_uuid]
+
+    # Renamed without the routes, so that only the listing stamp tells this worker.
+    with SessionLocal() as db:
+        db.execute(update(Posts).where(Posts.post_uuid == post_uuid)
+                   .values(title='Searchable okapi', update_time=datetime.utcnow()))
+        listing_version.bump(db=db)
+        db.commit()
+
+    assert client.get('/api/resources/search?q=zebra').json()['total'] == 0
+    assert [post['post_uuid'] for post in client.get('/api/resources/search?q=okapi').json()['posts']] == [post_uuid]
@@ -0,0 +1,70 @@
+# encoding: utf-8
+# Filename: test_snapshots.py
+
+"""
+The snapshots of the listings are the same as the listings read from the database,
+and are not served once the listings have changed.
+"""
+
+from datetime import datetime
+from tools.snapshot_tools import listing_snapshots, snapshot_builder
+import time
+
+
+def wait_for_snapshots(client) -> str:
+    etag = client.get('/api/resources/posts/1').headers['ETag']
+
+    for _ in range(100):
+        if listing_snapshots.etag == etag:
+            return etag
+
+        snapshot_builder.request_build()
+        time.sleep(0.05)
+
+    raise AssertionError('The snapshots were not built in time.')
+
+
+def test_snapshots_match_the_database(client, category_id, create_post):
+    create_post(title='Snapshot')
+    wait_for_snapshots(client)
+    paths = ['/api/resources/posts/1', '/api/resources/posts/2', '/api/resources/posts',
+             f'/api/resources/categories/{category_id}/posts/1']
+
+    hits = listing_snapshots.stats()['hits']
+    from_snapshots = {path: client.get(path) for path in paths}
+
+    assert listing_snapshots.stats()['hits'] == hits + len(paths)
+
+    # Read from the database, as if the snapshots had not been built.
+    etag, listing_snapshots.etag = listing_snapshots.etag, None
+
+    try:
+        for path in paths:
+            response = client.get(path)
+
+            assert response.json() == from_snapshots[path].json(), path
+            assert response.headers['ETag'] == from_snapshots[path].headers['ETag']
+            assert response.headers['Content-Type'] == from_snapshots[path].headers['Content-Type']
+
+    finally:
+        listing_snapshots.etag = etag
+
+
+def test_stale_snapshots_are_not_served(client, create_post):
+    post_uuid = create_post(title='Before the other worker')
+    wait_for_snapshots(client)
+
+    from dependencies.db import SessionLocal
+    from model.models import ListingStamp, Posts
+    from sqlalchemy import update
+
+    # Renamed as by another worker, whose commit does not ask the builder of this one for new snapshots.
+    with SessionLocal() as db:
+        db.execute(update(Posts).where(Posts.post_uuid == post_uuid).values(title='After the other worker'))
+        db.execute(update(ListingStamp).values(version=ListingStamp.version + 1, last_modified=datetime.utcnow()))
+        db.commit()
+
+    titles = [post['title'] for post in client.get('/api/resources/posts/1').json()]
+
+    assert 'After the other worker' in titles
+    assert 'Before the other worker' not in titles
@@ -0,0 +1,48 @@
+# encoding: utf-8
+# Filename: test_tags.py
+
+"""
+Tags are split from the tags string of a post, counted, and list their posts by cursor.
+"""
+
+import io
+import config
+
+
+def test_tags_are_split_and_counted(client, create_post):
+    create_post(title='Split tags', tags='Alpha；beta, alpha ,,')
+    create_post(title='More tags', tags='beta')
+
+    counts = {tag['tag_name']: tag['number_of_posts'] for tag in client.get('/api/resources/tags').json()}
+
+    assert counts['Alpha'] == 1
+    assert counts['beta'] == 2
+
+
+def test_posts_of_a_tag_by_cursor(client, create_post):
+    post_uuids = [create_post(title=f'Tagged {i}', tags='cursor-tag') for i in range(config.RESOURCES_POSTS_LIMIT + 1)]
+
+    first = client.get('/api/resources/tags/cursor-tag/posts').json()
+    second = client.get('/api/resources/tags/cursor-tag/posts', params={'cursor': first['next_cursor']}).json()
+
+    assert len(first['posts']) == config.RESOURCES_POSTS_LIMIT
+    assert second['next_cursor'] is None
+    assert [post['post_uuid'] for post in first['posts'] + second['posts']] == post_uuids[::-1]
+
+
+def test_updated_tags_move_the_post(client, admin_headers, category_id, create_post):
+    post_uuid = create_post(title='Retagged', tags='before-tag')
+    response = client.put('/api/posts/update',
+                          data={'post_uuid': post_uuid, 'posts_title': 'Retagged', 'tags': 'after-tag',
+                                'category_id': category_id, 'comment': 'true', 'cover_url': 'cover.png'},
+                          files={'new_content_file': ('post.md', io.BytesIO(b'# Post'), 'text/markdown')},
+                          headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert client.get('/api/resources/tags/before-tag/posts').json()['posts'] == []
+    assert [post['post_uuid'] for post in client.get('/api/resources/tags/after-tag/posts').json()['posts']] == \
+        [post_uuid]
+
+
+def test_unknown_tag_is_not_found(client):
+    assert client.get('/api/resources/tags/no-such-tag/posts').status_code == 404
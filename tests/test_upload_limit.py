@@ -0,0 +1,42 @@
+# encoding: utf-8
+# Filename: test_upload_limit.py
+
+"""
+Oversized uploads are refused from their length, before the form is parsed or the user is authenticated.
+"""
+
+import config
+
+BOUNDARY = 'limit-boundary'
+
+
+def multipart_body(size: int) -> bytes:
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="avatar_file"; filename="avatar.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n').encode() + b'0' * size + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def test_content_length_over_the_limit_is_refused(client):
+    body = multipart_body(config.AVATAR_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD)
+    response = client.post('/api/user/avatar/set', content=body, headers={
+        'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'
+    })
+
+    assert response.status_code == 413
+
+
+def test_chunked_body_over_the_limit_is_refused(client):
+    body = multipart_body(config.POST_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD)
+    chunks = (body[i:i + config.UPLOAD_CHUNK_SIZE] for i in range(0, len(body), config.UPLOAD_CHUNK_SIZE))
+
+    # Without a `Content-Length`, and without a token either: the body is refused before the user is checked.
+    response = client.post('/api/posts/create', content=chunks, headers={
+        'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'
+    })
+
+    assert response.status_code == 413
+
+
+def test_other_paths_are_not_limited(client):
+    response = client.post('/api/user/token', content=b'0' * (config.POST_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD + 1))
+
+    assert response.status_code != 413
@@ -8,6 +8,9 @@ from model import crud, schemas
 from dependencies.db import engine
 from tools import user_data_tools
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 get_db = sessionmaker(bind=engine)
 
@@ -37,7 +40,7 @@ def create_administrator(db: Session = get_db()):
                         raise HTTPException(
                             status_code=500,
                             detail="Cannot create user directory!")
-                    print(f'Administrator {admin_reg.user_name} created!')
+                    logger.info('Administrator %s created!', admin_reg.user_name)
 
     except IntegrityError as e:
         raise HTTPException(
@@ -0,0 +1,231 @@
+# encoding: utf-8
+# Filename: cache_tools.py
+
+"""
+In-process caches.
+
+Every cache registers itself by name, so that its counters can be reported together.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+import config
+
+# All the caches of the process, by name.
+caches: dict[str, 'TTLCache | LRUCache'] = {}
+
+
+class TTLCache:
+    """
+    A thread safe cache whose entries expire after a fixed time.
+
+    Writers invalidate it explicitly. A reader which loaded a value before an invalidation
+    passes the generation it read at, so that it cannot store the stale value afterwards.
+
+    The writes of the other processes do not reach it, so the values shared between the workers
+    are stored with a stamp read from the database, such as the ETag of the listings,
+    and a lookup with another stamp is a miss.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.entries: dict = {}
+        self.generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+        caches[name] = self
+
+    def get(self, key, default=None, stamp=None):
+        """
+        Get a value which has not expired.
+        :param key: Key of the value.
+        :param default: Returned when the key is missing or expired.
+        :param stamp: The stamp the value must have been stored with.
+        :return: The value.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] < monotonic() or entry[2] != stamp:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, generation: int | None = None, ttl: float | None = None, stamp=None) -> None:
+        """
+        Store a value.
+        :param key: Key of the value.
+        :param value: The value.
+        :param generation: The generation read before loading the value, it is dropped if the cache has been
+        invalidated since then.
+        :param ttl: Seconds the value lives, if shorter than the TTL of the cache.
+        :param stamp: The stamp of the value.
+        :return: None.
+        """
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+
+            self.entries[key] = (monotonic() + ttl, value, stamp)
+
+    def invalidate(self, key=None) -> None:
+        """
+        Drop a value, or all the values.
+        :param key: Key of the value, None to drop everything.
+        :return: None.
+        """
+
+        with self.lock:
+            self.generation += 1
+
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache.
+        :return: Dict type statistics.
+        """
+
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class LRUCache:
+    """
+    A thread safe least recently used cache bounded by the bytes of its values.
+
+    Every entry carries a stamp, such as the update time of what it was loaded from,
+    and a lookup with another stamp is a miss.
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        caches[name] = self
+
+    def get(self, key, stamp=None, default=None):
+        """
+        Get a value stored with the same stamp.
+        :param key: Key of the value.
+        :param stamp: The stamp the value must have been stored with.
+        :param default: Returned when the key is missing or stale.
+        :return: The value.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, size: int, stamp=None) -> None:
+        """
+        Store a value, and evict the least recently used ones beyond the size limit.
+        Values larger than the whole cache are not stored.
+        :param key: Key of the value.
+        :param value: The value.
+        :param size: Size of the value in bytes.
+        :param stamp: The stamp of the value.
+        :return: None.
+        """
+
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+
+            if previous is not None:
+                self.bytes -= previous[2]
+
+            self.entries[key] = (stamp, value, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted[2]
+                self.evictions += 1
+
+    def invalidate(self, key=None) -> None:
+        """
+        Drop a value, or all the values.
+        :param key: Key of the value, None to drop everything.
+        :return: None.
+        """
+
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+                self.bytes = 0
+                return
+
+            entry = self.entries.pop(key, None)
+
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache.
+        :return: Dict type statistics.
+        """
+
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# Subjects of verified tokens, each living until the expiration of its token.
+token_cache = TTLCache(name='tokens', ttl=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60, max_entries=config.TOKEN_CACHE_SIZE)
+
+# Logged users by uuid, dropped by every update of a user.
+user_cache = TTLCache(name='users', ttl=config.USER_CACHE_TTL, max_entries=config.USER_CACHE_SIZE)
+
+# Read model of `crud.get_all_categories_in_db`, stamped with the ETag of the listings,
+# and dropped by every write to categories or posts of this process.
+categories_cache = TTLCache(name='categories', ttl=config.CATEGORY_CACHE_TTL, max_entries=1)
+
+# Read model of `async_crud.get_all_tags_in_db`, stamped with the ETag of the listings,
+# and dropped by every write to posts of this process.
+tags_cache = TTLCache(name='tags', ttl=config.CATEGORY_CACHE_TTL, max_entries=1)
+
+# Rendered HTML of posts by post uuid, stamped with the update time of the post.
+post_content_cache = LRUCache(name='post_content', max_bytes=config.POST_CONTENT_CACHE_BYTES)
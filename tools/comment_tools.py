@@ -1,9 +1,12 @@
 # encoding: utf-8
 # Filename: comment_tools.py
 
-from model import crud, schemas
+from model import crud, async_crud, schemas
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
+from tools import user_data_tools
+import config
 
 
 def create_a_comment(comments: schemas.Comment, user_uuid: str, db: Session):
@@ -26,12 +29,32 @@ def create_a_comment(comments: schemas.Comment, user_uuid: str, db: Session):
         return True
 
 
-def load_comments_by_a_post_uuid(post_uuid: str, db: Session):
+async def load_comments_by_a_post_uuid(post_uuid: str, db: AsyncSession, avatar_size: int = config.DEFAULT_AVATAR_SIZE,
+                                       avatar_format: str = config.AVATAR_FORMATS[0]):
     """
     Load all comments of a post by providing a post uuid.
+    The commenters and their avatars are loaded with the comments.
     :param post_uuid: Uuid of post.
-    :param db: Session of the database.
+    :param db: Async session of the database.
+    :param avatar_size: Size of the avatars in pixels.
+    :param avatar_format: Format of the avatars.
     :return: All comments of a post.
     """
 
-    return crud.query_all_comments_by_post_uuid(post_uuid=post_uuid, db=db)
+    db_comments = await async_crud.query_all_comments_by_post_uuid(post_uuid=post_uuid, db=db)
+    comment_list_for_return: list[dict] = []
+
+    for x in db_comments:
+        comment_list_for_return.append({
+            "id": x.id,
+            "comment_uuid": x.comment_uuid,
+            "post_uuid": x.post_uuid,
+            "user_uuid": x.user_uuid,
+            "nick_name": x.user.nick_name,
+            "avatar": user_data_tools.get_avatar_url(avatar_path=x.user.avatar_path, avatar_size=avatar_size,
+                                                     avatar_format=avatar_format),
+            "content": x.content,
+            "date": x.date
+        })
+
+    return comment_list_for_return
@@ -0,0 +1,183 @@
+# encoding: utf-8
+# Filename: compression_tools.py
+
+"""
+Compressed responses.
+
+The HTML of a post is compressed once when it is rendered, and the variants are stored next to it.
+They are served as they are to the clients which accept them, instead of compressing on every read.
+"""
+
+from pathlib import Path
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope, Receive, Send
+import anyio
+import gzip
+import os
+import stat
+import tempfile
+import config
+
+# Brotli is optional, the posts are only precompressed with gzip without it.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Suffix of the variant of each encoding, in the order of preference.
+PRECOMPRESSED_SUFFIXES: dict[str, str] = {
+    'br': '.br',
+    'gzip': '.gz'
+}
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    """
+    Compress a content with the best ratio, it is only done once per render.
+    :param content: Content to compress.
+    :param encoding: 'br' or 'gzip'.
+    :return: Compressed content.
+    """
+
+    if encoding == 'br':
+        return brotli.compress(content, quality=config.PRECOMPRESS_BROTLI_QUALITY)
+
+    # No time stamp, so that the same content always compresses to the same bytes.
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def write_precompressed(html_path: Path, content: bytes) -> None:
+    """
+    Write the compressed variants of an HTML file next to it, replacing each at once.
+    :param html_path: Path of the HTML file.
+    :param content: Content of the HTML file.
+    :return: None.
+    """
+
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+        variant_path = html_path.with_name(html_path.name + suffix)
+
+        if encoding == 'br' and brotli is None:
+            variant_path.unlink(missing_ok=True)
+            continue
+
+        with tempfile.NamedTemporaryFile('wb', dir=html_path.parent, suffix=suffix + '.tmp', delete=False) as f:
+            variant_temp_path = f.name
+            f.write(compress(content=content, encoding=encoding))
+
+        os.replace(variant_temp_path, variant_path)
+
+
+def accepted_encodings(accept_encoding: str) -> list[str]:
+    """
+    Get the precompressed encodings a client accepts, in the order of preference.
+    :param accept_encoding: `Accept-Encoding` header of the request.
+    :return: List of the encodings.
+    """
+
+    accepted: set[str] = set()
+
+    for item in accept_encoding.lower().split(','):
+        coding, _, parameters = item.strip().partition(';')
+        quality = parameters.strip().removeprefix('q=')
+
+        try:
+            if parameters and float(quality) <= 0:
+                continue
+
+        except ValueError:
+            continue
+
+        accepted.add(coding.strip())
+
+    return [encoding for encoding in PRECOMPRESSED_SUFFIXES if encoding in accepted or '*' in accepted]
+
+
+def find_precompressed(html_path: Path, accept_encoding: str) -> tuple[Path, os.stat_result, str | None]:
+    """
+    Find the variant of an HTML file to serve to a client.
+    :param html_path: Path of the HTML file.
+    :param accept_encoding: `Accept-Encoding` header of the request.
+    :return: Path and stat of the file to serve, and its encoding, None for the HTML file itself.
+    """
+
+    for encoding in accepted_encodings(accept_encoding=accept_encoding):
+        variant_path = html_path.with_name(html_path.name + PRECOMPRESSED_SUFFIXES[encoding])
+
+        try:
+            return variant_path, variant_path.stat(), encoding
+
+        except OSError:
+            continue
+
+    return html_path, html_path.stat(), None
+
+
+def html_file_response(html_path: Path, accept_encoding: str, headers: dict | None = None) -> FileResponse:
+    """
+    Respond with the best variant of an HTML file for a client.
+    It blocks on the disk, so the async routers call it through the threadpool.
+    :param html_path: Path of the HTML file.
+    :param accept_encoding: `Accept-Encoding` header of the request.
+    :param headers: Headers to add to the response.
+    :return: The response.
+    """
+
+    file_path, stat_result, encoding = find_precompressed(html_path=html_path, accept_encoding=accept_encoding)
+    response_headers = {'Vary': 'Accept-Encoding', **(headers or {})}
+
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+
+    return FileResponse(file_path, stat_result=stat_result, media_type='text/html; charset=utf-8',
+                        headers=response_headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Static files, which serve the precompressed variant of an HTML file when there is one.
+    """
+
+    async def get_response(self, path: str, scope: Scope):
+        if path.endswith('.html') and scope["method"] in ("GET", "HEAD"):
+            for encoding in accepted_encodings(accept_encoding=Headers(scope=scope).get('accept-encoding', '')):
+                full_path, stat_result = await anyio.to_thread.run_sync(
+                    self.lookup_path, path + PRECOMPRESSED_SUFFIXES[encoding]
+                )
+
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers['Vary'] = 'Accept-Encoding'
+
+                    # A 304 has no content to describe.
+                    if response.status_code == 200:
+                        response.headers['Content-Encoding'] = encoding
+                        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+
+                    return response
+
+        response = await super().get_response(path, scope)
+
+        if path.endswith('.html'):
+            response.headers['Vary'] = 'Accept-Encoding'
+
+        return response
+
+
+class APIGZipMiddleware(GZipMiddleware):
+    """
+    Compress the responses of the API with gzip, above `config.GZIP_MINIMUM_SIZE`.
+    Static files are left alone, the posts are precompressed and the images are compressed already.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, minimum_size=config.GZIP_MINIMUM_SIZE, compresslevel=config.GZIP_COMPRESS_LEVEL)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith('/api/'):
+            await super().__call__(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -0,0 +1,217 @@
+# encoding: utf-8
+# Filename: conditional_tools.py
+
+"""
+Conditional GET.
+
+Responses carry an `ETag` and a `Last-Modified` header, and a request whose
+`If-None-Match` or `If-Modified-Since` still matches is answered with 304 before the body is built.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from dependencies.db import get_async_db
+from model.models import ListingStamp
+import hashlib
+
+
+# Id of the only row of `ListingStamp`.
+LISTING_STAMP_ID: int = 1
+LISTING_STAMP_QUERY = select(ListingStamp.version, ListingStamp.last_modified).where(
+    ListingStamp.id == LISTING_STAMP_ID
+)
+
+
+class ListingVersion:
+    """
+    The version stamp of everything shown in the listings of posts, categories and tags.
+
+    It is the row of `ListingStamp`, which every write to posts, categories or nick names bumps
+    in its own transaction. So every worker of the server answers with the same validators,
+    whichever of them served the write.
+    """
+
+    def __init__(self):
+        self.listeners: list = []
+
+    def add_listener(self, listener) -> None:
+        """
+        Register a callback, called without arguments after a bump of this process is committed.
+        The bumps of the other workers are only seen when the stamp is read.
+        :param listener: The callback.
+        :return: None.
+        """
+
+        self.listeners.append(listener)
+
+    def bump(self, db: Session) -> None:
+        """
+        Change the stamp in the transaction of a write, before it is committed.
+        :param db: Session of the database, with the write.
+        :return: None.
+        """
+
+        db.execute(
+            update(ListingStamp)
+            .where(ListingStamp.id == LISTING_STAMP_ID)
+            .values(version=ListingStamp.version + 1, last_modified=datetime.utcnow())
+        )
+        event.listen(db, 'after_commit', self.notify, once=True)
+
+    def notify(self, session=None) -> None:
+        for listener in self.listeners:
+            listener()
+
+    def validators(self, db: Session) -> tuple[str, datetime]:
+        """
+        Read the current stamp.
+        :param db: Session of the database.
+        :return: The ETag and the last modified time of the listings.
+        """
+
+        return format_listing_validators(db.execute(LISTING_STAMP_QUERY).one())
+
+    async def validators_async(self, db: AsyncSession) -> tuple[str, datetime]:
+        """
+        Read the current stamp, see `validators`.
+        :param db: Async session of the database.
+        :return: The ETag and the last modified time of the listings.
+        """
+
+        return format_listing_validators((await db.execute(LISTING_STAMP_QUERY)).one())
+
+
+def format_listing_validators(stamp) -> tuple[str, datetime]:
+    """
+    Make the validators of the listings from the row of the stamp.
+    :param stamp: Version and last modified time of the row.
+    :return: The ETag and the last modified time.
+    """
+
+    last_modified = as_utc(stamp.last_modified)
+
+    # The time tells apart the stamps of a database created again, which start over from 0.
+    return f'W/"{stamp.version}-{int(last_modified.timestamp())}"', last_modified
+
+
+listing_version = ListingVersion()
+
+
+def get_post_etag(post) -> str:
+    """
+    Get the ETag of a single post.
+    The nick name of the author and the name of the category are shown with the post,
+    but they do not change its update time, so they are hashed into the ETag too.
+    :param post: The post, loaded with `crud.posts_details_options`.
+    :return: The ETag.
+    """
+
+    details = f"{post.author.nick_name}\0{post.category.category_name}".encode('utf-8')
+
+    return f'W/"{post.id}-{as_utc(post.update_time).timestamp():.6f}-{hashlib.sha1(details).hexdigest()[:8]}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    Check if the copy the client holds is still current.
+    `If-None-Match` wins over `If-Modified-Since` when both are sent.
+    :param request: The request.
+    :param etag: ETag of the current representation.
+    :param last_modified: Last modified time of the current representation.
+    :return: True if the client can use its copy.
+    """
+
+    if_none_match = request.headers.get('if-none-match')
+
+    if if_none_match is not None:
+        # Weak comparison, as the ETags of this server are weak.
+        candidates = [candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')]
+
+        return '*' in candidates or etag.removeprefix('W/') in candidates
+
+    if_modified_since = request.headers.get('if-modified-since')
+
+    if if_modified_since is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    # HTTP dates have no fraction of seconds.
+    return as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def as_utc(moment: datetime) -> datetime:
+    """
+    Make a time of the database aware of its time zone, the database stores UTC.
+    :param moment: The time.
+    :return: The time in UTC.
+    """
+
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def validator_headers(etag: str, last_modified: datetime) -> dict:
+    """
+    Get the headers which let a client make conditional requests.
+    :param etag: ETag of the representation.
+    :param last_modified: Last modified time of the representation.
+    :return: The headers.
+    """
+
+    return {
+        'ETag': etag,
+        'Last-Modified': format_datetime(as_utc(last_modified), usegmt=True),
+        # Clients may store the response, but must revalidate it before every use.
+        'Cache-Control': 'no-cache'
+    }
+
+
+def evaluate_conditions(request: Request, response: Response, etag: str, last_modified: datetime) -> dict:
+    """
+    Answer with 304 if the client holds the current representation, otherwise add the validators to the response.
+    :param request: The request.
+    :param response: The response, whose headers are merged into the one returned by the route.
+    :param etag: ETag of the current representation.
+    :param last_modified: Last modified time of the current representation.
+    :return: The validator headers, for the routes which return a response of their own.
+    """
+
+    headers = validator_headers(etag=etag, last_modified=last_modified)
+
+    if is_not_modified(request=request, etag=etag, last_modified=last_modified):
+        raise HTTPException(
+            status_code=304,
+            headers=headers
+        )
+
+    response.headers.update(headers)
+
+    return headers
+
+
+async def check_listing_conditions(request: Request, response: Response,
+                                   db: AsyncSession = Depends(get_async_db)) -> tuple[str, datetime]:
+    """
+    Dependency of the listing routes, which answers 304 before the listings are queried.
+    :param request: The request.
+    :param response: The response.
+    :param db: Async session of the database, the one of the route.
+    :return: The ETag and the last modified time of the listings, to check the snapshots against.
+    """
+
+    etag, last_modified = await listing_version.validators_async(db=db)
+
+    evaluate_conditions(request=request, response=response, etag=etag, last_modified=last_modified)
+
+    return etag, last_modified
@@ -0,0 +1,213 @@
+# encoding: utf-8
+# Filename: executor_tools.py
+
+"""
+Bounded pools for CPU heavy work.
+
+Every pool registers itself by name, so that its queue depth can be reported together.
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from threading import Lock, BoundedSemaphore
+from time import perf_counter
+from fastapi import HTTPException
+import asyncio
+import multiprocessing
+
+# All the pools of the process, by name.
+executors: dict[str, 'BoundedExecutor'] = {}
+
+
+class BoundedExecutor(ABC):
+    """
+    A pool which rejects work beyond a number of pending tasks, and waits for each task with a timeout.
+    The executor is started on the first task, by `create_executor` of the subclasses.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, timeout: float | None = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.lock = Lock()
+        self.slots = BoundedSemaphore(max_pending)
+        self.executor: Executor | None = None
+        self.pending: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+        self.timeouts: int = 0
+        self.seconds_total: float = 0.0
+        self.seconds_max: float = 0.0
+
+        executors[name] = self
+
+    @abstractmethod
+    def create_executor(self) -> Executor:
+        """
+        Create the executor running the tasks, with `max_workers` workers.
+        :return: The executor.
+        """
+
+    def get_executor(self) -> Executor:
+        """
+        Get the executor, and start it on the first call.
+        :return: The executor.
+        """
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = self.create_executor()
+
+            return self.executor
+
+    def admit(self) -> None:
+        """
+        Take a slot for a task, or reject it at once when all the slots are taken.
+        :return: None.
+        """
+
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+
+            raise HTTPException(
+                status_code=503,
+                detail=f"Too many {self.name} tasks are pending, please retry later.",
+                headers={"Retry-After": "1"}
+            )
+
+        with self.lock:
+            self.pending += 1
+
+    def release(self, start: float) -> None:
+        """
+        Give back the slot of a task, and record how long it took from its submission.
+        :param start: `perf_counter()` at the submission.
+        :return: None.
+        """
+
+        seconds = perf_counter() - start
+
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            self.seconds_total += seconds
+            self.seconds_max = max(self.seconds_max, seconds)
+
+        self.slots.release()
+
+    def timed_out(self, future) -> HTTPException:
+        """
+        Count a task which took longer than the timeout.
+        :param future: Future of the task.
+        :return: The exception to raise.
+        """
+
+        # A task already running cannot be stopped, it only frees its worker and its slot once it is done.
+        future.cancel()
+
+        with self.lock:
+            self.timeouts += 1
+
+        return HTTPException(
+            status_code=504,
+            detail=f"The {self.name} task took longer than {self.timeout} seconds."
+        )
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Submit a function to the pool, in a slot which is only given back once the task is done.
+        A task which timed out keeps its slot while it runs, so `max_pending` bounds the work actually in flight.
+        :param fn: The function.
+        :param args: Arguments of the function.
+        :return: Future of the task.
+        """
+
+        self.admit()
+        start = perf_counter()
+
+        try:
+            future = self.get_executor().submit(fn, *args)
+
+        except BaseException:
+            self.release(start=start)
+            raise
+
+        future.add_done_callback(lambda _: self.release(start=start))
+
+        return future
+
+    def run(self, fn, *args):
+        """
+        Run a function in the pool and wait for its result.
+        It blocks the calling thread, so it is meant for sync routes, which run in the threadpool.
+        :param fn: The function.
+        :param args: Arguments of the function.
+        :return: The result of the function.
+        """
+
+        future = self.submit(fn, *args)
+
+        try:
+            return future.result(timeout=self.timeout)
+
+        except TimeoutError:
+            raise self.timed_out(future=future)
+
+    async def run_async(self, fn, *args):
+        """
+        Run a function in the pool and wait for its result without blocking the event loop.
+        :param fn: The function.
+        :param args: Arguments of the function.
+        :return: The result of the function.
+        """
+
+        future = self.submit(fn, *args)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+
+        except asyncio.TimeoutError:
+            raise self.timed_out(future=future)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the pool.
+        :return: Dict type statistics.
+        """
+
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "queued": max(self.pending - self.max_workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "seconds_total": self.seconds_total,
+                "seconds_max": self.seconds_max
+            }
+
+
+class BoundedThreadPool(BoundedExecutor):
+    """
+    A bounded pool of threads, for work which releases the GIL.
+    """
+
+    def create_executor(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+
+class BoundedProcessPool(BoundedExecutor):
+    """
+    A bounded pool of processes, for work which holds the GIL.
+    The functions run must be defined at the top level of a module, so that they can be pickled.
+    The processes are started with the `spawn` method, because forking a process running threads is not safe.
+    """
+
+    def create_executor(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
@@ -2,11 +2,35 @@
 # Filename: file_tools.py
 
 from fastapi import UploadFile
+from tools.executor_tools import BoundedProcessPool
+from tools.cache_tools import LRUCache
+import hashlib
 import os
+import re
 import config
 import markdown
 import bleach
 
+# Processes rendering Markdown, so that highlighting does not hold the GIL of the server.
+render_pool = BoundedProcessPool(
+    name='render',
+    max_workers=config.RENDER_WORKERS,
+    max_pending=config.RENDER_MAX_PENDING,
+    timeout=config.RENDER_TIMEOUT
+)
+
+# Rendered HTML of top-level Markdown blocks, by the SHA-256 of the block.
+markdown_block_cache = LRUCache(name='markdown_blocks', max_bytes=config.MARKDOWN_BLOCK_CACHE_BYTES)
+
+FENCE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+HEADING_PATTERN = re.compile(r'^ {0,3}#{1,6}(\s|$)')
+LIST_ITEM_PATTERN = re.compile(r'^ {0,3}([-*+]|\d{1,9}[.)])(\s|$)')
+# End of the HTML of a code block highlighted by `codehilite`.
+CODE_BLOCK_END = '</pre></div>'
+# Reference definitions are used by other blocks, and raw HTML may span blank lines,
+# so documents with them cannot be rendered block by block.
+WHOLE_DOCUMENT_PATTERN = re.compile(r'^( {0,3}\[[^\]]+\]:|<[a-zA-Z!])', re.MULTILINE)
+
 
 def check_posts_file_allowed(upload_file: UploadFile):
     """
@@ -40,3 +64,127 @@ def convert_md_to_html(original_markdown_content: str):
     html = markdown.markdown(text=original_markdown_content, extensions=['fenced_code', 'codehilite'])
 
     return html
+
+
+def split_markdown_blocks(original_markdown_content: str) -> list[str]:
+    """
+    Split a Markdown document into top-level blocks which render the same apart as together:
+    fenced code, headings, and paragraphs separated by blank lines.
+    Indented lines are kept with the block before them, and so are the items of a list or a quote.
+    A document with reference definitions or raw HTML is kept in one block.
+    :param original_markdown_content: Original sting in markdown format.
+    :return: List of the blocks.
+    """
+
+    if WHOLE_DOCUMENT_PATTERN.search(original_markdown_content):
+        return [original_markdown_content]
+
+    chunks: list[str] = []
+    current: list[str] = []
+    fence: str | None = None
+
+    def flush():
+        if current:
+            chunks.append('\n'.join(current))
+            current.clear()
+
+    for line in original_markdown_content.splitlines():
+        if fence:
+            current.append(line)
+
+            if line.strip().startswith(fence) and line.strip().strip(fence[0]) == '':
+                fence = None
+                flush()
+
+        elif FENCE_PATTERN.match(line):
+            flush()
+            fence = FENCE_PATTERN.match(line).group(1)
+            current.append(line)
+
+        elif not line.strip():
+            flush()
+
+        elif HEADING_PATTERN.match(line):
+            flush()
+            chunks.append(line)
+
+        else:
+            current.append(line)
+
+    flush()
+
+    # Join the chunks which continue the block before them.
+    blocks: list[str] = []
+
+    for chunk in chunks:
+        if blocks and not FENCE_PATTERN.match(chunk) and (
+                chunk[0] in ' \t' or
+                (LIST_ITEM_PATTERN.match(chunk) and LIST_ITEM_PATTERN.match(blocks[-1])) or
+                (chunk.startswith('>') and blocks[-1].startswith('>'))):
+            blocks[-1] += '\n\n' + chunk
+        else:
+            blocks.append(chunk)
+
+    return blocks
+
+
+def render_markdown_blocks(blocks: list[str]) -> list[str]:
+    """
+    Convert Markdown blocks to HTML one by one.
+    It runs in the processes of `render_pool`.
+    :param blocks: List of the Markdown blocks.
+    :return: List of the HTML of the blocks.
+    """
+
+    return [convert_md_to_html(original_markdown_content=block) for block in blocks]
+
+
+def render_markdown(original_markdown_content: str) -> str:
+    """
+    Convert a Markdown document to HTML, only rendering the blocks which are not in `markdown_block_cache`.
+    The missing blocks are rendered together by one task of `render_pool`.
+    :param original_markdown_content: Original sting in markdown format.
+    :return: HTML content string.
+    """
+
+    blocks = split_markdown_blocks(original_markdown_content=original_markdown_content)
+    keys = [hashlib.sha256(block.encode('utf-8')).hexdigest() for block in blocks]
+    rendered: dict[str, str] = {}
+
+    for key in keys:
+        html = markdown_block_cache.get(key)
+
+        if html is not None:
+            rendered[key] = html
+
+    missing = {key: block for key, block in zip(keys, blocks) if key not in rendered}
+
+    if missing:
+        for key, html in zip(missing, render_pool.run(render_markdown_blocks, list(missing.values()))):
+            rendered[key] = html
+            markdown_block_cache.set(key, html, size=len(html.encode('utf-8')))
+
+    return join_rendered_blocks(html_blocks=[rendered[key] for key in keys])
+
+
+def join_rendered_blocks(html_blocks: list[str]) -> str:
+    """
+    Join the HTML of the blocks as Markdown joins the elements of a whole document.
+    A highlighted code block is stored aside while rendering and put back with a line break of its own,
+    so it is followed by an empty line.
+    :param html_blocks: List of the HTML of the blocks.
+    :return: HTML content string.
+    """
+
+    if not html_blocks:
+        return ''
+
+    parts: list[str] = []
+
+    for html in html_blocks[:-1]:
+        parts.append(html)
+        parts.append('\n\n' if html.endswith(CODE_BLOCK_END) else '\n')
+
+    parts.append(html_blocks[-1])
+
+    return ''.join(parts)
@@ -2,26 +2,60 @@
 # Filename: hash_tools.py
 
 from passlib.context import CryptContext
+from tools.executor_tools import BoundedThreadPool
+import config
 
 passwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
 
+# Threads dedicated to bcrypt. The `bcrypt` package, pinned in the requirements, releases the GIL while hashing,
+# the `os_crypt` backend passlib falls back to without it does not, and would stall the event loop.
+# A burst of logins queues here and is rejected with 503 beyond the limit,
+# instead of taking every thread of the server.
+hash_pool = BoundedThreadPool(
+    name='password_hash',
+    max_workers=config.HASH_WORKERS,
+    max_pending=config.HASH_MAX_PENDING
+)
+
 
 def get_password_hashed(plain_password: str) -> str:
     """
     Make the password hashed so as not to leak.
+    It waits for `hash_pool`, so it is meant for sync routes.
     :param plain_password: Password to be hashed.
     :return: The hashed password.
     """
-    return passwd_context.hash(plain_password)
+    return hash_pool.run(passwd_context.hash, plain_password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify the password from the plain to the hashed.
+    It waits for `hash_pool`, so it is meant for sync routes.
     :param plain_password: The original password.
     :param hashed_password: The hashed password.
     :return: The result of the verification.
     """
 
-    return passwd_context.verify(secret=plain_password, hash=hashed_password)
+    return hash_pool.run(passwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hashed_async(plain_password: str) -> str:
+    """
+    Make the password hashed, without blocking the event loop.
+    :param plain_password: Password to be hashed.
+    :return: The hashed password.
+    """
+
+    return await hash_pool.run_async(passwd_context.hash, plain_password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify the password from the plain to the hashed, without blocking the event loop.
+    :param plain_password: The original password.
+    :param hashed_password: The hashed password.
+    :return: The result of the verification.
+    """
 
+    return await hash_pool.run_async(passwd_context.verify, plain_password, hashed_password)
@@ -1,2 +1,167 @@
 # encoding: utf-8
 # Filename: image_tools.py
+
+"""
+Processing of the avatars.
+
+An uploaded avatar is validated with Pillow, stripped of its metadata and resized to each of
+`config.AVATAR_SIZES` in each of `config.AVATAR_FORMATS`. The files are named
+`<stem>-<size>.<format>`, and the stem is what the users table stores.
+"""
+
+from pathlib import Path
+from tools.executor_tools import BoundedProcessPool
+from PIL import Image, ImageOps, UnidentifiedImageError
+import os
+import tempfile
+import time
+import config
+
+# Processes resizing avatars, so that decoding large images does not hold the GIL of the server.
+avatar_pool = BoundedProcessPool(
+    name='avatar',
+    max_workers=config.AVATAR_WORKERS,
+    max_pending=config.AVATAR_MAX_PENDING,
+    timeout=config.AVATAR_TIMEOUT
+)
+
+# Formats Pillow is allowed to decode an upload as.
+ACCEPTED_FORMATS: tuple = ('PNG', 'JPEG', 'GIF', 'WEBP')
+
+# Pillow format of each file extension of `config.AVATAR_FORMATS`.
+OUTPUT_FORMATS: dict[str, str] = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG'
+}
+
+
+def open_avatar(source_path: str) -> Image.Image:
+    """
+    Decode an uploaded image, refusing anything but a plain image of a reasonable size.
+    :param source_path: Path of the upload on the disk.
+    :return: The image, loaded and turned upright.
+    """
+
+    try:
+        # `open` only reads the header, so the size is known before anything is decoded.
+        # `verify` checks the whole file without decoding it, the image has to be opened again after it.
+        with Image.open(source_path, formats=ACCEPTED_FORMATS) as image:
+            if image.width * image.height > config.AVATAR_MAX_PIXELS:
+                raise ValueError(f"The avatar is larger than {config.AVATAR_MAX_PIXELS} pixels.")
+
+            image.verify()
+
+        with Image.open(source_path, formats=ACCEPTED_FORMATS) as image:
+            image.load()
+
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ValueError(f"The avatar is not a valid image: {e}")
+
+    # The orientation is applied to the pixels, as the EXIF data which holds it is dropped.
+    return ImageOps.exif_transpose(image)
+
+
+def process_avatar(source_path: str, stem: str, deadline: float | None = None) -> list[str]:
+    """
+    Write every size and format of an avatar, without the metadata of the upload.
+    It runs in `avatar_pool`, which is given the path of the upload instead of its content.
+    :param source_path: Path of the upload on the disk.
+    :param stem: Path of the files without the size and the extension.
+    :param deadline: `time.time()` after which the request has given up waiting, and nothing more is written.
+    :return: Paths of the files written.
+    """
+
+    image = open_avatar(source_path=source_path)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # JPEG has no transparency, the transparent pixels become white.
+    opaque = Image.new('RGB', image.size, (255, 255, 255))
+    opaque.paste(image, mask=image.getchannel('A') if has_alpha else None)
+
+    written: list[str] = []
+
+    try:
+        for size in config.AVATAR_SIZES:
+            for extension in config.AVATAR_FORMATS:
+                source = image if OUTPUT_FORMATS[extension] == 'WEBP' else opaque
+                resized = ImageOps.fit(source, (size, size), method=Image.Resampling.LANCZOS)
+                path = f"{stem}-{size}.{extension}"
+
+                # A task which timed out keeps running in its process, the request has deleted its files already.
+                if deadline is not None and time.time() > deadline:
+                    raise TimeoutError(f"The avatar '{stem}' was not processed in time.")
+
+                write_atomically(image=resized, path=path, image_format=OUTPUT_FORMATS[extension])
+                written.append(path)
+
+    except BaseException:
+        # A failed avatar leaves none of its sizes behind.
+        for path in written:
+            os.unlink(path)
+
+        raise
+
+    return written
+
+
+def write_atomically(image: Image.Image, path: str, image_format: str) -> None:
+    """
+    Write an image to a temporary file next to its path, and move it into place at once,
+    so that readers never see a half written file.
+    :param image: The image.
+    :param path: Path of the file.
+    :param image_format: Pillow format to save it as.
+    :return: None.
+    """
+
+    with tempfile.NamedTemporaryFile('wb', dir=Path(path).parent, suffix='.tmp', delete=False) as f:
+        temp_path = f.name
+
+        # Nothing of `info` is passed on, so EXIF, ICC and text chunks are not written.
+        try:
+            image.save(f, format=image_format, quality=config.AVATAR_QUALITY, optimize=True)
+
+        except BaseException:
+            f.close()
+            os.unlink(temp_path)
+            raise
+
+    os.replace(temp_path, path)
+
+
+def get_avatar_file(avatar_path: str, size: int, extension: str) -> str:
+    """
+    Get the path of an avatar file.
+    Avatars uploaded before the processing existed are a single file, which is returned as it is.
+    :param avatar_path: `User.avatar_path` of the user.
+    :param size: Size wanted, rounded up to the next size available.
+    :param extension: One of `config.AVATAR_FORMATS`.
+    :return: Path of the file.
+    """
+
+    if Path(avatar_path).suffix:
+        return avatar_path
+
+    available = sorted(config.AVATAR_SIZES)
+    size = next((x for x in available if x >= size), available[-1])
+
+    return f"{avatar_path}-{size}.{extension}"
+
+
+def delete_avatar_files(avatar_path: str) -> None:
+    """
+    Delete every file of an avatar.
+    :param avatar_path: `User.avatar_path` of the user.
+    :return: None.
+    """
+
+    path = Path(avatar_path)
+
+    if path.suffix:
+        path.unlink(missing_ok=True)
+        return
+
+    for size in config.AVATAR_SIZES:
+        for extension in config.AVATAR_FORMATS:
+            Path(f"{avatar_path}-{size}.{extension}").unlink(missing_ok=True)
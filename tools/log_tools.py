@@ -1,11 +1,256 @@
 # encoding: utf-8
 # Filename: log_tools.py
 
+"""
+Logs.
+
+Records are written as JSON lines to rotating files under `config.LOG_DIR`:
+the access log to `access.log`, everything else to `app.log`.
+The loggers only put the records into a queue, and a single thread writes them,
+so that a request never waits for the disk. When the queue is full, records are dropped and counted.
+"""
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from time import perf_counter
+from uuid import uuid4
+from starlette.datastructures import MutableHeaders, Headers
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+import atexit
+import copy
 import logging
+import queue
+import random
+import re
+import orjson
+import config
 
+ACCESS_LOGGER_NAME = 'blogger.access'
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
 
+# Id of the request being served, set by `AccessLogMiddleware`.
+request_id_var: ContextVar[str | None] = ContextVar('request_id', default=None)
 
-"""
-Logs
-"""
+# An id sent by a client or a proxy is kept only if it is short and plain.
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._\-]{1,128}')
+
+# Attributes every record has, the others were given with `extra` and are written as fields.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format a record as one line of JSON, with its `extra` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        request_id = getattr(record, 'request_id', None)
+
+        if request_id:
+            entry["request_id"] = request_id
+
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return orjson.dumps(entry, default=str).decode()
+
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Put the records into the queue without blocking, stamped with the id of the current request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message and the traceback are rendered here, as the arguments may change once the call returns,
+        # but the record is left to be formatted as JSON by the handlers of the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped += 1
+
+
+class ExcludeFilter(logging.Filter):
+    """
+    Let through every record but the ones of a logger and its children.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
+
+
+queue_handler: RequestQueueHandler | None = None
+listener: QueueListener | None = None
+
+
+def rotating_file_handler(file_name: str, record_filter: logging.Filter) -> RotatingFileHandler:
+    handler = RotatingFileHandler(
+        Path(config.LOG_DIR) / file_name,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    handler.setFormatter(JSONFormatter())
+    handler.addFilter(record_filter)
+
+    return handler
+
+
+def setup_logging() -> None:
+    """
+    Send the records of every logger to the queue, and start the thread writing them.
+    Calling it again does nothing.
+    :return: None.
+    """
+
+    global queue_handler, listener
+
+    if listener is not None:
+        return
+
+    Path(config.LOG_DIR).mkdir(parents=True, exist_ok=True)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(config.LOG_CONSOLE_LEVEL)
+    console_handler.setFormatter(JSONFormatter())
+    console_handler.addFilter(ExcludeFilter(ACCESS_LOGGER_NAME))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    queue_handler = RequestQueueHandler(log_queue)
+    listener = QueueListener(
+        log_queue,
+        rotating_file_handler(file_name='app.log', record_filter=ExcludeFilter(ACCESS_LOGGER_NAME)),
+        rotating_file_handler(file_name='access.log', record_filter=logging.Filter(ACCESS_LOGGER_NAME)),
+        console_handler,
+        respect_handler_level=True
+    )
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(config.LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
+    access_logger.setLevel(logging.INFO)
+
+    listener.start()
+    # The records still in the queue are written on exit.
+    atexit.register(listener.stop)
+
+
+def stats() -> dict:
+    """
+    Get the state of the queue of the records.
+    :return: Dict type statistics.
+    """
+
+    if queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+
+    return {
+        "queued": queue_handler.queue.qsize(),
+        "dropped": queue_handler.dropped
+    }
+
+
+def get_request_id(scope: Scope) -> str:
+    """
+    Get the id of a request, from its `X-Request-ID` header if it is valid, otherwise a new one.
+    :param scope: Scope of the request.
+    :return: The id.
+    """
+
+    request_id = Headers(scope=scope).get('x-request-id')
+
+    if request_id and REQUEST_ID_PATTERN.fullmatch(request_id):
+        return request_id
+
+    return uuid4().hex
+
+
+class AccessLogMiddleware:
+    """
+    Give each request an id, sent back in `X-Request-ID` and stamped on every record logged while serving it,
+    and write a record of the request to the access log.
+    Successful requests are sampled with `config.ACCESS_LOG_SAMPLE_RATE`, errors and slow requests are always logged.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = get_request_id(scope=scope)
+        token = request_id_var.set(request_id)
+        status_code = 500
+        response_bytes = 0
+        start = perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_bytes
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append('X-Request-ID', request_id)
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+
+        finally:
+            duration_ms = (perf_counter() - start) * 1000
+
+            if (status_code >= 400 or duration_ms >= config.ACCESS_LOG_SLOW_MS
+                    or random.random() < config.ACCESS_LOG_SAMPLE_RATE):
+                route = scope.get("route")
+                client = scope.get("client")
+
+                access_logger.info(
+                    "%s %s %d", scope["method"], scope["path"], status_code,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": route.path if route is not None else None,
+                        "status": status_code,
+                        "duration_ms": round(duration_ms, 3),
+                        "response_bytes": response_bytes,
+                        "client": client[0] if client else None,
+                        "user_agent": Headers(scope=scope).get('user-agent')
+                    }
+                )
 
+            request_id_var.reset(token)
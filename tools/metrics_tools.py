@@ -0,0 +1,494 @@
+# encoding: utf-8
+# Filename: metrics_tools.py
+
+"""
+Metrics of the server.
+
+The requests are counted and timed by a middleware, and the queries by events of the engines.
+Both only add to counters under a lock on the hot path, everything else is read when the metrics are asked for.
+They are served as JSON by `/api/admin/status`, and in the text format of Prometheus by `/metrics`.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+from dependencies.db import engine, async_engine, get_pool_statistics
+from tools.cache_tools import caches
+from tools.executor_tools import executors
+from tools.query_count_tools import record_query
+from tools.snapshot_tools import listing_snapshots
+from tools import log_tools
+import anyio
+import os
+import re
+import threading
+import resource
+import config
+
+
+class Histogram:
+    """
+    Counts of observations in fixed buckets, cumulated only when they are read.
+    Not locked by itself, the owner holds its lock around it.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        """
+        Get the cumulative counts of the buckets, the last one being `+Inf`.
+        :return: Dict type histogram.
+        """
+
+        cumulative: list[int] = []
+        total = 0
+
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+
+        return {
+            "buckets": dict(zip([*self.buckets, float('inf')], cumulative)),
+            "sum": self.sum,
+            "count": self.count
+        }
+
+
+class RequestMetrics:
+    """
+    Counts of the requests by route and status, and their latency by route.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.lock = Lock()
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        with self.lock:
+            key = (method, route, status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.latency.get((method, route))
+
+            if histogram is None:
+                histogram = self.latency[(method, route)] = Histogram(buckets=self.buckets)
+
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "latency": {key: histogram.snapshot() for key, histogram in self.latency.items()}
+            }
+
+
+# First keyword of a statement.
+STATEMENT_KIND = re.compile(r'\s*(\w+)')
+
+
+class QueryMetrics:
+    """
+    Counts and durations of the queries, by engine and kind of statement.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.lock = Lock()
+        self.queries: dict[tuple[str, str], int] = {}
+        self.errors: dict[str, int] = {}
+        self.duration: dict[tuple[str, str], Histogram] = {}
+
+    def observe(self, engine_name: str, statement: str, seconds: float) -> None:
+        # The first word is enough to tell reads from writes, and keeps the labels few.
+        match = STATEMENT_KIND.match(statement)
+        key = (engine_name, match.group(1).upper() if match else 'OTHER')
+
+        with self.lock:
+            self.queries[key] = self.queries.get(key, 0) + 1
+
+            histogram = self.duration.get(key)
+
+            if histogram is None:
+                histogram = self.duration[key] = Histogram(buckets=self.buckets)
+
+            histogram.observe(seconds)
+
+    def observe_error(self, engine_name: str) -> None:
+        with self.lock:
+            self.errors[engine_name] = self.errors.get(engine_name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "queries": dict(self.queries),
+                "errors": dict(self.errors),
+                "duration": {key: histogram.snapshot() for key, histogram in self.duration.items()}
+            }
+
+
+request_metrics = RequestMetrics(buckets=config.METRICS_LATENCY_BUCKETS)
+query_metrics = QueryMetrics(buckets=config.METRICS_QUERY_BUCKETS)
+
+
+def instrument_engine(target: Engine, name: str) -> None:
+    """
+    Time every query of an engine with its cursor events.
+    They feed both the metrics of the server and the queries of the current request.
+    :param target: The engine, the `sync_engine` of an async engine.
+    :param name: Name of the engine in the metrics.
+    :return: None.
+    """
+
+    @event.listens_for(target, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = perf_counter()
+
+    @event.listens_for(target, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = perf_counter() - context.metrics_start
+        query_metrics.observe(engine_name=name, statement=statement, seconds=seconds)
+        record_query(statement=statement, seconds=seconds)
+
+    @event.listens_for(target, 'handle_error')
+    def handle_error(exception_context):
+        query_metrics.observe_error(engine_name=name)
+
+
+instrument_engine(target=engine, name='sync')
+instrument_engine(target=async_engine.sync_engine, name='async')
+
+
+class MetricsMiddleware:
+    """
+    Count and time the HTTP requests, by the template of their route rather than their path,
+    so that `/api/resources/posts/{page}` is one series whatever the page.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        status_code = 500
+        start = perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+
+        finally:
+            # The router sets the route it matched on the scope, the mounts only extend the root path.
+            route = scope.get("route")
+
+            if route is not None:
+                label = route.path
+            elif scope.get("root_path", "") != root_path:
+                label = scope["root_path"][len(root_path):]
+            else:
+                label = 'unmatched'
+
+            request_metrics.observe(method=scope["method"], route=label, status_code=status_code,
+                                    seconds=perf_counter() - start)
+
+
+def get_process_statistics() -> dict:
+    """
+    Get the memory, CPU time and threads of the process.
+    :return: Dict type statistics.
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            resident_bytes = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    except (OSError, ValueError, IndexError):
+        # Without procfs only the peak is known, in kilobytes on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        resident_bytes = peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+    times = os.times()
+
+    return {
+        "resident_memory_bytes": resident_bytes,
+        "cpu_seconds_total": times.user + times.system,
+        "threads": threading.active_count()
+    }
+
+
+def get_threadpool_statistics() -> dict:
+    """
+    Get the usage of the threadpool running the sync routers and dependencies.
+    It has to be called on the event loop.
+    :return: Dict type statistics.
+    """
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+
+    return {
+        "limit": limiter.total_tokens,
+        "busy": statistics.borrowed_tokens,
+        "queued": statistics.tasks_waiting
+    }
+
+
+def get_cache_statistics() -> dict:
+    """
+    Get the counters of every cache, with the ratio of hits.
+    :return: Dict type statistics, by the name of the cache.
+    """
+
+    statistics: dict = {}
+
+    for name, cache in caches.items():
+        counters = cache.stats()
+        lookups = counters["hits"] + counters["misses"]
+        statistics[name] = {**counters, "hit_ratio": counters["hits"] / lookups if lookups else 0.0}
+
+    return statistics
+
+
+def collect() -> dict:
+    """
+    Collect every metric of the server.
+    :return: Dict type metrics.
+    """
+
+    return {
+        "requests": request_metrics.snapshot(),
+        "queries": query_metrics.snapshot(),
+        "pools": get_pool_statistics(),
+        "caches": get_cache_statistics(),
+        "snapshots": listing_snapshots.stats(),
+        "executors": {name: executor.stats() for name, executor in executors.items()},
+        "threadpool": get_threadpool_statistics(),
+        "logs": log_tools.stats(),
+        "process": get_process_statistics()
+    }
+
+
+def format_histogram(name: str, labels: dict, histogram: dict) -> list[str]:
+    lines: list[str] = []
+
+    for bound, count in histogram["buckets"].items():
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        lines.append(format_sample(name=f"{name}_bucket", labels={**labels, "le": le}, value=count))
+
+    lines.append(format_sample(name=f"{name}_sum", labels=labels, value=histogram["sum"]))
+    lines.append(format_sample(name=f"{name}_count", labels=labels, value=histogram["count"]))
+
+    return lines
+
+
+def format_sample(name: str, labels: dict, value) -> str:
+    if not labels:
+        return f"{name} {value}"
+
+    escaped = ','.join(f'{key}="{escape_label_value(value=x)}"' for key, x in labels.items())
+
+    return f"{name}{{{escaped}}} {value}"
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_prometheus(metrics: dict) -> str:
+    """
+    Render the metrics in the text exposition format of Prometheus.
+    :param metrics: Metrics from `collect`.
+    :return: The text of the metrics.
+    """
+
+    lines: list[str] = []
+
+    def family(name: str, kind: str, description: str) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family('blogger_http_requests_total', 'counter', 'HTTP requests by route and status.')
+    for (method, route, status_code), count in metrics["requests"]["requests"].items():
+        lines.append(format_sample(name='blogger_http_requests_total',
+                                   labels={"method": method, "route": route, "status": status_code}, value=count))
+
+    family('blogger_http_request_duration_seconds', 'histogram', 'Latency of the HTTP requests by route.')
+    for (method, route), histogram in metrics["requests"]["latency"].items():
+        lines += format_histogram(name='blogger_http_request_duration_seconds',
+                                  labels={"method": method, "route": route}, histogram=histogram)
+
+    family('blogger_db_queries_total', 'counter', 'Database queries by engine and kind of statement.')
+    for (engine_name, kind), count in metrics["queries"]["queries"].items():
+        lines.append(format_sample(name='blogger_db_queries_total',
+                                   labels={"engine": engine_name, "statement": kind}, value=count))
+
+    family('blogger_db_query_errors_total', 'counter', 'Database queries which failed, by engine.')
+    for engine_name, count in metrics["queries"]["errors"].items():
+        lines.append(format_sample(name='blogger_db_query_errors_total', labels={"engine": engine_name}, value=count))
+
+    family('blogger_db_query_duration_seconds', 'histogram', 'Duration of the database queries.')
+    for (engine_name, kind), histogram in metrics["queries"]["duration"].items():
+        lines += format_histogram(name='blogger_db_query_duration_seconds',
+                                  labels={"engine": engine_name, "statement": kind}, histogram=histogram)
+
+    pool_gauges = {
+        "size": 'Connections kept by the pool.',
+        "checked_out": 'Connections in use.',
+        "overflow": 'Connections opened over the size of the pool.',
+        "checked_out_max": 'Most connections in use at once.',
+        "wait_seconds_max": 'Longest wait for a connection.'
+    }
+    pool_counters = {
+        "checkouts": 'Connections checked out.',
+        "timeouts": 'Checkouts which timed out.',
+        "wait_seconds_total": 'Time spent waiting for connections.'
+    }
+
+    for key, description in pool_gauges.items():
+        family(f'blogger_db_pool_{key}', 'gauge', description)
+        for pool_name, statistics in metrics["pools"].items():
+            if key in statistics:
+                lines.append(format_sample(name=f'blogger_db_pool_{key}', labels={"pool": pool_name},
+                                           value=statistics[key]))
+
+    for key, description in pool_counters.items():
+        family(f'blogger_db_pool_{key}_total', 'counter', description)
+        for pool_name, statistics in metrics["pools"].items():
+            lines.append(format_sample(name=f'blogger_db_pool_{key}_total', labels={"pool": pool_name},
+                                       value=statistics[key]))
+
+    family('blogger_cache_hits_total', 'counter', 'Lookups found in the cache.')
+    for cache_name, statistics in metrics["caches"].items():
+        lines.append(format_sample(name='blogger_cache_hits_total', labels={"cache": cache_name},
+                                   value=statistics["hits"]))
+
+    family('blogger_cache_misses_total', 'counter', 'Lookups missing from the cache.')
+    for cache_name, statistics in metrics["caches"].items():
+        lines.append(format_sample(name='blogger_cache_misses_total', labels={"cache": cache_name},
+                                   value=statistics["misses"]))
+
+    family('blogger_cache_hit_ratio', 'gauge', 'Ratio of the lookups found in the cache.')
+    for cache_name, statistics in metrics["caches"].items():
+        lines.append(format_sample(name='blogger_cache_hit_ratio', labels={"cache": cache_name},
+                                   value=statistics["hit_ratio"]))
+
+    family('blogger_cache_entries', 'gauge', 'Entries in the cache.')
+    for cache_name, statistics in metrics["caches"].items():
+        lines.append(format_sample(name='blogger_cache_entries', labels={"cache": cache_name},
+                                   value=statistics["entries"]))
+
+    snapshots = metrics["snapshots"]
+    family('blogger_listing_snapshot_hits_total', 'counter', 'Listings served from a snapshot.')
+    lines.append(format_sample(name='blogger_listing_snapshot_hits_total', labels={}, value=snapshots["hits"]))
+    family('blogger_listing_snapshot_misses_total', 'counter', 'Listings read from the database.')
+    lines.append(format_sample(name='blogger_listing_snapshot_misses_total', labels={}, value=snapshots["misses"]))
+
+    executor_gauges = {
+        "workers": 'Workers of the executor.',
+        "pending": 'Tasks waiting or running.',
+        "queued": 'Tasks waiting for a worker.'
+    }
+    executor_counters = {
+        "completed": 'Tasks completed.',
+        "rejected": 'Tasks rejected as the executor was full.',
+        "timeouts": 'Tasks which timed out.'
+    }
+
+    for key, description in executor_gauges.items():
+        family(f'blogger_executor_{key}', 'gauge', description)
+        for executor_name, statistics in metrics["executors"].items():
+            lines.append(format_sample(name=f'blogger_executor_{key}', labels={"executor": executor_name},
+                                       value=statistics[key]))
+
+    for key, description in executor_counters.items():
+        family(f'blogger_executor_{key}_total', 'counter', description)
+        for executor_name, statistics in metrics["executors"].items():
+            lines.append(format_sample(name=f'blogger_executor_{key}_total', labels={"executor": executor_name},
+                                       value=statistics[key]))
+
+    threadpool = metrics["threadpool"]
+    family('blogger_threadpool_limit', 'gauge', 'Threads available to the sync routers.')
+    lines.append(format_sample(name='blogger_threadpool_limit', labels={}, value=threadpool["limit"]))
+    family('blogger_threadpool_busy', 'gauge', 'Threads running sync routers.')
+    lines.append(format_sample(name='blogger_threadpool_busy', labels={}, value=threadpool["busy"]))
+    family('blogger_threadpool_queued', 'gauge', 'Sync routers waiting for a thread.')
+    lines.append(format_sample(name='blogger_threadpool_queued', labels={}, value=threadpool["queued"]))
+
+    family('blogger_log_records_queued', 'gauge', 'Log records waiting to be written.')
+    lines.append(format_sample(name='blogger_log_records_queued', labels={}, value=metrics["logs"]["queued"]))
+    family('blogger_log_records_dropped_total', 'counter', 'Log records dropped as the queue was full.')
+    lines.append(format_sample(name='blogger_log_records_dropped_total', labels={}, value=metrics["logs"]["dropped"]))
+
+    process = metrics["process"]
+    family('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes.')
+    lines.append(format_sample(name='process_resident_memory_bytes', labels={}, value=process["resident_memory_bytes"]))
+    family('process_cpu_seconds_total', 'counter', 'User and system CPU time spent in seconds.')
+    lines.append(format_sample(name='process_cpu_seconds_total', labels={}, value=process["cpu_seconds_total"]))
+    family('process_threads', 'gauge', 'Threads of the process.')
+    lines.append(format_sample(name='process_threads', labels={}, value=process["threads"]))
+
+    return '\n'.join(lines) + '\n'
+
+
+def format_status(metrics: dict) -> dict:
+    """
+    Turn the tuple keys of the metrics into nested dicts, so that they can be sent as JSON.
+    :param metrics: Metrics from `collect`.
+    :return: The metrics, with string keys only.
+    """
+
+    requests: dict = {}
+
+    for (method, route, status_code), count in metrics["requests"]["requests"].items():
+        entry = requests.setdefault(f"{method} {route}", {"statuses": {}, "latency": None})
+        entry["statuses"][str(status_code)] = count
+
+    for (method, route), histogram in metrics["requests"]["latency"].items():
+        entry = requests.setdefault(f"{method} {route}", {"statuses": {}, "latency": None})
+        entry["latency"] = {
+            "buckets": {('+Inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in histogram["buckets"].items()},
+            "sum": histogram["sum"],
+            "count": histogram["count"],
+            "average": histogram["sum"] / histogram["count"] if histogram["count"] else 0.0
+        }
+
+    queries: dict = {}
+
+    for (engine_name, kind), histogram in metrics["queries"]["duration"].items():
+        queries.setdefault(engine_name, {})[kind] = {
+            "count": metrics["queries"]["queries"].get((engine_name, kind), 0),
+            "seconds_total": histogram["sum"],
+            "average": histogram["sum"] / histogram["count"] if histogram["count"] else 0.0
+        }
+
+    return {
+        **metrics,
+        "requests": requests,
+        "queries": {"statements": queries, "errors": metrics["queries"]["errors"]}
+    }
@@ -0,0 +1,60 @@
+# encoding: utf-8
+# Filename: migration_tools.py
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from pathlib import Path
+import sys
+
+# Revision matching the tables `create_all` made before the migrations existed.
+BASELINE_REVISION: str = '0001'
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def get_alembic_config(connection=None) -> Config:
+    """
+    Get the configuration of alembic, running on the given connection.
+    :param connection: Connection of the database, or None to connect with `config.DATABASE_URL`.
+    :return: Configuration of alembic.
+    """
+
+    alembic_config = Config(str(PROJECT_DIR.joinpath('alembic.ini')))
+    alembic_config.set_main_option('script_location', str(PROJECT_DIR.joinpath('migrations')))
+    alembic_config.attributes['connection'] = connection
+    # Keep the logging of the application as it is.
+    alembic_config.attributes['configure_logger'] = False
+
+    return alembic_config
+
+
+def upgrade_database(engine) -> None:
+    """
+    Upgrade the database to the latest revision, also run by `python -m tools.migration_tools`.
+    Databases created by `create_all` before the migrations existed are stamped with the baseline first,
+    which a plain `alembic upgrade head` does not do.
+    :param engine: Engine of the database.
+    :return:
+    """
+
+    with engine.begin() as connection:
+        tables = inspect(connection).get_table_names()
+        alembic_config = get_alembic_config(connection=connection)
+
+        if 'users' in tables and 'alembic_version' not in tables:
+            command.stamp(alembic_config, BASELINE_REVISION)
+
+        command.upgrade(alembic_config, 'head')
+
+
+def main() -> int:
+    from dependencies.db import engine
+
+    upgrade_database(engine=engine)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
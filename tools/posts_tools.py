@@ -1,18 +1,31 @@
 # encoding: utf-8
 # Filename: posts_tools.py
 
+from datetime import datetime
 from fastapi import HTTPException, UploadFile, File
 from pathlib import Path
+from threading import Lock, Thread
 from sqlalchemy.orm import Session
-from tools.file_tools import convert_md_to_html
+from tools.file_tools import render_markdown
+from tools.cache_tools import post_content_cache
+from tools.compression_tools import write_precompressed
+from tools import upload_tools
+from dependencies.db import SessionLocal
 from model import crud
 import config
+import logging
+import os
 import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
 
 
 def write_the_post(user_name: str, post_uuid: str, post_file: UploadFile = File()):
     """
-    Create the directory for the post.
+    Create the directory for the post, and write the post rendered to HTML.
+    The upload is streamed to a temporary file and kept as the Markdown source of the post,
+    so that it can be rendered again later. An upload identical to the current source is not rendered again.
     :param post_file: File Object.
     :param user_name: Name of the user, it cannot be changed.
     :param post_uuid: Uuid of post.
@@ -33,19 +46,148 @@ def write_the_post(user_name: str, post_uuid: str, post_file: UploadFile = File(
             status_code=500,
             detail=f"Can not create directory {author_post_dir.name} !"
         )
+    html_path = author_post_dir.joinpath(post_uuid + '.html')
+    markdown_path = author_post_dir.joinpath(post_uuid + '.md')
+
+    # Stream the upload to the disk, the upload is never held in memory at once.
+    stored = upload_tools.store_upload(upload=post_file, directory=author_post_dir, max_bytes=config.POST_MAX_BYTES,
+                                       suffix='.md.tmp')
+
     try:
-        with open(str(author_post_dir.joinpath(post_uuid+'.html')), 'w') as f:
-            content = convert_md_to_html(original_markdown_content=post_file.file.read().decode('utf-8'))
-            f.write(content)
+        # The same source as the published one renders to the same HTML.
+        if html_path.exists() and upload_tools.file_sha256(markdown_path) == stored.sha256:
+            return True
+
+        try:
+            original_markdown_content = stored.path.read_text(encoding='utf-8')
+
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File '{post_file.filename}' is not encoded in UTF-8!"
+            )
+
+        write_the_html(html_path=html_path, content=render_markdown(original_markdown_content))
+        stored.replace(markdown_path)
+
     except IOError as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Can not write posts file {str(author_post_dir.joinpath(post_uuid + '.md'))}! \n {e}"
+            detail=f"Can not write posts file {str(html_path)}! \n {e}"
         )
 
+    finally:
+        stored.discard()
+
+    post_content_cache.invalidate(post_uuid)
+
     return True
 
 
+def write_the_html(html_path: Path, content: str):
+    """
+    Replace the HTML file of a post at once, readers never see it half written.
+    Its compressed variants are written first, so that they are never older than the HTML file.
+    :param html_path: Path of the HTML file.
+    :param content: HTML content string.
+    :return: None.
+    """
+
+    raw_content = content.encode('utf-8')
+    write_precompressed(html_path=html_path, content=raw_content)
+
+    with tempfile.NamedTemporaryFile('wb', dir=html_path.parent, suffix='.html.tmp', delete=False) as f:
+        html_temp_path = f.name
+        f.write(raw_content)
+
+    os.replace(html_temp_path, html_path)
+
+
+def rerender_all_posts() -> int:
+    """
+    Render the Markdown source of every post to HTML again, after the renderer has changed.
+    Blocks shared with posts rendered before are served from the block cache.
+    Posts published before their source was kept have nothing to render from, and are skipped.
+    The update time of each post is set once its HTML is replaced, so that the clients and the caches
+    holding the old HTML see a new version.
+    :return: Amount of the posts rendered.
+    """
+
+    rendered: int = 0
+
+    with SessionLocal() as db:
+        for markdown_path in Path(config.STATIC_DIR).joinpath("posts").glob('*/*/*.md'):
+            post_uuid = markdown_path.stem
+
+            write_the_html(html_path=markdown_path.with_suffix('.html'),
+                           content=render_markdown(markdown_path.read_text(encoding='utf-8')))
+            post_content_cache.invalidate(post_uuid)
+            crud.touch_post(post_uuid=post_uuid, db=db)
+            rendered += 1
+
+    return rendered
+
+
+class RerenderJob:
+    """
+    A thread rendering every post again, so that the request starting it does not wait for all of them.
+    Only one runs at a time in a process.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.thread: Thread | None = None
+        self.rendered: int | None = None
+        self.failed: bool = False
+        self.started: datetime | None = None
+        self.finished: datetime | None = None
+
+    def start(self) -> bool:
+        """
+        Start rendering, unless it is running already.
+        :return: False if it was running already.
+        """
+
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+
+            self.rendered = None
+            self.failed = False
+            self.started = datetime.utcnow()
+            self.finished = None
+            self.thread = Thread(target=self.run, name='rerender-posts', daemon=True)
+            self.thread.start()
+
+        return True
+
+    def run(self) -> None:
+        try:
+            rendered = rerender_all_posts()
+
+        except Exception:
+            logger.exception('Rendering the posts again failed')
+            rendered = None
+
+        with self.lock:
+            self.rendered = rendered
+            self.failed = rendered is None
+            self.finished = datetime.utcnow()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "running": self.thread is not None and self.thread.is_alive(),
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "started": self.started,
+                "finished": self.finished
+            }
+
+
+rerender_job = RerenderJob()
+
+
 def delete_the_post(user_name: str, post_uuid: str):
     """
     Delete the post, which is published by the user.
@@ -60,6 +202,7 @@ def delete_the_post(user_name: str, post_uuid: str):
     # Remove the directory with Exception dealing.
     try:
         shutil.rmtree(author_post_dir)
+        post_content_cache.invalidate(post_uuid)
 
     # If some errors appear, raise the Exception by HTTP to the frontend.
     except Exception as e:
@@ -0,0 +1,178 @@
+# encoding: utf-8
+# Filename: query_count_tools.py
+
+"""
+Queries of each request.
+
+The cursor events of the engines record every statement into the `RequestQueries` of the current context,
+which the middleware sets for each request. The sync routers see it too, as the threadpool copies the context.
+A statement repeated many times in one request is usually a lookup per row, it is logged as a likely N+1.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+import logging
+import re
+import config
+
+logger = logging.getLogger(__name__)
+
+# Literals, placeholders and lists of placeholders, in the order they are replaced.
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+PLACEHOLDER = re.compile(r"%s|%\(\w+\)s|\?|(?<!:):\w+")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    More queries were run than the budget allows.
+    An `AssertionError`, so that a test runner reports it as a failure.
+    """
+
+
+class RequestQueries:
+    """
+    Count and time of the statements run in one request, by normalized statement.
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.seconds: float = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[normalize_statement(statement=statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Get the statements run more than a number of times.
+        :param threshold: Number of runs allowed.
+        :return: List of `(normalized statement, runs)`, most run first.
+        """
+
+        return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+    def check_budget(self, max_queries: int) -> None:
+        """
+        Raise if more queries were run than allowed.
+        :param max_queries: Number of queries allowed.
+        :return: None.
+        """
+
+        if self.count > max_queries:
+            top = '\n'.join(f"  {count} x {statement}" for statement, count in self.statements.most_common(5))
+            raise QueryBudgetExceeded(f"{self.count} queries were run, the budget is {max_queries}:\n{top}")
+
+
+current_queries: ContextVar[RequestQueries | None] = ContextVar('current_queries', default=None)
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """
+    Reduce a statement to its shape, so that the same query with other values or list lengths compares equal.
+    :param statement: SQL statement as sent to the driver.
+    :return: The statement, with every value and list of values as `?`.
+    """
+
+    statement = STRING_LITERAL.sub('?', statement)
+    statement = PLACEHOLDER.sub('?', statement)
+    statement = NUMBER_LITERAL.sub('?', statement)
+    statement = PLACEHOLDER_LIST.sub('(?)', statement)
+
+    return WHITESPACE.sub(' ', statement).strip()
+
+
+def record_query(statement: str, seconds: float) -> None:
+    """
+    Record a statement into the queries of the current request, if there is one.
+    It is called by the cursor events of the engines, see `metrics_tools.instrument_engine`.
+    :param statement: SQL statement as sent to the driver.
+    :param seconds: Time it took.
+    :return: None.
+    """
+
+    queries = current_queries.get()
+
+    if queries is not None:
+        queries.record(statement=statement, seconds=seconds)
+
+
+def warn_repeated(queries: RequestQueries, where: str) -> None:
+    """
+    Log the statements repeated more than `config.QUERY_REPEAT_WARNING` times.
+    :param queries: Queries of a request.
+    :param where: What ran them, such as the method and path of the request.
+    :return: None.
+    """
+
+    for statement, count in queries.repeated(threshold=config.QUERY_REPEAT_WARNING):
+        logger.warning("Likely N+1 query in %s, run %d times: %s", where, count, statement)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Fail if the code in the block runs more than a number of queries, in the tests.
+    The requests sent through a test client are checked by `config.QUERY_BUDGET` instead,
+    as they run in the context of the server.
+    :param max_queries: Number of queries allowed.
+    :return: The `RequestQueries` of the block.
+    """
+
+    queries = RequestQueries()
+    token = current_queries.set(queries)
+
+    try:
+        yield queries
+
+    finally:
+        current_queries.reset(token)
+
+    queries.check_budget(max_queries=max_queries)
+
+
+class QueryCountMiddleware:
+    """
+    Count the queries of each request, send the total in debug headers,
+    and warn of the statements repeated too many times.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and config.QUERY_DEBUG_HEADERS:
+                # Queries run while the body is streamed are only counted after the headers are sent.
+                headers = MutableHeaders(scope=message)
+                headers.append('X-Query-Count', str(queries.count))
+                headers.append('X-Query-Time', f"{queries.seconds * 1000:.3f}")
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+
+        finally:
+            current_queries.reset(token)
+
+        warn_repeated(queries=queries, where=f"{scope['method']} {scope['path']}")
+
+        if config.QUERY_BUDGET is not None:
+            queries.check_budget(max_queries=config.QUERY_BUDGET)
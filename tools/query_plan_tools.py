@@ -0,0 +1,122 @@
+# encoding: utf-8
+# Filename: query_plan_tools.py
+
+"""
+EXPLAIN check of the hot queries.
+
+Every query filtered or sorted on the request path is explained on the configured database,
+and the check fails when one of them scans a table or a whole index, covering or not, or sorts without an index:
+    python -m tools.query_plan_tools
+
+Only the queries of `ORDERED_WALKS` may scan an index, they have no filter and stop at their limit.
+
+Run it against an upgraded database with realistic data, the optimizer may scan tiny tables on purpose.
+"""
+
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+from model import crud
+from model.models import User
+import sys
+
+
+# Queries without a filter, which walk an index in the order of the listing and stop at their limit.
+ORDERED_WALKS = {"posts_by_page"}
+
+
+def hot_queries() -> dict[str, Select]:
+    """
+    Get the hot queries of `crud.py` and `async_crud.py`, built by the same functions as theirs,
+    with their eager loads, which join the authors on `user_uuid` and the categories on their id.
+    :return: Statements by name.
+    """
+
+    cursor = (datetime(2000, 1, 1), 1)
+
+    return {
+        "posts_by_page": crud.posts_by_page_statement(page=2),
+        "posts_by_cursor": crud.posts_by_cursor_statement(cursor=cursor),
+        "posts_of_user_by_page": crud.posts_by_page_statement(page=1, user_uuid='author'),
+        "posts_of_user_by_cursor": crud.posts_by_cursor_statement(cursor=cursor, user_uuid='author'),
+        "posts_of_tag_by_cursor": crud.posts_by_cursor_statement(cursor=cursor, tag_id=1),
+        "tag_by_name": crud.tag_by_name_statement(tag_name='tag'),
+        "posts_of_category_by_page": crud.posts_by_page_statement(page=1, category_id=1),
+        "single_post": crud.post_by_uuid_statement(post_uuid='post'),
+        "comments_of_post": crud.comments_of_post_statement(post_uuid='post'),
+        "user_by_name": crud.user_by_statement(column=User.user_name, value='user'),
+        "user_by_uuid": crud.user_by_statement(column=User.user_uuid, value='user'),
+        "user_by_email": crud.user_by_statement(column=User.email, value='user@example.com')
+    }
+
+
+def explain(statement: Select, connection: Connection, ordered_walk: bool = False) -> list[str]:
+    """
+    Explain a statement and get what it reads without searching an index.
+    :param statement: Statement to explain.
+    :param connection: Connection of the database.
+    :param ordered_walk: Whether the statement may scan an index in its order, see `ORDERED_WALKS`.
+    :return: Names of the scanned tables, and `SORT` when the rows are sorted after reading them.
+    """
+
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+
+    if connection.dialect.name == 'sqlite':
+        # Lookups are 'SEARCH <table> USING ...'. Every 'SCAN <table>' reads all the rows,
+        # from the table or from an index, 'USING COVERING INDEX' included, only saving the reads of the table.
+        # A sort which the index does not give is 'USE TEMP B-TREE FOR ORDER BY'.
+        details = [row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN " + sql))]
+        problems = [
+            detail.split()[1] for detail in details
+            if detail.startswith('SCAN ') and not (ordered_walk and ' USING ' in detail and 'INDEX' in detail)
+        ]
+
+        if any(detail.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detail for detail in details):
+            problems.append('SORT')
+
+        return problems
+
+    # 'ALL' is a full table scan and 'index' a full index scan, covering or not.
+    rows = connection.execute(text("EXPLAIN " + sql)).mappings().all()
+    problems = [row['table'] for row in rows if row['type'] == 'ALL' or (row['type'] == 'index' and not ordered_walk)]
+
+    if any('Using filesort' in (row['Extra'] or '') for row in rows):
+        problems.append('SORT')
+
+    return problems
+
+
+def check_hot_queries(engine) -> dict[str, list[str]]:
+    """
+    Explain every hot query.
+    :param engine: Engine of the database.
+    :return: Scanned tables and `SORT` by query name, only for the queries which have any.
+    """
+
+    full_scans: dict[str, list[str]] = {}
+
+    with engine.connect() as connection:
+        for name, statement in hot_queries().items():
+            tables = explain(statement=statement, connection=connection, ordered_walk=name in ORDERED_WALKS)
+
+            if tables:
+                full_scans[name] = tables
+
+    return full_scans
+
+
+def main() -> int:
+    from dependencies.db import engine
+
+    full_scans = check_hot_queries(engine=engine)
+
+    for name in hot_queries():
+        status = f"SCANS: {', '.join(full_scans[name])}" if name in full_scans else "ok"
+        print(f"{name:<24} {status}")
+
+    return 1 if full_scans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
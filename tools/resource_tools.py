@@ -3,61 +3,199 @@
 # Methods of the fetch the resources.
 
 from fastapi import HTTPException
-from model import crud
-from sqlalchemy.orm import Session
+from model import async_crud
+from tools.cache_tools import post_content_cache
+from tools import search_tools
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from pathlib import Path
+from datetime import datetime
+import base64
+import binascii
 import config
 
 
-def get_data_of_posts_from_db(page: int, db: Session):
+async def get_data_of_posts_from_db(page: int, db: AsyncSession):
     """
     Get the data of posts from the database.
-    :param db: Session of the database.
+    :param db: Async session of the database.
     :param page: The page of the posts.
     :return: Dict type data of posts.
     """
 
-    return crud.select_all_posts_by_page(page=page, db=db)
+    return await async_crud.select_all_posts_by_page(page=page, db=db)
 
 
-def get_data_of_user_posts_from_db(user_uuid: str, page: int, db: Session):
+async def get_data_of_user_posts_from_db(user_uuid: str, page: int, db: AsyncSession):
     """
     Get the data of a user's posts from database.
     :param user_uuid: UUID of the user.
     :param page: The page of the posts.
-    :param db: Session of the database.
+    :param db: Async session of the database.
     :return: Dict type data of posts.
     """
 
-    return crud.select_all_posts_of_user_by_page(user_uuid=user_uuid, page=page, db=db)
+    return await async_crud.select_all_posts_of_user_by_page(user_uuid=user_uuid, page=page, db=db)
 
 
-def get_data_of_single_post_from_db(post_uuid: str, db: Session):
+def encode_posts_cursor(post) -> str:
+    """
+    Encode the position of a post into an opaque cursor.
+    :param post: The last post of a page.
+    :return: The cursor string.
+    """
+
+    raw = f"{post.create_time.isoformat()}|{post.id}"
+
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_posts_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor made by `encode_posts_cursor`.
+    :param cursor: The cursor string.
+    :return: `(create_time, id)` of the post.
+    """
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        create_time, post_id = raw.split('|')
+
+        return datetime.fromisoformat(create_time), int(post_id)
+
+    except (ValueError, UnicodeError, binascii.Error):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid cursor '{cursor}'!"
+        )
+
+
+async def get_page_of_posts_by_cursor(cursor: str | None, db: AsyncSession, user_uuid: str | None = None,
+                                      tag_id: int | None = None) -> dict:
+    """
+    Get a page of posts after a cursor, and the cursor of the next page.
+    :param cursor: The cursor returned by the previous page, None for the first page.
+    :param db: Async session of the database.
+    :param user_uuid: UUID of the user to limit the posts to, None for all the posts.
+    :param tag_id: ID of the tag to limit the posts to, None for all the posts.
+    :return: Dict type data of the posts and the next cursor.
+    """
+
+    position = decode_posts_cursor(cursor=cursor) if cursor else None
+    data_from_db = await async_crud.select_posts_by_cursor(cursor=position, user_uuid=user_uuid, tag_id=tag_id, db=db)
+
+    # One more post than a page is selected, the extra one only tells that there is a next page.
+    posts = data_from_db[:config.RESOURCES_POSTS_LIMIT]
+    has_next: bool = len(data_from_db) > config.RESOURCES_POSTS_LIMIT
+
+    return {
+        'posts': [format_post_summary(post=x) for x in posts],
+        'next_cursor': encode_posts_cursor(post=posts[-1]) if has_next else None
+    }
+
+
+async def get_data_of_single_post_from_db(post_uuid: str, db: AsyncSession):
     """
     Get the data of a single post from the database.
     :param post_uuid: Uuid of the post.
-    :param db: Session of the database.
+    :param db: Async session of the database.
     :return: The dict type data of a single post.
     """
 
-    return crud.get_single_post_data(post_uuid=post_uuid, db=db)
+    return await async_crud.get_single_post_with_details(post_uuid=post_uuid, db=db)
 
 
-def read_post_content(post_uuid: str, author_name: str):
+async def search_posts(query: str, page: int, stamp: str, db: AsyncSession) -> dict:
+    """
+    Search the posts, the best matches first.
+    :param query: Words to search.
+    :param page: The page of the results.
+    :param stamp: ETag of the listings, the index is synced first if it has been synced at another one.
+    :param db: Async session of the database.
+    :return: Dict type data of the amount of matches and the posts of the page, with their scores.
+    """
+
+    # The posts may have been written by another worker.
+    if search_tools.search_index.listing_etag != stamp:
+        await run_in_threadpool(search_tools.refresh_search_index)
+
+    # Ranking holds the lock of the index, which writers take too, so it stays off the event loop.
+    ranked = await run_in_threadpool(search_tools.search_index.search, query)
+    ranked_page = ranked[(page - 1) * config.RESOURCES_POSTS_LIMIT:page * config.RESOURCES_POSTS_LIMIT]
+
+    posts = {
+        post.post_uuid: post
+        for post in await async_crud.select_posts_by_uuids(post_uuids=[x for x, _ in ranked_page], db=db)
+    }
+
+    return {
+        'total': len(ranked),
+        'posts': [
+            {**format_post_summary(post=posts[post_uuid]), 'score': round(score, 4)}
+            for post_uuid, score in ranked_page if post_uuid in posts
+        ]
+    }
+
+
+def format_post_summary(post) -> dict:
+    """
+    Convert a post loaded with its author and category into the dict returned by the listings.
+    :param post: The post, loaded with `crud.posts_details_options`.
+    :return: Dict type data of the post.
+    """
+
+    return {
+        'id': post.id,
+        'post_uuid': post.post_uuid,
+        'title': post.title,
+        'author_uuid': post.author_uuid,
+        'author_name': post.author.nick_name,
+        'cover_url': post.cover_url,
+        'tags': post.tags,
+        'category_id': post.category_id,
+        'category': post.category.category_name,
+        'comment': post.comment,
+        'create_time': post.create_time,
+        'update_time': post.update_time
+    }
+
+
+def get_post_html_path(post_uuid: str, author_name: str) -> Path:
+    """
+    Get the path of the rendered HTML of a post.
+    :param post_uuid: Uuid of the post.
+    :param author_name: Name of the author.
+    :return: Path of the HTML file.
+    """
+
+    return Path(config.STATIC_DIR).joinpath("posts", author_name, post_uuid, post_uuid + '.html')
+
+
+def read_post_content(post_uuid: str, author_name: str, update_time: datetime | None = None):
     """
     Read the content of the post file.
+    The content is served from `post_content_cache` while the update time of the post is unchanged.
+    A miss blocks on the disk, so the async routers call it through the threadpool.
     :param author_name: Name of the author
     :param post_uuid: Uuid of the post.
+    :param update_time: Update time of the post, which validates the cached content.
     :return:
     """
 
-    # Define the path of the author directory.
-    author_dir = Path(config.STATIC_DIR).joinpath("posts")
-    post_dir = author_dir.joinpath(author_name).joinpath(post_uuid).joinpath(post_uuid + '.html')
+    post_content = post_content_cache.get(post_uuid, stamp=update_time)
+
+    if post_content is not None:
+        return post_content
+
+    post_dir = get_post_html_path(post_uuid=post_uuid, author_name=author_name)
     try:
-        with open(post_dir) as f:
+        with open(post_dir, 'rb') as f:
+            raw_content = f.read()
+
+        post_content = raw_content.decode('utf-8')
+        post_content_cache.set(post_uuid, post_content, size=len(raw_content), stamp=update_time)
 
-            return f.read()
+        return post_content
 
     except Exception as e:
 
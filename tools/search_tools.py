@@ -0,0 +1,476 @@
+# encoding: utf-8
+# Filename: search_tools.py
+
+"""
+Full-text search of the posts.
+
+An inverted index over the title, the tags and the text of the rendered HTML of each post,
+ranked with BM25. It is updated when a post is published, updated or deleted,
+and saved to `config.SEARCH_INDEX_PATH`, so that startup only tokenizes the posts changed since.
+
+Every worker holds its own index. It records the listing stamp it was synced at, and a search which reads
+another stamp first indexes again the posts changed since, by the other workers too.
+The workers share the saved index, a save never replaces one synced at a later stamp.
+"""
+
+from collections import Counter
+from datetime import datetime
+from html.parser import HTMLParser
+from pathlib import Path
+from threading import Event, Lock, Thread
+from sqlalchemy.orm import Session
+from dependencies.db import SessionLocal
+from model import crud
+from tools.conditional_tools import listing_version
+import atexit
+import logging
+import math
+import orjson
+import os
+import re
+import tempfile
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the tokenizer or the weights change, the saved index is rebuilt then.
+INDEX_FORMAT: int = 1
+
+# BM25 parameters, the usual defaults.
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+# A term in the title counts as much as this many terms in the text.
+FIELD_WEIGHTS: dict[str, int] = {
+    'title': 3,
+    'tags': 2,
+    'text': 1
+}
+
+WORD_PATTERN = re.compile(r'\w+')
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+
+# The saved index starts with its format and the time of its listing stamp, see `SearchIndex.save`.
+SAVED_LISTING_TIME_PATTERN = re.compile(rb'"listing_time":"([^"]*)"')
+
+
+class TextExtractor(HTMLParser):
+    """
+    Collect the text of an HTML document, without its tags.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts: list[str] = []
+
+    def handle_data(self, data: str) -> None:
+        self.parts.append(data)
+
+
+def extract_text(html: str) -> str:
+    """
+    Extract the text of the rendered HTML of a post.
+    :param html: HTML content string.
+    :return: Text of the post.
+    """
+
+    extractor = TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    return ' '.join(extractor.parts)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text into lower case terms.
+    Chinese, Japanese and Korean are not separated by spaces, so their runs are split into bigrams.
+    :param text: Text to split.
+    :return: List of the terms.
+    """
+
+    terms: list[str] = []
+
+    for word in WORD_PATTERN.findall(text.lower()):
+        if not CJK_PATTERN.search(word):
+            terms.append(word)
+            continue
+
+        for part in CJK_PATTERN.split(word):
+            if part:
+                terms.append(part)
+
+        for run in CJK_PATTERN.findall(word):
+            if len(run) == 1:
+                terms.append(run)
+
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    return terms
+
+
+class SearchIndex:
+    """
+    A thread safe inverted index of the posts.
+
+    Each post is stored with the weighted frequencies of its terms and the update time it was indexed at.
+    The postings are derived from them, so only the documents are saved.
+
+    The ETag and the time of the listing stamp it was last synced at are kept with it,
+    the posts are indexed at least up to date with them.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.lock = Lock()
+        # Saves are serialized, so the last one written is also the latest state.
+        self.save_lock = Lock()
+        self.documents: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, int]] = {}
+        self.total_length: int = 0
+        self.listing_etag: str | None = None
+        self.listing_time: str = ''
+
+    def add(self, post_uuid: str, stamp: str, fields: dict[str, str]) -> None:
+        """
+        Index a post, replacing the previous version of it.
+        :param post_uuid: Uuid of the post.
+        :param stamp: Update time of the post, which tells if it is indexed up to date.
+        :param fields: Texts of the post, by the names of `FIELD_WEIGHTS`.
+        :return: None.
+        """
+
+        frequencies: Counter = Counter()
+
+        for field, text in fields.items():
+            for term in tokenize(text):
+                frequencies[term] += FIELD_WEIGHTS[field]
+
+        with self.lock:
+            self._remove(post_uuid)
+            self._insert(post_uuid, {'stamp': stamp, 'length': sum(frequencies.values()), 'terms': dict(frequencies)})
+
+    def remove(self, post_uuid: str) -> None:
+        """
+        Remove a post from the index.
+        :param post_uuid: Uuid of the post.
+        :return: None.
+        """
+
+        with self.lock:
+            self._remove(post_uuid)
+
+    def _insert(self, post_uuid: str, document: dict) -> None:
+        self.documents[post_uuid] = document
+        self.total_length += document['length']
+
+        for term, frequency in document['terms'].items():
+            self.postings.setdefault(term, {})[post_uuid] = frequency
+
+    def _remove(self, post_uuid: str) -> None:
+        document = self.documents.pop(post_uuid, None)
+
+        if document is None:
+            return
+
+        self.total_length -= document['length']
+
+        for term in document['terms']:
+            posting = self.postings[term]
+            del posting[post_uuid]
+
+            if not posting:
+                del self.postings[term]
+
+    def stamps(self) -> dict[str, str]:
+        """
+        Get the update times the posts were indexed at.
+        :return: Update times by uuid of the posts.
+        """
+
+        with self.lock:
+            return {post_uuid: document['stamp'] for post_uuid, document in self.documents.items()}
+
+    def search(self, query: str) -> list[tuple[str, float]]:
+        """
+        Rank the posts matching any term of a query with BM25.
+        :param query: Words to search.
+        :return: List of the uuid and the score of the posts, the best first.
+        """
+
+        scores: Counter = Counter()
+
+        with self.lock:
+            count = len(self.documents)
+
+            if not count:
+                return []
+
+            average_length = self.total_length / count
+
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+
+                if not posting:
+                    continue
+
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+
+                for post_uuid, frequency in posting.items():
+                    length = self.documents[post_uuid]['length']
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[post_uuid] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        return scores.most_common()
+
+    def mark_synced(self, etag: str, last_modified: datetime) -> None:
+        """
+        Record the listing stamp the index has been synced at.
+        :param etag: ETag of the listings, read before the posts.
+        :param last_modified: Last modified time of the listings.
+        :return: None.
+        """
+
+        with self.lock:
+            self.listing_etag = etag
+            self.listing_time = last_modified.isoformat(timespec='microseconds')
+
+    def saved_listing_time(self) -> str:
+        """
+        Get the time of the listing stamp the saved index was synced at, without reading all of it.
+        :return: ISO format time, empty if there is no saved index.
+        """
+
+        try:
+            with self.path.open('rb') as f:
+                match = SAVED_LISTING_TIME_PATTERN.search(f.read(128))
+
+        except OSError:
+            return ''
+
+        return match.group(1).decode() if match else ''
+
+    def save(self) -> bool:
+        """
+        Replace the saved index at once, a crash never leaves it half written.
+        An index synced at an earlier stamp than the saved one, by a slower worker, is not saved.
+        :return: False if the saved index is newer.
+        """
+
+        with self.save_lock:
+            with self.lock:
+                # orjson keeps the order of the keys, so the time is found at the start of the file.
+                content = orjson.dumps({
+                    'format': INDEX_FORMAT,
+                    'listing_time': self.listing_time,
+                    'documents': self.documents
+                })
+                listing_time = self.listing_time
+
+            if listing_time < self.saved_listing_time():
+                return False
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            with tempfile.NamedTemporaryFile('wb', dir=self.path.parent, suffix='.tmp', delete=False) as f:
+                index_temp_path = f.name
+                f.write(content)
+
+            os.replace(index_temp_path, self.path)
+
+        return True
+
+    def load(self) -> bool:
+        """
+        Load the saved index.
+        :return: False if there is no usable saved index.
+        """
+
+        try:
+            saved = orjson.loads(self.path.read_bytes())
+
+        except (OSError, orjson.JSONDecodeError):
+            return False
+
+        if saved.get('format') != INDEX_FORMAT:
+            return False
+
+        with self.lock:
+            self.documents.clear()
+            self.postings.clear()
+            self.total_length = 0
+
+            for post_uuid, document in saved['documents'].items():
+                self._insert(post_uuid, document)
+
+        return True
+
+
+search_index = SearchIndex(path=config.SEARCH_INDEX_PATH)
+
+
+class IndexSaver:
+    """
+    A thread which saves the index after writes, so that a request never serializes the whole index.
+    The writes of `config.SEARCH_INDEX_SAVE_DELAY` seconds are saved together.
+    A save lost in a crash is made up on startup by `sync_search_index`, from the update times of the posts.
+    """
+
+    def __init__(self, index: SearchIndex):
+        self.index = index
+        self.event = Event()
+        self.thread: Thread | None = None
+
+    def request_save(self) -> None:
+        """
+        Ask for the index to be saved, without waiting for it.
+        :return: None.
+        """
+
+        self.event.set()
+
+    def start(self) -> None:
+        """
+        Start the thread, and save the pending writes on exit.
+        :return: None.
+        """
+
+        if self.thread is not None:
+            return
+
+        self.thread = Thread(target=self.run, name='search-index-saver', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def flush(self) -> None:
+        """
+        Save the index now if writes are pending.
+        :return: None.
+        """
+
+        if self.event.is_set():
+            self.event.clear()
+            self.index.save()
+
+    def run(self) -> None:
+        while True:
+            self.event.wait()
+            # The writes made while waiting are saved by the same save.
+            time.sleep(config.SEARCH_INDEX_SAVE_DELAY)
+
+            try:
+                self.flush()
+
+            except Exception:
+                logger.exception('Saving the search index failed')
+
+
+index_saver = IndexSaver(index=search_index)
+
+
+def add_post(post) -> None:
+    """
+    Index a post with the text of its rendered HTML.
+    :param post: The post, loaded with `crud.posts_details_options`.
+    :return: None.
+    """
+
+    html_path = Path(config.STATIC_DIR).joinpath("posts", post.author.user_name, post.post_uuid, post.post_uuid + '.html')
+
+    try:
+        text = extract_text(html_path.read_text(encoding='utf-8'))
+
+    except OSError:
+        text = ''
+
+    search_index.add(post_uuid=post.post_uuid, stamp=post.update_time.isoformat(), fields={
+        'title': post.title,
+        'tags': post.tags,
+        'text': text
+    })
+
+
+def index_post(post) -> None:
+    """
+    Index a post which has been published or updated, the index is saved in the background.
+    :param post: The post, loaded with `crud.posts_details_options`.
+    :return: None.
+    """
+
+    add_post(post)
+    index_saver.request_save()
+
+
+def remove_post(post_uuid: str) -> None:
+    """
+    Remove a deleted post from the index, the index is saved in the background.
+    :param post_uuid: Uuid of the post.
+    :return: None.
+    """
+
+    search_index.remove(post_uuid)
+    index_saver.request_save()
+
+
+# Only one sync runs at a time, the searches waiting for it find the index synced.
+sync_lock = Lock()
+
+
+def sync_search_index(db: Session) -> int:
+    """
+    Index again only the posts created, updated or deleted since the index was synced,
+    starting from the saved index when this process has not synced yet.
+    :param db: Session of the database.
+    :return: Amount of the posts indexed or removed.
+    """
+
+    with sync_lock:
+        # Read before the posts, the posts are then at least as recent as the stamp.
+        etag, last_modified = listing_version.validators(db=db)
+
+        if search_index.listing_etag == etag:
+            return 0
+
+        if search_index.listing_etag is None:
+            search_index.load()
+
+        changed = index_changed_posts(db=db)
+        search_index.mark_synced(etag=etag, last_modified=last_modified)
+
+    if changed or not search_index.path.exists():
+        index_saver.request_save()
+
+    return changed
+
+
+def refresh_search_index() -> int:
+    """
+    Sync the index in a session of its own, for the searches which read another listing stamp.
+    :return: Amount of the posts indexed or removed.
+    """
+
+    with SessionLocal() as db:
+        return sync_search_index(db=db)
+
+
+def index_changed_posts(db: Session) -> int:
+    """
+    Compare the update times of the indexed posts with the database, and index again the ones which differ.
+    :param db: Session of the database.
+    :return: Amount of the posts indexed or removed.
+    """
+
+    indexed = search_index.stamps()
+    current: dict[str, datetime] = dict(crud.get_posts_update_times(db=db))
+    stale = [post_uuid for post_uuid, update_time in current.items()
+             if indexed.get(post_uuid) != update_time.isoformat()]
+    deleted = [post_uuid for post_uuid in indexed if post_uuid not in current]
+
+    for post_uuid in deleted:
+        search_index.remove(post_uuid)
+
+    for post in crud.get_posts_with_details_by_uuids(post_uuids=stale, db=db):
+        add_post(post)
+
+    return len(stale) + len(deleted)
@@ -0,0 +1,173 @@
+# encoding: utf-8
+# Filename: snapshot_tools.py
+
+"""
+Pre-serialized listings.
+
+The first pages of the listings only change when posts, categories or nick names are written,
+so they are kept as ready-to-send JSON bytes. A thread builds them again after each write,
+and a snapshot is only served while it was built at the stamp the request reads from the database.
+Another worker sees the writes of the others by that stamp, and builds its snapshots again then.
+"""
+
+from datetime import datetime
+from threading import Event, Lock, Thread
+from fastapi import Response
+from dependencies.db import SessionLocal
+from model import crud
+from tools.conditional_tools import listing_version, validator_headers
+from tools.resource_tools import format_post_summary, encode_posts_cursor
+import logging
+import orjson
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ListingSnapshots:
+    """
+    Ready-to-send bodies of the listings, by key, stamped with the `listing_version` they were built at.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.bodies: dict[tuple, bytes] = {}
+        self.etag: str | None = None
+        self.last_modified: datetime | None = None
+        self.builds: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: tuple, etag: str, last_modified: datetime) -> Response | None:
+        """
+        Get the response of a listing, if its snapshot is current.
+        :param key: Key of the listing.
+        :param etag: ETag of the stamp read by the request, see `conditional_tools.check_listing_conditions`.
+        :param last_modified: Last modified time of that stamp.
+        :return: The response, or None to build the listing from the database.
+        """
+
+        with self.lock:
+            stale = self.etag != etag
+            body = None if stale else self.bodies.get(key)
+
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if stale:
+            # Written by another worker, or the build after a write of this one is still running.
+            snapshot_builder.request_build()
+
+        if body is None:
+            return None
+
+        return Response(content=body, media_type='application/json',
+                        headers=validator_headers(etag=etag, last_modified=last_modified))
+
+    def replace(self, bodies: dict[tuple, bytes], etag: str, last_modified: datetime) -> None:
+        """
+        Replace all the snapshots at once.
+        :param bodies: Bodies of the listings, by key.
+        :param etag: ETag of the `listing_version` read before the listings were queried.
+        :param last_modified: Last modified time of that version.
+        :return: None.
+        """
+
+        with self.lock:
+            self.bodies = bodies
+            self.etag = etag
+            self.last_modified = last_modified
+            self.builds += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "snapshots": len(self.bodies),
+                "builds": self.builds,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+listing_snapshots = ListingSnapshots()
+
+
+def build_snapshots() -> None:
+    """
+    Query and serialize the first `config.LISTING_SNAPSHOT_PAGES` pages of the listings.
+    :return: None.
+    """
+
+    bodies: dict[tuple, bytes] = {}
+
+    with SessionLocal() as db:
+        # Read first, so that the listings are at least as new as the stamp they are served with.
+        etag, last_modified = listing_version.validators(db=db)
+
+        for page in range(1, config.LISTING_SNAPSHOT_PAGES + 1):
+            posts = crud.select_all_posts_by_page(page=page, db=db)
+            bodies[('posts', page)] = orjson.dumps([format_post_summary(post=x) for x in posts])
+
+        first_page = crud.select_posts_by_cursor(cursor=None, db=db)
+        posts = first_page[:config.RESOURCES_POSTS_LIMIT]
+        bodies[('posts_by_cursor',)] = orjson.dumps({
+            'posts': [format_post_summary(post=x) for x in posts],
+            'next_cursor': encode_posts_cursor(post=posts[-1]) if len(first_page) > len(posts) else None
+        })
+
+        for category_id in crud.get_all_category_ids(db=db):
+            for page in range(1, config.LISTING_SNAPSHOT_PAGES + 1):
+                posts = crud.select_posts_of_category_by_page(category_id=category_id, page=page, db=db)
+                bodies[('category', category_id, page)] = orjson.dumps([format_post_summary(post=x) for x in posts])
+
+    listing_snapshots.replace(bodies=bodies, etag=etag, last_modified=last_modified)
+
+
+class SnapshotBuilder:
+    """
+    A thread which builds the snapshots again after writes.
+    Writes in a burst are coalesced, the snapshots are built once after them.
+    """
+
+    def __init__(self):
+        self.event = Event()
+        self.thread: Thread | None = None
+
+    def request_build(self) -> None:
+        """
+        Ask for the snapshots to be built again, without waiting for it.
+        :return: None.
+        """
+
+        self.event.set()
+
+    def start(self) -> None:
+        """
+        Start the thread, which builds the snapshots a first time.
+        :return: None.
+        """
+
+        if self.thread is not None:
+            return
+
+        listing_version.add_listener(self.request_build)
+        self.thread = Thread(target=self.run, name='listing-snapshots', daemon=True)
+        self.thread.start()
+        self.request_build()
+
+    def run(self) -> None:
+        while True:
+            self.event.wait()
+            self.event.clear()
+
+            try:
+                build_snapshots()
+
+            except Exception:
+                # The stale snapshots are not served, the listings are read from the database meanwhile.
+                logger.exception('Building the listing snapshots failed')
+
+
+snapshot_builder = SnapshotBuilder()
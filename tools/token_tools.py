@@ -2,37 +2,40 @@
 # Filename: token_tools.py
 
 from datetime import datetime, timedelta
+import time
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from tools.hash_tools import verify_password
-from model import crud
+from tools.hash_tools import verify_password_async
+from tools.cache_tools import token_cache
+from model import async_crud
 import config
 
 
-def authenticate_user(user_name: str, password: str, db: Session):
+async def authenticate_user(user_name: str, password: str, db: AsyncSession):
     """
     Authenticate a user by user_name and password.
+    The password is verified by the threads of `hash_tools.hash_pool`, off the event loop.
     :param user_name: user_name, a string type data.
     :param password: Password inputted from frontend.
-    :param db: Session of the database.
-    :return: The result of the authentication.
+    :param db: Async session of the database.
+    :return: The user if the authentication succeeds, False otherwise.
     """
 
     # Query the user in the database.
-    user = crud.get_user_by_name(user_name=user_name, db=db)
+    user = await async_crud.get_user_by_name(user_name=user_name, db=db)
 
     # Check if the user exists.
     # If not, return the False.
     # If so, the check if the password is correct.
     if not user:
         return False
-    elif not verify_password(password, user.password):
+    elif not await verify_password_async(password, user.password):
         return False
 
-    # If everything is ok, then return True.
-    return True
+    # If everything is ok, then return the user.
+    return user
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -73,19 +76,31 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 def get_uuid_by_token(token: str):
     """
     Get uuid by token.
+    A verified token is kept in `token_cache` until it expires, so it is decoded once per session.
     :param token: Token to get uuid.
     :return: return a uuid.
     """
 
+    user_uuid: str | None = token_cache.get(token)
+
+    if user_uuid is not None:
+        return user_uuid
+
     try:
         # Load the data decoder by JWT method.
         # The key algorithms are defined in the configuration file.
         data_decoder = jwt.decode(token=token, key=config.SECRET_KEY, algorithms=config.ALGORITHM)
-        user_uuid: str = data_decoder.get('sub')
+        user_uuid = data_decoder.get('sub')
 
         # If the user uuid is not found, return the False.
         if user_uuid is None:
             return False
+
+        # Cache the token, never beyond its expiration.
+        expiration = data_decoder.get('exp')
+        if expiration is not None:
+            token_cache.set(token, user_uuid, ttl=expiration - time.time())
+
         # Else then, return the user uuid from the token.
         return user_uuid
 
@@ -0,0 +1,183 @@
+# encoding: utf-8
+# Filename: upload_tools.py
+
+"""
+Streaming of the uploads to the disk.
+
+An upload is copied in chunks of `config.UPLOAD_CHUNK_SIZE` to a temporary file next to its destination,
+hashed on the way, and refused as soon as it grows over its limit.
+So the memory of a request never holds more than one chunk of an upload.
+
+The bodies of the upload routes are limited by `UploadLimitMiddleware` too, before the form is parsed,
+so an oversized upload is not spooled to the disk by the form parser first.
+"""
+
+from dataclasses import dataclass
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pathlib import Path
+import hashlib
+import os
+import tempfile
+import config
+
+
+@dataclass
+class StoredUpload:
+    """
+    An upload written to a temporary file.
+    """
+
+    path: Path
+    size: int
+    sha256: str
+    kept: bool = False
+
+    def replace(self, destination: Path) -> None:
+        """
+        Move the file into place at once, readers never see it half written.
+        :param destination: Final path of the file.
+        :return: None.
+        """
+
+        os.replace(self.path, destination)
+        self.path = destination
+        self.kept = True
+
+    def discard(self) -> None:
+        """
+        Delete the temporary file, unless it has been moved into place.
+        :return: None.
+        """
+
+        if not self.kept:
+            self.path.unlink(missing_ok=True)
+
+
+class UploadLimitMiddleware:
+    """
+    Refuse the bodies of the upload routes larger than their limit with 413, before the form is parsed.
+    The `Content-Length` of the request is checked first, and the body is counted while it is received,
+    for the requests which are chunked or understate their length.
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int]):
+        """
+        :param app: The application.
+        :param limits: Limit of the body in bytes by path, the other paths are not limited.
+        """
+
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_bytes = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body is larger than {max_bytes} bytes!"
+        content_length = dict(scope["headers"]).get(b'content-length', b'')
+
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
+
+        received: int = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+
+            message = await receive()
+
+            if message["type"] == "http.request":
+                received += len(message.get("body", b''))
+
+                # Raised in the form parser, which lets an `HTTPException` through as it is.
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def check_upload_size(upload: UploadFile, max_bytes: int) -> None:
+    """
+    Refuse an upload larger than a limit, with 413.
+    :param upload: The upload.
+    :param max_bytes: Limit of the size in bytes.
+    :return: None.
+    """
+
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File '{upload.filename}' is larger than {max_bytes} bytes!"
+        )
+
+
+def store_upload(upload: UploadFile, directory: Path, max_bytes: int, suffix: str = '.tmp') -> StoredUpload:
+    """
+    Stream an upload to a temporary file in a directory, hashing it with SHA-256.
+    The temporary file is in the directory of the destination, so that `StoredUpload.replace` is atomic.
+    :param upload: The upload.
+    :param directory: Directory of the destination.
+    :param max_bytes: Limit of the size in bytes, larger uploads are refused with 413.
+    :param suffix: Suffix of the temporary file.
+    :return: The temporary file, its size and its hash.
+    """
+
+    # The size is known when the form has been parsed, the copy is not even started then.
+    check_upload_size(upload=upload, max_bytes=max_bytes)
+
+    digest = hashlib.sha256()
+    size: int = 0
+
+    with tempfile.NamedTemporaryFile('wb', dir=directory, suffix=suffix, delete=False) as f:
+        stored = StoredUpload(path=Path(f.name), size=0, sha256='')
+
+        try:
+            while chunk := upload.file.read(config.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File '{upload.filename}' is larger than {max_bytes} bytes!"
+                    )
+
+                digest.update(chunk)
+                f.write(chunk)
+
+        except BaseException:
+            f.close()
+            stored.discard()
+            raise
+
+    stored.size = size
+    stored.sha256 = digest.hexdigest()
+
+    return stored
+
+
+def file_sha256(path: Path) -> str | None:
+    """
+    Hash a file with SHA-256 in chunks.
+    :param path: Path of the file.
+    :return: The hash, None if the file does not exist.
+    """
+
+    digest = hashlib.sha256()
+
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(config.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+
+    except FileNotFoundError:
+        return None
+
+    return digest.hexdigest()
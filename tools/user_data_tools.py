@@ -3,10 +3,12 @@
 
 from model import schemas, crud
 from fastapi import UploadFile, File, HTTPException
+from tools import image_tools, upload_tools
 from sqlalchemy.orm import Session
 from pathlib import Path
+from uuid import uuid4
+import time
 import config
-import random
 
 
 def create_user_directory(user_uuid: str):
@@ -29,38 +31,100 @@ def create_user_directory(user_uuid: str):
         return False
 
 
-def upload_user_avatar(user_uuid: str, avatar_file: UploadFile = File()):
+def get_avatar_url(avatar_path: str | None, avatar_size: int = config.DEFAULT_AVATAR_SIZE,
+                   avatar_format: str = config.AVATAR_FORMATS[0]) -> str | None:
     """
-    Save and compress the avatar of the user.
-    :return:
+    Get the URL of an avatar from the path stored in the users table.
+    :param avatar_path: `User.avatar_path` of the user.
+    :param avatar_size: Size of the avatar in pixels, rounded up to the next size available.
+    :param avatar_format: One of `config.AVATAR_FORMATS`.
+    :return: URL of the avatar, None if the user has no avatar.
+    """
+
+    if not avatar_path:
+        return None
+
+    return '/' + image_tools.get_avatar_file(avatar_path=avatar_path, size=avatar_size, extension=avatar_format)
+
+
+def check_avatar_format(avatar_format: str) -> str:
+    """
+    Check the avatar format asked by a client.
+    :param avatar_format: Extension of the format.
+    :return: The format.
+    """
+
+    if avatar_format not in config.AVATAR_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Avatar format '{avatar_format}' is not available!"
+        )
+
+    return avatar_format
+
+
+def upload_user_avatar(user_uuid: str, db: Session, avatar_file: UploadFile = File()):
+    """
+    Process the avatar of the user, and record its path in the database.
+    The files are written under a new stem, unique to this upload, and the row is switched to it in one update,
+    so readers always see either the old avatar or the new one.
+    :param user_uuid: Uuid of the user.
+    :param db: Session of the database.
+    :param avatar_file: Avatar file uploaded.
+    :return: Status of the operation.
     """
-    # Define the original path.
-    original_avatar_path = Path(config.STATIC_DIR).joinpath('users', user_uuid)
+    user = crud.get_user_by_uuid(db=db, user_uuid=user_uuid)
+
+    # Read before the update, which expires the loaded user.
+    previous_avatar_path: str | None = user.avatar_path
+    avatar_version: int = user.avatar_version
 
-    # Get the extension of the file.
-    file_extension = Path(avatar_file.filename).suffix
-    avatar_file_list = list(original_avatar_path.glob("*.*"))
+    user_dir = Path(config.STATIC_DIR).joinpath('users', user_uuid)
+    # Concurrent uploads read the same version, the random part keeps them from writing each other's files.
+    avatar_stem = user_dir.joinpath(f"avatar-v{avatar_version + 1}-{uuid4().hex[:8]}").as_posix()
+    stored = upload_tools.store_upload(upload=avatar_file, directory=user_dir, max_bytes=config.AVATAR_MAX_BYTES)
 
-    # Deal with the file of avatar.
+    updated: bool = False
+
+    # Decoding and resizing run in processes, they would hold the GIL of the server.
     try:
-        # Delete the file of old avatar
-        if len(avatar_file_list) != 0:
-            for i in avatar_file_list:
-                i.unlink(missing_ok=True)
-        # Write the file of new avatar.
-        with original_avatar_path.joinpath("0" + str(random.randint(10000, 99999)) + file_extension).open("wb") as f:
-            content = avatar_file.file.read()
-            f.write(content)
-            return True
+        image_tools.avatar_pool.run(image_tools.process_avatar, str(stored.path), avatar_stem,
+                                    time.time() + config.AVATAR_TIMEOUT)
+        updated = crud.update_avatar_by_uuid(user_uuid=user_uuid, avatar_path=avatar_stem,
+                                             avatar_version=avatar_version, db=db)
 
-    # Deal with errors.
-    except IOError as e:
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
 
+    except IOError as e:
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
+    finally:
+        stored.discard()
+
+        # Whatever stopped an upload, invalid, failed, timed out, rejected by the pool or beaten by another request,
+        # its files are deleted. The stem is unique to it, so the files of the other uploads are kept.
+        if not updated:
+            image_tools.delete_avatar_files(avatar_path=avatar_stem)
+
+    if not updated:
+        raise HTTPException(
+            status_code=409,
+            detail="The avatar has been changed by another request!"
+        )
+
+    # Delete the files of old avatar.
+    if previous_avatar_path and previous_avatar_path != avatar_stem:
+        image_tools.delete_avatar_files(avatar_path=previous_avatar_path)
+
+    return True
+
 
 def update_user_info(user_uuid: str, user_info_modified: schemas.UserModify, db: Session):
     """